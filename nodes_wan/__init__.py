@@ -7,6 +7,9 @@ from .wan2_5_image_edit import Wan2_5_ImageEdit
 from .wan2_5_i2v import Wan2_5_I2V
 from .wan2_5_t2i import Wan2_5_T2I
 from .wan2_5_t2v import Wan2_5_T2V
+from .wan2_5_save_image import Wan2_5_SaveImage
+from .routes import register_routes
+from . import prewarm
 
 # 节点类映射 - 用于ComfyUI识别和加载节点
 NODE_CLASS_MAPPINGS = {
@@ -14,6 +17,7 @@ NODE_CLASS_MAPPINGS = {
     "Wan2_5_I2V": Wan2_5_I2V,
     "Wan2_5_T2I": Wan2_5_T2I,
     "Wan2_5_T2V": Wan2_5_T2V,
+    "Wan2_5_SaveImage": Wan2_5_SaveImage,
 }
 
 # 节点显示名称映射 - 在ComfyUI界面中显示的友好名称
@@ -22,6 +26,13 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "Wan2_5_I2V": "Wan 2.5 图生视频",
     "Wan2_5_T2I": "Wan 2.5 文生图",
     "Wan2_5_T2V": "Wan 2.5 文生视频",
+    "Wan2_5_SaveImage": "Wan 2.5 保存图像",
 }
 
+# 在 ComfyUI 服务端注册运行指标等接口
+register_routes()
+
+# 按配置预热到 DashScope 的连接（默认关闭）
+prewarm.start()
+
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS"]
@@ -0,0 +1,62 @@
+"""
+异步运行时
+所有 Wan 节点的网络 I/O 都运行在同一个后台事件循环上，共享连接池；
+同步入口通过 run_sync 阻塞等待，ComfyUI 异步节点通过 run_on_loop 等待结果
+"""
+
+import asyncio
+import inspect
+import os
+import sys
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _detect_async_nodes():
+    """检测 ComfyUI 是否支持 async 节点函数
+
+    可通过环境变量 FUNART_WAN_ASYNC_NODES=1/0 强制开启/关闭，默认自动检测
+    """
+    setting = os.environ.get("FUNART_WAN_ASYNC_NODES", "auto").lower()
+    if setting in ("1", "true", "yes"):
+        return True
+    if setting in ("0", "false", "no"):
+        return False
+
+    # 只检查已加载的 execution 模块，不在非 ComfyUI 环境下额外导入
+    execution = sys.modules.get("execution")
+    return inspect.iscoroutinefunction(getattr(execution, "_async_map_node_over_list", None))
+
+
+# ComfyUI 支持 async 节点时，节点 FUNCTION 指向异步入口
+ASYNC_NODES_SUPPORTED = _detect_async_nodes()
+
+
+def get_loop():
+    """获取（必要时启动）后台事件循环"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="funart-wan-loop", daemon=True)
+            thread.start()
+    return _loop
+
+
+def run_sync(coro):
+    """在后台事件循环上运行协程，并阻塞当前线程直到返回结果"""
+    loop = get_loop()
+    if threading.current_thread().name == "funart-wan-loop":
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the Wan event loop thread, use run_on_loop()")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def run_on_loop(coro):
+    """在后台事件循环上运行协程，可从任意事件循环中 await"""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
@@ -0,0 +1,266 @@
+"""
+命令行批量生成
+读取 JSONL 任务文件，不经过 ComfyUI 工作流，直接调用 Wan 节点代码批量生成；
+结果逐个写入输出目录并追加记录到 manifest.jsonl，中断后重新运行会跳过已成功的任务
+（已提交但未完成的任务由任务日志恢复，不会重复提交）
+
+任务文件每行一个 JSON 对象，inputs 与节点输入同名，图片/音频填写文件路径（相对路径相对于任务文件所在目录），
+不是节点输入的名称在读取任务文件时报错；视频节点只输出视频文件，frames_output 等视频帧输入被忽略：
+    {"id": "cat-001", "node": "t2i", "inputs": {"prompt": "一只猫", "width": 1024, "height": 1024}}
+    {"id": "cat-002", "node": "image_edit", "inputs": {"prompt": "换成白色", "image_1": "cat.png"}}
+    {"id": "cat-003", "node": "i2v", "inputs": {"prompt": "猫在奔跑", "image": "cat.png", "audio": "bgm.wav", "resolution": "480P"}}
+
+使用方式：
+    funart-wan-batch jobs.jsonl -o output/batch [--concurrency 4] [--max-tasks 2]
+    python -m nodes_wan.cli jobs.jsonl -o output/batch
+"""
+
+import argparse
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+from . import NODE_CLASS_MAPPINGS, image_originals
+from .async_runtime import run_sync
+from .dashscope_http import close_session
+from .scheduler import scheduler
+
+# 节点简称
+NODE_ALIASES = {
+    "t2i": "Wan2_5_T2I",
+    "image_edit": "Wan2_5_ImageEdit",
+    "t2v": "Wan2_5_T2V",
+    "i2v": "Wan2_5_I2V",
+}
+
+# 以文件路径传入的媒体输入
+IMAGE_INPUTS = ("image", "image_1", "image_2", "image_3")
+AUDIO_INPUTS = ("audio",)
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def _job_id(job):
+    """未指定 id 时按任务内容生成稳定的 id，任务文件增删行后仍能与 manifest 对应"""
+    canonical = json.dumps({"node": job.get("node"), "inputs": job.get("inputs")}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def _node_inputs(node):
+    """节点的全部输入名称（required + optional）"""
+    input_types = NODE_CLASS_MAPPINGS[node].INPUT_TYPES()
+    return {*input_types.get("required", {}), *input_types.get("optional", {})}
+
+
+def load_jobs(path):
+    """读取并校验 JSONL 任务文件"""
+    jobs = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+
+            node = NODE_ALIASES.get(job.get("node"), job.get("node"))
+            if node not in NODE_ALIASES.values():
+                raise ValueError(
+                    f"{path}:{line_number}: unknown node {job.get('node')!r}. Supported: {', '.join([*NODE_ALIASES, *NODE_ALIASES.values()])}"
+                )
+            if not isinstance(job.get("inputs"), dict):
+                raise ValueError(f"{path}:{line_number}: 'inputs' must be an object")
+            unknown = sorted(set(job["inputs"]) - _node_inputs(node))
+            if unknown:
+                raise ValueError(
+                    f"{path}:{line_number}: unknown input(s) {', '.join(unknown)} for {node}. Supported: {', '.join(sorted(_node_inputs(node)))}"
+                )
+
+            job_id = str(job.get("id") or _job_id(job))
+            if job_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate job id {job_id!r}")
+            seen.add(job_id)
+            jobs.append({"id": job_id, "node": node, "inputs": job["inputs"]})
+    return jobs
+
+
+def load_manifest(output_dir):
+    """读取 manifest，返回已成功的任务 id（同一任务以最后一条记录为准）"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    status = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程中断时最后一行可能不完整
+                    continue
+                if not isinstance(record, dict) or "id" not in record or "status" not in record:
+                    raise ValueError(f"{path}:{line_number}: manifest record must have 'id' and 'status'")
+                status[record["id"]] = record["status"]
+    except OSError:
+        pass
+    return {job_id for job_id, value in status.items() if value == "ok"}
+
+
+def load_image(path):
+    """读取图片文件为 ComfyUI IMAGE tensor [1, H, W, C]"""
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    with Image.open(path) as pil_image:
+        img_array = np.array(pil_image.convert("RGB")).astype(np.float32) / 255.0
+    return torch.from_numpy(img_array)[None,]
+
+
+def load_audio(path):
+    """读取 WAV 文件为 ComfyUI AUDIO {"waveform": [1, C, S], "sample_rate"}"""
+    import numpy as np
+    import scipy.io.wavfile as wavfile
+    import torch
+
+    sample_rate, data = wavfile.read(path)
+    if data.dtype == np.uint8:
+        data = (data.astype(np.float32) - 128.0) / 128.0
+    elif np.issubdtype(data.dtype, np.integer):
+        data = data.astype(np.float32) / float(np.iinfo(data.dtype).max + 1)
+    else:
+        data = data.astype(np.float32)
+
+    # [samples] / [samples, channels] → [1, channels, samples]
+    if data.ndim == 1:
+        data = data[:, None]
+    return {"waveform": torch.from_numpy(np.ascontiguousarray(data.T))[None,], "sample_rate": sample_rate}
+
+
+def _load_inputs(inputs, base_dir):
+    """将媒体输入的文件路径读取为节点所需的 tensor"""
+    kwargs = dict(inputs)
+    for name, value in inputs.items():
+        if value is None or not (name in IMAGE_INPUTS or name in AUDIO_INPUTS):
+            continue
+        path = value if os.path.isabs(value) else os.path.join(base_dir, value)
+        kwargs[name] = load_image(path) if name in IMAGE_INPUTS else load_audio(path)
+    return kwargs
+
+
+def save_image(tensor, output_dir, name):
+    """保存 IMAGE tensor，返回文件名：有原始图片时直接复制原始字节，否则编码为 PNG"""
+    import numpy as np
+    from PIL import Image
+
+    original = image_originals.lookup(tensor)
+    if original is not None:
+        filename = f"{name}{os.path.splitext(original)[1]}"
+        shutil.copyfile(original, os.path.join(output_dir, filename))
+        return filename
+
+    if len(tensor.shape) == 4:
+        tensor = tensor[0]
+    img_array = np.clip(tensor.cpu().numpy() * 255.0, 0, 255).astype(np.uint8)
+    filename = f"{name}.png"
+    Image.fromarray(img_array, mode="RGB").save(os.path.join(output_dir, filename), format="PNG")
+    return filename
+
+
+def _output_name(job_id):
+    """任务 id 转为安全的文件名"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", job_id)
+
+
+async def run_job(job, output_dir, base_dir):
+    """执行单个任务，返回 manifest 记录"""
+    start_time = time.time()
+    record = {"id": job["id"], "node": job["node"]}
+    try:
+        node = NODE_CLASS_MAPPINGS[job["node"]]()
+        kwargs = await asyncio.to_thread(_load_inputs, job["inputs"], base_dir)
+
+        if hasattr(node, "create_video"):
+            # 只传入 create_video 接受的输入，视频帧相关的 ComfyUI 输入（frames_output 等）在批量生成中不使用
+            accepted = inspect.signature(node.create_video).parameters
+            video_path, extended_prompt = await node.create_video(**{name: value for name, value in kwargs.items() if name in accepted})
+            output_name = f"{_output_name(job['id'])}.mp4"
+            # 临时目录中的视频与下载缓存共享同一文件，复制到输出目录，避免输出被原地修改时损坏缓存
+            await asyncio.to_thread(shutil.copyfile, video_path, os.path.join(output_dir, output_name))
+        else:
+            result = await node.agenerate_image(**kwargs)
+            extended_prompt = result[1] if len(result) > 1 else None
+            output_name = await asyncio.to_thread(save_image, result[0], output_dir, _output_name(job["id"]))
+
+        record.update(status="ok", outputs=[output_name], extended_prompt=extended_prompt)
+    except Exception as e:
+        print(f"Job {job['id']} failed: {e}")
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+
+    record.update(elapsed=round(time.time() - start_time, 3), finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+    return record
+
+
+async def run_batch(jobs, output_dir, base_dir, concurrency):
+    """以有限并发执行任务，每完成一个立即追加到 manifest
+
+    Returns:
+        成功/失败的任务数
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"ok": 0, "error": 0}
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "a", encoding="utf-8") as manifest:
+
+        async def worker(job):
+            # 并发上限同时限制了已读取/编码到内存中的媒体数据量
+            async with semaphore:
+                record = await run_job(job, output_dir, base_dir)
+            manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+            manifest.flush()
+            counts[record["status"]] += 1
+            print(f"[{counts['ok'] + counts['error']}/{len(jobs)}] {job['id']}: {record['status']}")
+
+        try:
+            await asyncio.gather(*(worker(job) for job in jobs))
+        finally:
+            await close_session()
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="funart-wan-batch", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="JSONL 任务文件")
+    parser.add_argument("-o", "--output", required=True, help="输出目录（生成结果与 manifest.jsonl）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时处理的任务数（含读取、编码、上传、下载）")
+    parser.add_argument("--max-tasks", type=int, help="同时在服务端运行的任务数上限，默认取 FUNART_WAN_MAX_CONCURRENT_TASKS")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.jobs)
+    os.makedirs(args.output, exist_ok=True)
+
+    done = load_manifest(args.output)
+    pending = [job for job in jobs if job["id"] not in done]
+    print(f"Jobs: {len(jobs)} total, {len(jobs) - len(pending)} already done, {len(pending)} to run")
+    if not pending:
+        return 0
+
+    if args.max_tasks is not None:
+        scheduler.limit = args.max_tasks
+
+    start_time = time.time()
+    counts = run_sync(run_batch(pending, args.output, os.path.dirname(os.path.abspath(args.jobs)), max(1, args.concurrency)))
+    print(f"Batch finished in {time.time() - start_time:.1f}s: {counts['ok']} succeeded, {counts['error']} failed")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
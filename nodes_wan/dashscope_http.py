@@ -0,0 +1,686 @@
+"""
+DashScope HTTP 接口封装
+基于 aiohttp 直接调用 DashScope REST API（任务提交、状态轮询、结果下载），
+以流式方式构造请求体，避免大体积 base64 载荷在内存中的多份拷贝
+"""
+
+import asyncio
+import base64
+import collections
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import time
+import urllib.parse
+
+from . import download_cache, metrics
+
+# 只检查是否安装，aiohttp 在首次发起请求时才导入，不拖慢 ComfyUI 启动
+AIOHTTP_AVAILABLE = importlib.util.find_spec("aiohttp") is not None
+
+
+# DashScope API 地址（北京地域），可通过环境变量 DASHSCOPE_HTTP_BASE_URL 指定（与 DashScope SDK 一致，如指向本地模拟服务）
+DASHSCOPE_BASE_URL = os.environ.get("DASHSCOPE_HTTP_BASE_URL", "https://dashscope.aliyuncs.com/api/v1").rstrip("/")
+
+# 各类任务的提交路径
+TEXT2IMAGE_PATH = "/services/aigc/text2image/image-synthesis"
+IMAGE2IMAGE_PATH = "/services/aigc/image2image/image-synthesis"
+VIDEO_SYNTHESIS_PATH = "/services/aigc/video-generation/video-synthesis"
+
+# 任务状态轮询间隔（秒）：从 POLL_INTERVAL_MIN 开始逐步增大到 POLL_INTERVAL_MAX
+POLL_INTERVAL_MIN = 1.0
+POLL_INTERVAL_MAX = 5.0
+
+# 有历史耗时统计时，首次查询后直接等待到预计耗时的该比例再开始常规轮询
+POLL_EXPECTED_RATIO = 0.8
+
+# 轮询连续失败（网络中断、服务端 5xx）超过该次数后放弃
+POLL_MAX_FAILURES = 10
+
+# 提交遇到限流、服务暂不可用或无法建立连接时的最大重试次数及退避基数（秒）
+SUBMIT_MAX_RETRIES = 5
+SUBMIT_RETRY_BACKOFF = 2.0
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# 提交时可重试的 HTTP 状态码：确定请求未被受理（500/502/504 时任务可能已创建，重试会重复提交计费任务）
+SUBMIT_RETRYABLE_STATUS = (429, 503)
+
+# 下载分块大小
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 请求体/媒体数据超过该大小时溢出到磁盘临时文件
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# 对冲下载（默认关闭，FUNART_WAN_HEDGE_DOWNLOADS=1 开启）：下载迟迟收不到响应（首字节）或中途停顿时，
+# 再发起一个相同的请求，取先完成的结果并取消另一个，避免个别卡住的连接拖到超时
+HEDGE_DOWNLOADS = os.environ.get("FUNART_WAN_HEDGE_DOWNLOADS", "0").lower() in ("1", "true", "yes")
+
+# 首字节耗时、数据停顿各自的对冲等待时间：取最近下载（每次下载各记录一个样本：首字节耗时、最长停顿）的该分位数；
+# 样本不足时使用默认值，且不低于最小值
+HEDGE_QUANTILE = 0.95
+HEDGE_DELAY_DEFAULT = 5.0
+HEDGE_TTFB_MIN = 0.5
+HEDGE_STALL_MIN = 2.0
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_SAMPLES = 500
+
+# 记录的最近下载来源（scheme://host:port）数量，供连接预热使用
+DOWNLOAD_ORIGINS_LIMIT = 8
+
+# base64 分块编码大小，必须是 3 的倍数，保证各分块的编码结果可直接拼接
+B64_CHUNK_SIZE = 3 * 256 * 1024
+
+
+class MediaPayload:
+    """
+    待上传的媒体数据（图片/音频）
+    原始字节写入 SpooledTemporaryFile，构造请求体时再以 data URI 形式分块 base64 编码写出，
+    整个过程中不会生成完整的 base64 字符串
+    """
+
+    def __init__(self, mime_type):
+        self.mime_type = mime_type
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self._digest = None
+
+    @property
+    def size(self):
+        """原始字节数"""
+        return self.file.seek(0, os.SEEK_END)
+
+    @property
+    def encoded_size(self):
+        """写入请求体后 data URI 的字节数"""
+        prefix = len(f"data:{self.mime_type};base64,")
+        return prefix + (self.size + 2) // 3 * 4
+
+    def digest(self):
+        """原始字节的 sha256，用于计算请求的规范哈希"""
+        if self._digest is None:
+            sha = hashlib.sha256()
+            self.file.seek(0)
+            for chunk in iter(lambda: self.file.read(B64_CHUNK_SIZE), b""):
+                sha.update(chunk)
+            self._digest = sha.hexdigest()
+        return self._digest
+
+    def write_data_uri(self, out):
+        """将 data URI 流式写入 out（二进制文件对象）"""
+        out.write(f"data:{self.mime_type};base64,".encode("ascii"))
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(B64_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(base64.b64encode(chunk))
+
+    def close(self):
+        self.file.close()
+
+
+def _write_json(value, out):
+    """递归写出 JSON，MediaPayload 以 data URI 字符串形式流式写出"""
+    if isinstance(value, MediaPayload):
+        out.write(b'"')
+        value.write_data_uri(out)
+        out.write(b'"')
+    elif isinstance(value, dict):
+        out.write(b"{")
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                out.write(b",")
+            out.write(json.dumps(str(key), ensure_ascii=False).encode("utf-8"))
+            out.write(b":")
+            _write_json(item, out)
+        out.write(b"}")
+    elif isinstance(value, (list, tuple)):
+        out.write(b"[")
+        for index, item in enumerate(value):
+            if index:
+                out.write(b",")
+            _write_json(item, out)
+        out.write(b"]")
+    else:
+        out.write(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def canonicalize(value):
+    """将请求参数转换为可哈希的规范形式，MediaPayload 以内容摘要代替"""
+    if isinstance(value, MediaPayload):
+        return {"mime_type": value.mime_type, "sha256": value.digest()}
+    if isinstance(value, dict):
+        return {str(key): canonicalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    return value
+
+
+def request_key(model, inputs, parameters, api_key):
+    """计算请求的规范哈希
+
+    相同账号下模型、输入（媒体按内容）和参数完全一致的请求得到相同的哈希，
+    用于任务日志恢复等按请求去重的场景
+    """
+    canonical = {
+        "model": model,
+        "input": canonicalize(inputs),
+        "parameters": canonicalize(parameters),
+        "account": hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16],
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def build_request_body(model, inputs, parameters):
+    """构造 DashScope 任务请求体
+
+    Args:
+        model: 模型名称
+        inputs: input 字段，值可以包含 MediaPayload
+        parameters: parameters 字段
+
+    Returns:
+        body: 定位到开头的 SpooledTemporaryFile，内容为 JSON 请求体
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    _write_json({"model": model, "input": inputs, "parameters": parameters}, body)
+    body.seek(0)
+    return body
+
+
+class DashScopeAPIError(RuntimeError):
+    """DashScope 接口返回错误"""
+
+    def __init__(self, message, status=None, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+    @property
+    def retryable(self):
+        return self.status in RETRYABLE_STATUS
+
+
+async def _iter_body(body, chunk_size=B64_CHUNK_SIZE):
+    """分块读取请求体"""
+    body.seek(0)
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+_sessions = {}
+
+
+def get_session():
+    """获取当前事件循环上的共享 aiohttp 会话（连接池）"""
+    if not AIOHTTP_AVAILABLE:
+        raise ImportError("aiohttp 未安装。请运行: pip install aiohttp")
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300))
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """关闭当前事件循环上的共享会话（独立运行的脚本退出前调用，避免未关闭连接的警告）"""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+_download_origins = {}
+
+
+def _note_download_origin(url):
+    """记录下载来源（结果文件所在的 OSS 地址），按最近使用排序"""
+    parsed = urllib.parse.urlsplit(url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    _download_origins.pop(origin, None)
+    _download_origins[origin] = time.time()
+    while len(_download_origins) > DOWNLOAD_ORIGINS_LIMIT:
+        _download_origins.pop(next(iter(_download_origins)))
+
+
+def download_origins():
+    """最近下载过结果的来源（scheme://host:port），最近使用的在后"""
+    return list(_download_origins)
+
+
+def _auth_headers(api_key):
+    return {"Authorization": f"Bearer {api_key}"}
+
+
+async def _read_json(response):
+    import aiohttp
+
+    try:
+        return await response.json(content_type=None)
+    except (ValueError, aiohttp.ContentTypeError):
+        return {}
+
+
+async def submit_task(path, body, api_key):
+    """以异步任务方式提交请求，返回任务 ID
+
+    遇到限流（429）、服务暂不可用（503）或无法建立连接时按指数退避重试；
+    其他服务端错误（500/502/504）时任务可能已创建，不重试
+
+    Args:
+        path: 任务提交路径，如 VIDEO_SYNTHESIS_PATH
+        body: build_request_body 返回的请求体
+        api_key: DashScope API Key
+    """
+    import aiohttp
+
+    start_time = time.time()
+
+    content_length = body.seek(0, os.SEEK_END)
+    headers = {
+        **_auth_headers(api_key),
+        "Content-Type": "application/json",
+        "Content-Length": str(content_length),
+        "X-DashScope-Async": "enable",
+    }
+
+    session = get_session()
+    for attempt in range(SUBMIT_MAX_RETRIES + 1):
+        try:
+            # 请求体分块读取发送
+            async with session.post(
+                f"{DASHSCOPE_BASE_URL}{path}", data=_iter_body(body), headers=headers, timeout=aiohttp.ClientTimeout(total=120)
+            ) as response:
+                payload = await _read_json(response)
+                if response.status != 200:
+                    raise DashScopeAPIError(
+                        f"API async call failed: {payload.get('code', response.status)} - {payload.get('message', response.reason)}",
+                        status=response.status,
+                        code=payload.get("code"),
+                    )
+            break
+        except (DashScopeAPIError, aiohttp.ClientConnectorError) as e:
+            # 只有确定请求未被受理时才重试，避免重复提交任务
+            if attempt == SUBMIT_MAX_RETRIES or (isinstance(e, DashScopeAPIError) and e.status not in SUBMIT_RETRYABLE_STATUS):
+                raise
+            delay = SUBMIT_RETRY_BACKOFF * 2**attempt
+            print(f"Warning: Submit failed ({e}), retrying in {delay:.0f}s ({attempt + 1}/{SUBMIT_MAX_RETRIES})")
+            metrics.inc("retries_total", kind="submit")
+            await asyncio.sleep(delay)
+
+    task_id = (payload.get("output") or {}).get("task_id")
+    if not task_id:
+        raise DashScopeAPIError(f"API async call returned no task ID (request ID: {payload.get('request_id', 'N/A')})")
+
+    metrics.inc("upload_bytes_total", content_length)
+
+    elapsed_time = time.time() - start_time
+    print(f"submit_task time: {elapsed_time:.3f}s (body size: {content_length//1024}KB)")
+
+    return task_id
+
+
+async def fetch_task(task_id, api_key):
+    """查询任务状态，返回完整的响应 JSON"""
+    import aiohttp
+
+    session = get_session()
+    async with session.get(
+        f"{DASHSCOPE_BASE_URL}/tasks/{task_id}", headers=_auth_headers(api_key), timeout=aiohttp.ClientTimeout(total=30)
+    ) as response:
+        payload = await _read_json(response)
+        if response.status != 200:
+            raise DashScopeAPIError(
+                f"Task query failed: {payload.get('code', response.status)} - {payload.get('message', response.reason)}",
+                status=response.status,
+                code=payload.get("code"),
+            )
+    return payload
+
+
+async def cancel_task(task_id, api_key):
+    """取消任务（DashScope 只能取消仍在排队 PENDING 的任务）
+
+    Raises:
+        DashScopeAPIError: 取消失败（如任务已开始运行）
+    """
+    import aiohttp
+
+    session = get_session()
+    async with session.post(
+        f"{DASHSCOPE_BASE_URL}/tasks/{task_id}/cancel", headers=_auth_headers(api_key), timeout=aiohttp.ClientTimeout(total=10)
+    ) as response:
+        payload = await _read_json(response)
+        if response.status != 200:
+            raise DashScopeAPIError(
+                f"Task cancel failed: {payload.get('code', response.status)} - {payload.get('message', response.reason)}",
+                status=response.status,
+                code=payload.get("code"),
+            )
+
+
+async def wait_task(task_id, api_key, expected=None, on_status=None):
+    """轮询直到任务结束，返回任务的 output 字段
+
+    轮询过程中的网络中断、超时及服务端 5xx 错误会被忽略并继续轮询，
+    连续失败超过 POLL_MAX_FAILURES 次才放弃（任务仍在服务端运行，可通过任务日志恢复）
+
+    Args:
+        task_id: 任务 ID
+        api_key: DashScope API Key
+        expected: 预计任务耗时（秒，来自历史统计）。首次查询后任务仍未结束时，
+            直接等待到预计耗时的 POLL_EXPECTED_RATIO 再开始常规轮询，减少任务前期的无效查询
+        on_status: 每次查询成功后以任务状态（PENDING / RUNNING / ...）调用
+
+    Raises:
+        DashScopeAPIError: 任务失败、被取消或无法查询
+    """
+    import aiohttp
+
+    start_time = time.time()
+    interval = POLL_INTERVAL_MIN
+    failures = 0
+    polls = 0
+    while True:
+        try:
+            metrics.inc("polls_total")
+            payload = await fetch_task(task_id, api_key)
+            failures = 0
+        except (DashScopeAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, DashScopeAPIError) and not e.retryable:
+                raise
+            failures += 1
+            if failures > POLL_MAX_FAILURES:
+                raise
+            print(f"Warning: Task {task_id} query failed ({e or type(e).__name__}), retrying ({failures}/{POLL_MAX_FAILURES})")
+            metrics.inc("retries_total", kind="poll")
+            await asyncio.sleep(interval)
+            continue
+
+        polls += 1
+        output = payload.get("output") or {}
+        status = output.get("task_status")
+        if on_status is not None:
+            on_status(status)
+
+        if status == "SUCCEEDED":
+            print(f"wait_task time: {time.time() - start_time:.3f}s (polls: {polls})")
+            return output
+        if status in ("FAILED", "CANCELED", "UNKNOWN"):
+            raise DashScopeAPIError(
+                f"Task {task_id} {status}: {output.get('code', 'N/A')} - {output.get('message', 'N/A')}", code=output.get("code")
+            )
+
+        # 首次查询只用于尽早发现立即失败的任务，之后按历史耗时跳过任务前期
+        if polls == 1 and expected:
+            delay = expected * POLL_EXPECTED_RATIO - (time.time() - start_time)
+            if delay > interval:
+                await asyncio.sleep(delay)
+                continue
+
+        await asyncio.sleep(interval)
+        interval = min(interval * 1.5, POLL_INTERVAL_MAX)
+
+
+# 每次下载的首字节耗时、最长数据停顿
+_ttfb_samples = collections.deque(maxlen=HEDGE_MAX_SAMPLES)
+_stall_samples = collections.deque(maxlen=HEDGE_MAX_SAMPLES)
+
+
+def _quantile_delay(samples, minimum):
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DELAY_DEFAULT
+    ordered = sorted(samples)
+    return max(ordered[min(len(ordered) - 1, int(HEDGE_QUANTILE * len(ordered)))], minimum)
+
+
+def hedge_delays():
+    """对冲等待时间（秒）：(首字节, 数据停顿)，分别为最近下载样本的 HEDGE_QUANTILE 分位数"""
+    return _quantile_delay(_ttfb_samples, HEDGE_TTFB_MIN), _quantile_delay(_stall_samples, HEDGE_STALL_MIN)
+
+
+class _Attempt:
+    """一次下载请求的进度"""
+
+    def __init__(self, index):
+        self.index = index
+        self.started = self.last_progress = time.monotonic()
+        self.ttfb = None
+        self.max_stall = 0.0
+
+    def progress(self):
+        now = time.monotonic()
+        if self.ttfb is None:
+            self.ttfb = now - self.started
+        else:
+            self.max_stall = max(self.max_stall, now - self.last_progress)
+        self.last_progress = now
+
+    def idle(self, ttfb_delay, stall_delay):
+        """距离上次进度的时长，及当前阶段适用的对冲等待时间"""
+        return time.monotonic() - self.last_progress, ttfb_delay if self.ttfb is None else stall_delay
+
+    def record(self):
+        """记录本次请求的样本；被取消的请求按取消时的等待时长记录（实际耗时至少如此）"""
+        idle = time.monotonic() - self.last_progress
+        if self.ttfb is None:
+            _ttfb_samples.append(idle)
+            return
+        _ttfb_samples.append(self.ttfb)
+        _stall_samples.append(max(self.max_stall, idle))
+
+
+async def _stream(url, timeout, attempt, write):
+    """发起一次下载请求，收到响应头及每块数据时记录进度，数据交给 write(chunk)"""
+    import aiohttp
+
+    session = get_session()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        attempt.progress()
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            write(chunk)
+            attempt.progress()
+
+
+async def _hedged(url, timeout, attempt_download):
+    """执行下载，首个请求超过对冲等待时间没有进度（首字节或数据停顿，见 hedge_delays）时再发起一个请求，返回先成功的结果
+
+    Args:
+        attempt_download: attempt_download(attempt, timeout) 执行一次下载并返回结果，
+            需通过 _stream 记录进度；对冲请求的超时为剩余时间，总耗时不超过 timeout
+    """
+    start_time = time.monotonic()
+    ttfb_delay, stall_delay = hedge_delays()
+    first = _Attempt(0)
+    tasks = {asyncio.ensure_future(attempt_download(first, timeout)): first}
+    hedged = False
+    error = None
+    try:
+        while tasks:
+            wait = None
+            if not hedged:
+                idle, delay = first.idle(ttfb_delay, stall_delay)
+                wait = max(delay - idle, 0)
+            done, _ = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                idle, delay = first.idle(ttfb_delay, stall_delay)
+                if idle < delay:
+                    continue
+                hedged = True
+                remaining = timeout - (time.monotonic() - start_time)
+                if remaining > 0:
+                    stage = "first byte" if first.ttfb is None else "data"
+                    print(f"Download waiting {idle:.1f}s for {stage}, sending a hedged request: {url.split('?')[0]}")
+                    second = _Attempt(1)
+                    tasks[asyncio.ensure_future(attempt_download(second, remaining))] = second
+                continue
+
+            for task in done:
+                attempt = tasks.pop(task)
+                if task.exception() is None:
+                    attempt.record()
+                    if hedged:
+                        metrics.inc("hedged_downloads_total", winner="hedge" if attempt.index else "original")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # 落后的请求同样记录样本，卡住的连接会提高对应的对冲等待时间
+        for task, attempt in tasks.items():
+            attempt.record()
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _hedged_download_to_file(url, path, timeout, on_chunk):
+    """对冲下载到文件：对冲请求写入 <path>.hedge，胜出后重命名为 path"""
+    hedge_path = f"{path}.hedge"
+
+    async def attempt_download(attempt, timeout):
+        size = 0
+
+        def write(chunk):
+            nonlocal size
+            f.write(chunk)
+            size += len(chunk)
+
+        target = hedge_path if attempt.index else path
+        with open(target, "wb") as f:
+            await _stream(url, timeout, attempt, write)
+        return target, size
+
+    try:
+        target, size = await _hedged(url, timeout, attempt_download)
+        if target != path:
+            os.replace(target, path)
+    finally:
+        if os.path.exists(hedge_path):
+            os.unlink(hedge_path)
+
+    if on_chunk is not None:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                on_chunk(chunk)
+    return size
+
+
+def _read_file(path):
+    """读取整个文件"""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@metrics.timed("download")
+async def download_bytes(url, timeout):
+    """下载 URL 内容到内存（结果 URL 已缓存时直接从磁盘读取）"""
+    import aiohttp
+
+    _note_download_origin(url)
+
+    cached_path = await asyncio.to_thread(download_cache.lookup, url)
+    if cached_path is not None:
+        try:
+            return await asyncio.to_thread(_read_file, cached_path)
+        except OSError:
+            # 缓存文件刚被其他进程清理，重新下载
+            pass
+
+    if HEDGE_DOWNLOADS:
+
+        async def attempt_download(attempt, timeout):
+            buffer = bytearray()
+            await _stream(url, timeout, attempt, buffer.extend)
+            return bytes(buffer)
+
+        content = await _hedged(url, timeout, attempt_download)
+    else:
+        session = get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            content = await response.read()
+    metrics.inc("download_bytes_total", len(content))
+    await asyncio.to_thread(download_cache.store_bytes, url, content)
+    return content
+
+
+@metrics.timed("download")
+async def download_to_file(url, path, timeout, on_chunk=None, link_cache=True):
+    """分块下载 URL 内容到文件，返回文件大小（结果 URL 已缓存时从缓存文件链接或复制）
+
+    Args:
+        on_chunk: 每写入一块数据后调用 on_chunk(chunk)，如边下载边计算哈希
+            （对冲下载或命中缓存时，改为写入完成后按块读取最终文件再调用）
+        link_cache: 是否与下载缓存共享同一文件（硬链接，无数据复制）；path 位于用户可见的输出目录时应为 False，
+            改为复制，避免文件被原地修改（如 ffmpeg -y 写回同一路径）时损坏之后复用的缓存
+    """
+    import aiohttp
+
+    _note_download_origin(url)
+
+    cached_path = await asyncio.to_thread(download_cache.lookup, url)
+    if cached_path is not None:
+        try:
+            return await asyncio.to_thread(_restore_cached, cached_path, path, on_chunk, link_cache)
+        except FileNotFoundError:
+            # 缓存文件刚被其他进程清理，重新下载
+            pass
+
+    # 边下载边计算内容哈希，作为缓存文件名
+    sha = hashlib.sha256()
+
+    def update(chunk):
+        sha.update(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+    if HEDGE_DOWNLOADS:
+        size = await _hedged_download_to_file(url, path, timeout, update)
+        metrics.inc("download_bytes_total", size)
+        await asyncio.to_thread(download_cache.store_file, url, path, sha.hexdigest(), link_cache)
+        return size
+
+    size = 0
+    session = get_session()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+                update(chunk)
+    metrics.inc("download_bytes_total", size)
+    await asyncio.to_thread(download_cache.store_file, url, path, sha.hexdigest(), link_cache)
+    return size
+
+
+def _try_link(src, dst):
+    """硬链接 src 到 dst，返回是否成功（跨文件系统等情况下失败）"""
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        return False
+
+
+def _restore_cached(cached_path, path, on_chunk, link=True):
+    """将缓存文件放到 path：link 为 True 时优先硬链接，否则（或链接失败时）复制；返回文件大小"""
+    if os.path.exists(path):
+        os.unlink(path)
+    if not (link and _try_link(cached_path, path)):
+        with open(cached_path, "rb") as src, open(path, "wb") as dst:
+            for chunk in iter(lambda: src.read(DOWNLOAD_CHUNK_SIZE), b""):
+                dst.write(chunk)
+    if on_chunk is not None:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                on_chunk(chunk)
+    return os.path.getsize(path)
@@ -0,0 +1,179 @@
+"""
+结果下载缓存
+DashScope 结果 URL（OSS 签名地址）下载的内容按 sha256 保存在状态目录的 downloads 下，索引以去掉签名参数的 URL 为 key，
+有效期与签名 URL 的有效期（Expires / x-oss-expires）一致；同一结果被多个节点使用或重新执行时直接从磁盘读取。
+索引保存在共享存储中，共享状态目录的多个 ComfyUI 进程互相命中；缓存文件先写临时文件再原子重命名，读到的总是完整文件
+
+设置环境变量 FUNART_WAN_DOWNLOAD_CACHE=0 关闭；FUNART_WAN_DOWNLOAD_CACHE_MAX_MB 限制缓存文件总大小（默认 2048），
+超出大小或条目数上限时先淘汰最早缓存的条目
+
+读写索引和缓存文件都会阻塞，事件循环上的调用方需通过 asyncio.to_thread 执行
+"""
+
+import calendar
+import hashlib
+import os
+import time
+import urllib.parse
+import uuid
+
+from . import metrics
+from .paths import get_state_directory
+from .store import open_store
+
+ENABLED = os.environ.get("FUNART_WAN_DOWNLOAD_CACHE", "1").lower() not in ("0", "false", "no")
+
+# URL 中没有有效期参数时的缓存时长（DashScope 结果保留 24 小时）
+DEFAULT_TTL = 24 * 3600
+
+MAX_SIZE = float(os.environ.get("FUNART_WAN_DOWNLOAD_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# 索引条目数上限
+MAX_ENTRIES = 500
+
+# 最近写入（或被再次缓存）的文件在该时长（秒）内不会被清理：其他进程可能刚写入文件、尚未写入索引
+PUBLISH_GRACE = 600
+
+# 每写入该数量的索引条目清理一次（清理需要遍历索引和缓存目录），两次清理之间可短暂超出上限
+PRUNE_EVERY = 20
+
+# 本进程上次清理后写入的条目数
+_writes_since_prune = 0
+
+_store = open_store("download_cache")
+
+
+def _directory():
+    directory = os.path.join(get_state_directory(), "downloads")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def url_key(url):
+    """去掉查询参数（签名、有效期）的 URL，同一结果重新签名后 key 不变"""
+    parsed = urllib.parse.urlsplit(url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+
+def url_expires(url):
+    """签名 URL 的过期时间（Unix 时间戳）：OSS V1 的 Expires，或 V4 的 x-oss-date + x-oss-expires"""
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    try:
+        if "Expires" in query:
+            return float(query["Expires"][0])
+        if "x-oss-date" in query and "x-oss-expires" in query:
+            signed_at = calendar.timegm(time.strptime(query["x-oss-date"][0], "%Y%m%dT%H%M%SZ"))
+            return signed_at + float(query["x-oss-expires"][0])
+    except ValueError:
+        pass
+    return time.time() + DEFAULT_TTL
+
+
+def lookup(url):
+    """返回 URL 对应的缓存文件路径，未命中、已过期或文件已被清理时返回 None"""
+    if not ENABLED:
+        return None
+    key = url_key(url)
+    entry = _store.get(key)
+    path = os.path.join(_directory(), entry["sha256"]) if entry is not None else None
+    hit = path is not None and entry["expires_at"] > time.time() and os.path.exists(path)
+    if entry is not None and not hit:
+        _store.delete(key)
+    metrics.cache_result("download_url", hit)
+    return path if hit else None
+
+
+def _prune():
+    """删除过期条目、超出上限时最早缓存的条目，以及不再被任何条目引用的缓存文件"""
+    now = time.time()
+    _store.prune(lambda _, entry: entry["expires_at"] <= now)
+
+    # 从最新的条目开始累计，超出上限的较早条目被淘汰（相同内容的文件只计一次）
+    kept, sizes = set(), {}
+    for key, entry in sorted(_store.items(), key=lambda item: item[1]["cached_at"], reverse=True):
+        size = sum(sizes.values()) + (0 if entry["sha256"] in sizes else entry["size"])
+        if len(kept) >= MAX_ENTRIES or size > MAX_SIZE:
+            continue
+        kept.add(key)
+        sizes[entry["sha256"]] = entry["size"]
+    _store.prune(lambda key, _: key not in kept)
+
+    referenced = {entry["sha256"] for _, entry in _store.items()}
+    directory = _directory()
+    for name in os.listdir(directory):
+        if name in referenced:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > PUBLISH_GRACE:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def _index(url, sha256, size):
+    """写入索引（已过期的 URL 不写入），每 PRUNE_EVERY 次写入清理一次"""
+    global _writes_since_prune
+    expires_at = url_expires(url)
+    if expires_at > time.time():
+        _store.set(url_key(url), {"sha256": sha256, "size": size, "expires_at": expires_at, "cached_at": time.time()})
+    _writes_since_prune += 1
+    if _writes_since_prune >= PRUNE_EVERY:
+        _writes_since_prune = 0
+        _prune()
+
+
+def _publish(sha256, write):
+    """发布缓存文件：已存在时刷新修改时间（避免被其他进程清理），否则由 write(part_path) 写入临时文件后原子重命名"""
+    cached_path = os.path.join(_directory(), sha256)
+    try:
+        os.utime(cached_path)
+        return cached_path
+    except FileNotFoundError:
+        pass
+    part_path = f"{cached_path}.{uuid.uuid4().hex}.part"
+    try:
+        write(part_path)
+        os.replace(part_path, cached_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+        raise
+    return cached_path
+
+
+def store_bytes(url, content):
+    """缓存下载到内存的内容"""
+    if not ENABLED:
+        return
+
+    def write(part_path):
+        with open(part_path, "wb") as f:
+            f.write(content)
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    _publish(sha256, write)
+    _index(url, sha256, len(content))
+
+
+def store_file(url, path, sha256, link=True):
+    """缓存下载到文件的内容：link 为 True 时硬链接到缓存目录（无数据复制），否则（或无法链接时）复制
+
+    path 位于用户可见的输出目录时应复制：与缓存共享的文件被原地修改会损坏之后复用的缓存
+    """
+    if not ENABLED:
+        return
+
+    def write(part_path):
+        if link:
+            try:
+                os.link(path, part_path)
+                return
+            except OSError:
+                pass
+        with open(path, "rb") as src, open(part_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                dst.write(chunk)
+
+    cached_path = _publish(sha256, write)
+    _index(url, sha256, os.path.getsize(cached_path))
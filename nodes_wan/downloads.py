@@ -0,0 +1,56 @@
+"""
+结果文件保存
+视频等大文件边下载边计算 sha256，按内容哈希命名：相同内容只保存一份；
+可直接下载到最终输出目录，省去保存节点再复制一遍
+"""
+
+import hashlib
+import os
+import uuid
+
+from . import metrics
+from .dashscope_http import download_to_file
+
+# 文件名中保留的哈希位数
+HASH_NAME_LENGTH = 16
+
+
+def resolve_prefix(base_dir, filename_prefix):
+    """解析文件名前缀（可包含子目录，如 video/wan），返回 (目录, 文件名前缀)
+
+    Raises:
+        ValueError: 前缀指向 base_dir 之外
+    """
+    base_dir = os.path.abspath(base_dir)
+    full_prefix = os.path.abspath(os.path.join(base_dir, os.path.normpath(filename_prefix)))
+    if os.path.commonpath([base_dir, full_prefix]) != base_dir or full_prefix == base_dir:
+        raise ValueError(f"Invalid filename_prefix: {filename_prefix!r}, must be a relative path inside the output directory")
+    return os.path.dirname(full_prefix), os.path.basename(full_prefix)
+
+
+async def download_content_addressed(url, directory, prefix, suffix, timeout, link_cache=True):
+    """下载到 directory，文件命名为 <prefix>_<内容哈希><suffix>
+
+    先写入同目录下的临时文件，完成后原子重命名；目标文件已存在（内容相同）时丢弃本次下载。
+    directory 为用户可见的输出目录时 link_cache 应为 False（见 download_to_file）
+
+    Returns:
+        (path, size, deduplicated)
+    """
+    os.makedirs(directory, exist_ok=True)
+    part_path = os.path.join(directory, f".{prefix}_{uuid.uuid4().hex}.part")
+    sha = hashlib.sha256()
+    try:
+        size = await download_to_file(url, part_path, timeout, on_chunk=sha.update, link_cache=link_cache)
+        path = os.path.join(directory, f"{prefix}_{sha.hexdigest()[:HASH_NAME_LENGTH]}{suffix}")
+        deduplicated = os.path.exists(path)
+        metrics.cache_result("content_hash", deduplicated)
+        if deduplicated:
+            os.unlink(part_path)
+        else:
+            os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+        raise
+    return path, size, deduplicated
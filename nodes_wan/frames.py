@@ -0,0 +1,145 @@
+"""
+视频帧提取
+将生成的视频解码为 ComfyUI IMAGE tensor：按步长抽帧、缩放到目标尺寸、限制最大帧数，
+解码结果写入预分配的 uint8 缓冲区，最后一步才分块转换为 float32，避免整段视频以 float32 驻留内存
+"""
+
+import importlib.util
+import math
+import os
+import time
+import uuid
+
+from . import metrics
+from .paths import get_temp_directory
+
+# numpy/torch/av 在首次解码时才导入
+AV_AVAILABLE = importlib.util.find_spec("av") is not None
+
+# uint8 → float32 分块转换的帧数
+CONVERT_CHUNK_FRAMES = 16
+
+
+def _target_size(src_width, src_height, width, height):
+    """计算输出尺寸，width/height 为 0 表示按另一边等比缩放（都为 0 时保持原尺寸）"""
+    if width > 0 and height > 0:
+        return width, height
+    if width > 0:
+        return width, max(1, round(src_height * width / src_width))
+    if height > 0:
+        return max(1, round(src_width * height / src_height)), height
+    return src_width, src_height
+
+
+def _estimate_frame_count(stream):
+    """估算视频总帧数（容器未记录帧数时按时长 × 帧率估算）"""
+    if stream.frames:
+        return stream.frames
+    if stream.duration is not None and stream.time_base is not None and stream.average_rate:
+        return math.ceil(float(stream.duration * stream.time_base * stream.average_rate)) + 1
+    raise ValueError("Cannot determine video frame count")
+
+
+def _mmap_path():
+    """缓冲区映射文件路径"""
+    frames_dir = os.path.join(get_temp_directory(), "frames")
+    os.makedirs(frames_dir, exist_ok=True)
+    return os.path.join(frames_dir, f"{uuid.uuid4().hex}.bin")
+
+
+def _unlink(path):
+    """映射建立后删除文件名，映射在进程内仍然有效，释放时自动回收磁盘空间"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _allocate_uint8(shape, mmap):
+    """分配 uint8 解码缓冲区"""
+    import numpy as np
+
+    if not mmap:
+        return np.empty(shape, dtype=np.uint8)
+    path = _mmap_path()
+    buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=shape)
+    _unlink(path)
+    return buffer
+
+
+def _allocate_float32(shape, mmap):
+    """分配 float32 输出 tensor"""
+    import torch
+
+    if not mmap:
+        return torch.empty(shape, dtype=torch.float32)
+    path = _mmap_path()
+    tensor = torch.from_file(path, shared=True, size=math.prod(shape), dtype=torch.float32).view(shape)
+    _unlink(path)
+    return tensor
+
+
+def empty_frames():
+    """不解码时的 frames 输出：0 帧的 IMAGE tensor [0, 1, 1, C]，不读取视频文件"""
+    import torch
+
+    return torch.zeros((0, 1, 1, 3), dtype=torch.float32)
+
+
+@metrics.timed("decode")
+def decode_frames(video_path, stride=1, max_frames=0, width=0, height=0, mmap=False):
+    """解码视频帧为 ComfyUI IMAGE tensor
+
+    Args:
+        video_path: 视频文件路径
+        stride: 抽帧步长，每 stride 帧取 1 帧
+        max_frames: 最多输出帧数，0 表示不限制
+        width/height: 输出尺寸，0 表示按另一边等比缩放（都为 0 时保持原尺寸）
+        mmap: 是否使用磁盘文件映射作为缓冲区（降低常驻内存）
+
+    Returns:
+        tensor: [N, H, W, C] float32，值范围 [0, 1]
+    """
+    if not AV_AVAILABLE:
+        raise ImportError("av 未安装，无法解码视频帧。请运行: pip install av")
+    import av
+    import torch
+
+    start_time = time.time()
+
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+
+        out_width, out_height = _target_size(stream.codec_context.width, stream.codec_context.height, width, height)
+        capacity = math.ceil(_estimate_frame_count(stream) / stride)
+        if max_frames > 0:
+            capacity = min(capacity, max_frames)
+
+        buffer = _allocate_uint8((capacity, out_height, out_width, 3), mmap)
+
+        count = 0
+        for index, frame in enumerate(container.decode(stream)):
+            if count >= capacity:
+                break
+            if index % stride:
+                continue
+            # 由 libswscale 完成缩放与颜色空间转换，直接得到 uint8 RGB
+            buffer[count] = frame.reformat(width=out_width, height=out_height, format="rgb24").to_ndarray()
+            count += 1
+
+    if count == 0:
+        raise RuntimeError(f"No frames decoded from video: {video_path}")
+
+    # 最后一步分块转换为 float32，中间结果不超过 CONVERT_CHUNK_FRAMES 帧
+    tensor = _allocate_float32((count, out_height, out_width, 3), mmap)
+    for begin in range(0, count, CONVERT_CHUNK_FRAMES):
+        end = min(begin + CONVERT_CHUNK_FRAMES, count)
+        tensor[begin:end] = torch.from_numpy(buffer[begin:end]).to(torch.float32).div_(255.0)
+    del buffer
+
+    elapsed_time = time.time() - start_time
+    size_mb = tensor.numel() * 4 / (1024 * 1024)
+    print(f"decode_frames time: {elapsed_time:.3f}s (frames: {count}, size: {out_width}*{out_height}, tensor: {size_mb:.1f}MB)")
+
+    return tensor
@@ -0,0 +1,133 @@
+"""
+图片原始字节
+图像节点下载的原始图片按内容哈希保存在临时目录，并与解码得到的 IMAGE tensor 关联；
+保存时若 tensor 未被修改，可直接写出原始字节，无需重新编码
+
+临时目录中的文件超过数量上限或 FUNART_WAN_IMAGE_ORIGINALS_MAX_MB（默认 1024）时，先清理最早保存且不再关联任何 tensor 的文件
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+import weakref
+
+from .downloads import HASH_NAME_LENGTH
+from .paths import get_temp_directory
+
+# 按文件头识别图片格式
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"RIFF", ".webp"),
+)
+
+MAX_SIZE = float(os.environ.get("FUNART_WAN_IMAGE_ORIGINALS_MAX_MB", "1024")) * 1024 * 1024
+
+# 文件数上限
+MAX_FILES = 500
+
+# 最近写入的文件在该时长（秒）内不会被清理：其他进程可能刚写入、尚未关联 tensor
+PUBLISH_GRACE = 600
+
+# id(tensor) -> (weakref, 原始文件路径, tensor 指纹)
+_originals = {}
+_lock = threading.Lock()
+
+
+def _extension(content):
+    for signature, extension in _SIGNATURES:
+        if content.startswith(signature) and (extension != ".webp" or content[8:12] == b"WEBP"):
+            return extension
+    return None
+
+
+def _fingerprint(tensor):
+    """tensor 内容指纹，用于确认保存时 tensor 未被原地修改"""
+    array = tensor.detach().cpu().contiguous().numpy()
+    return (tuple(array.shape), str(array.dtype), hashlib.blake2b(array.data, digest_size=16).hexdigest())
+
+
+def _prune(directory):
+    """超出文件数或大小上限时，从最早保存的文件开始删除（仍关联 tensor 的文件和最近写入的文件除外）"""
+    with _lock:
+        referenced = {path for _, path, _ in _originals.values()}
+    files = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    now = time.time()
+    count, size = 0, 0
+    for mtime, file_size, path in sorted(files, reverse=True):
+        count += 1
+        size += file_size
+        if (count <= MAX_FILES and size <= MAX_SIZE) or path in referenced or now - mtime <= PUBLISH_GRACE:
+            continue
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def store(content):
+    """将原始字节按内容哈希保存到临时目录，返回文件路径（无法识别格式时返回 None）"""
+    extension = _extension(content)
+    if extension is None:
+        return None
+
+    directory = os.path.join(get_temp_directory(), "wan_images")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{hashlib.sha256(content).hexdigest()[:HASH_NAME_LENGTH]}{extension}")
+    try:
+        # 已存在时刷新修改时间，避免被清理
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    part_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(part_path, "wb") as f:
+        f.write(content)
+    os.replace(part_path, path)
+    _prune(directory)
+    return path
+
+
+def remember(tensor, path):
+    """关联 tensor 与原始文件，tensor 被回收时自动解除"""
+    if path is None:
+        return
+    key = id(tensor)
+
+    def forget(_, key=key):
+        with _lock:
+            _originals.pop(key, None)
+
+    entry = (weakref.ref(tensor, forget), path, _fingerprint(tensor))
+    with _lock:
+        _originals[key] = entry
+
+
+def keep(tensor, content):
+    """保存原始字节并与 tensor 关联"""
+    remember(tensor, store(content))
+
+
+def lookup(tensor):
+    """返回 tensor 对应的原始文件路径；tensor 不是图像节点的输出、已被修改或文件已被清理时返回 None"""
+    with _lock:
+        entry = _originals.get(id(tensor))
+    if entry is None:
+        return None
+
+    ref, path, fingerprint = entry
+    if ref() is not tensor or not os.path.exists(path):
+        return None
+    if _fingerprint(tensor) != fingerprint:
+        return None
+    return path
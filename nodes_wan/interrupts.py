@@ -0,0 +1,65 @@
+"""
+ComfyUI 中断处理
+用户在 ComfyUI 中点击取消后，立即停止等待 DashScope 任务并把控制权交还给 ComfyUI 队列，
+默认同时取消远程任务；设置 FUNART_WAN_KEEP_INTERRUPTED_TASKS=1 时保留任务日志，重新执行相同节点可取回结果
+"""
+
+import asyncio
+import os
+import sys
+
+# 检查中断标志的间隔（秒）
+INTERRUPT_CHECK_INTERVAL = 0.5
+
+# 中断时保留远程任务及任务日志，而不是取消
+KEEP_INTERRUPTED_TASKS = os.environ.get("FUNART_WAN_KEEP_INTERRUPTED_TASKS", "0").lower() in ("1", "true", "yes")
+
+
+def _model_management():
+    # 只使用已加载的模块，非 ComfyUI 环境（如命令行批量生成）下不导入 torch 等依赖
+    return sys.modules.get("comfy.model_management")
+
+
+def interrupted():
+    """ComfyUI 是否请求中断当前执行"""
+    model_management = _model_management()
+    return model_management is not None and model_management.processing_interrupted()
+
+
+def is_interrupt(error):
+    """异常是否为 ComfyUI 的中断异常"""
+    model_management = _model_management()
+    return model_management is not None and isinstance(error, model_management.InterruptProcessingException)
+
+
+async def interruptible(coro):
+    """运行 coro，期间 ComfyUI 请求中断时取消它（coro 内可捕获 CancelledError 做清理），
+    并抛出 ComfyUI 的 InterruptProcessingException，由 ComfyUI 按中断处理
+
+    非 ComfyUI 环境下直接运行
+    """
+    model_management = _model_management()
+    if model_management is None:
+        return await coro
+
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=INTERRUPT_CHECK_INTERVAL)
+            if done:
+                return task.result()
+            if model_management.processing_interrupted():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    task.cancel()
+    try:
+        # 等待清理（如取消远程任务）完成；取消前恰好已完成时仍返回结果
+        return await task
+    except asyncio.CancelledError:
+        pass
+    # 抛出 InterruptProcessingException 并复位中断标志
+    model_management.throw_exception_if_processing_interrupted()
+    raise model_management.InterruptProcessingException()
@@ -0,0 +1,112 @@
+"""
+任务看板
+记录进程内正在执行的 DashScope 任务（节点、模型、任务 ID、状态、已用时间、ETA）
+以及最近完成的任务及其各阶段耗时，供 /funart/wan/jobs 接口查询
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+# 保留的最近完成任务数
+RECENT_LIMIT = 50
+
+# 任务状态：本地排队 → 提交中 → 服务端排队 → 生成中 → 下载/处理结果
+STATES = ("queued", "submitting", "pending", "running", "downloading")
+
+# DashScope 任务状态 → 看板状态
+_SERVER_STATES = {"PENDING": "pending", "RUNNING": "running"}
+
+_lock = threading.Lock()
+_active = {}
+_recent = collections.deque(maxlen=RECENT_LIMIT)
+_ids = itertools.count(1)
+
+
+def start(node, model, profile, priority="normal"):
+    """登记一个新任务，返回任务看板 ID"""
+    job_id = next(_ids)
+    now = time.time()
+    with _lock:
+        _active[job_id] = {
+            "id": job_id,
+            "node": node,
+            "model": model,
+            "profile": profile,
+            "priority": priority,
+            "task_id": None,
+            "state": "queued",
+            "resumed": False,
+            "started_at": now,
+            "state_since": now,
+            "eta_at": None,
+            "stages": {},
+        }
+    return job_id
+
+
+def update(job_id, state=None, **fields):
+    """更新任务字段；切换状态时记录上一状态的耗时"""
+    now = time.time()
+    with _lock:
+        job = _active.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        if state is not None and state != job["state"]:
+            _add_stage(job, now)
+            job["state"] = state
+            job["state_since"] = now
+
+
+def server_status(job_id, status):
+    """按 DashScope 任务状态（PENDING / RUNNING）更新任务状态"""
+    state = _SERVER_STATES.get(status)
+    if state is not None:
+        update(job_id, state)
+
+
+def finish(job_id, status, error=None):
+    """任务结束（succeeded / failed / cancelled），移入最近完成列表"""
+    now = time.time()
+    with _lock:
+        job = _active.pop(job_id, None)
+        if job is None:
+            return
+        _add_stage(job, now)
+        job.update(state=status, error=error, finished_at=now)
+        _recent.append(job)
+
+
+def _add_stage(job, now):
+    stage = job["state"]
+    job["stages"][stage] = round(job["stages"].get(stage, 0.0) + now - job["state_since"], 3)
+
+
+def _view(job, now):
+    view = {key: value for key, value in job.items() if key not in ("state_since", "eta_at")}
+    end = job.get("finished_at", now)
+    view["elapsed"] = round(end - job["started_at"], 3)
+    if "finished_at" not in job:
+        stages = dict(job["stages"])
+        stages[job["state"]] = round(stages.get(job["state"], 0.0) + now - job["state_since"], 3)
+        view["stages"] = stages
+        view["eta"] = None if job["eta_at"] is None else round(max(job["eta_at"] - now, 0.0), 1)
+    return view
+
+
+def snapshot():
+    """当前任务及最近完成任务（最新的在前）
+
+    Returns:
+        {"time", "counts": {state: n}, "active": [...], "recent": [...]}
+    """
+    now = time.time()
+    with _lock:
+        active = [_view(job, now) for job in _active.values()]
+        recent = [_view(job, now) for job in reversed(_recent)]
+    counts = {state: 0 for state in STATES}
+    for job in active:
+        counts[job["state"]] += 1
+    return {"time": now, "counts": counts, "active": active, "recent": recent}
@@ -0,0 +1,115 @@
+"""
+历史耗时统计
+按 模型/分辨率(尺寸)/时长 记录各阶段耗时（本地排队、服务端排队、生成、下载），
+提供中位数/P90 预测，用于预估完成时间（ETA）、调整轮询时机以及容量规划
+"""
+
+import datetime
+import math
+import time
+
+from .store import open_store
+
+_store = open_store("latency_stats")
+
+# 各阶段
+STAGES = ("local_queue", "server_queue", "generation", "download")
+
+# 每个阶段只保留最近的样本数
+MAX_SAMPLES = 100
+
+# 样本数少于该值时不做预测
+MIN_SAMPLES = 3
+
+
+def profile_key(model, parameters):
+    """耗时画像：模型 + 分辨率（I2V）或尺寸（T2I/T2V/图像编辑）+ 时长（视频）"""
+    parts = [model, parameters.get("resolution") or parameters.get("size") or "auto"]
+    if "duration" in parameters:
+        parts.append(f"{parameters['duration']}s")
+    return "|".join(str(part) for part in parts)
+
+
+def record(profile, stage, seconds):
+    """记录一个阶段耗时样本"""
+    if seconds is None or seconds < 0:
+        return
+
+    def append(entry):
+        entry = entry or {}
+        entry[stage] = (entry.get(stage, []) + [round(seconds, 3)])[-MAX_SAMPLES:]
+        entry["updated_at"] = time.time()
+        return entry
+
+    # 多个进程共享统计时，读改写在同一事务中完成，不会丢失其他进程的样本
+    _store.update(profile, append)
+
+
+def _quantile(sorted_samples, q):
+    """最近秩法求分位数"""
+    index = max(0, math.ceil(q * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+def predict(profile, stage):
+    """预测阶段耗时
+
+    Returns:
+        {"median", "p90", "count"}，样本不足时返回 None
+    """
+    return _predict_samples((_store.get(profile) or {}).get(stage, []))
+
+
+def _predict_samples(samples):
+    """按样本计算中位数/P90，样本不足时返回 None"""
+    samples = sorted(samples)
+    if len(samples) < MIN_SAMPLES:
+        return None
+    return {"median": _quantile(samples, 0.5), "p90": _quantile(samples, 0.9), "count": len(samples)}
+
+
+def predict_total(profile, stages=("server_queue", "generation", "download")):
+    """预测多个阶段的总耗时（中位数之和、P90 之和），任一阶段样本不足时返回 None"""
+    predictions = [predict(profile, stage) for stage in stages]
+    if any(prediction is None for prediction in predictions):
+        return None
+    return {
+        "median": sum(prediction["median"] for prediction in predictions),
+        "p90": sum(prediction["p90"] for prediction in predictions),
+    }
+
+
+def summary():
+    """全部画像的各阶段统计，用于容量规划（GET /funart/wan/latency）
+
+    Returns:
+        {profile: {stage: {"median", "p90", "count"}}}
+    """
+    result = {}
+    for profile, entry in sorted(_store.items()):
+        stages = {stage: _predict_samples(entry.get(stage, [])) for stage in STAGES}
+        result[profile] = {stage: value for stage, value in stages.items() if value is not None}
+    return result
+
+
+def _parse_time(value):
+    """解析 DashScope 返回的时间，如 2025-01-01 12:00:00.123"""
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f")
+    except (TypeError, ValueError):
+        return None
+
+
+def server_durations(output):
+    """从任务 output 的 submit_time / scheduled_time / end_time 计算服务端排队和生成耗时
+
+    Returns:
+        (server_queue, generation)，缺少时间字段时对应项为 None
+    """
+    submit_time = _parse_time(output.get("submit_time"))
+    scheduled_time = _parse_time(output.get("scheduled_time"))
+    end_time = _parse_time(output.get("end_time"))
+
+    server_queue = (scheduled_time - submit_time).total_seconds() if submit_time and scheduled_time else None
+    generation = (end_time - scheduled_time).total_seconds() if scheduled_time and end_time else None
+    return server_queue, generation
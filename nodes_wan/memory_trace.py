@@ -0,0 +1,146 @@
+"""
+阶段内存峰值追踪（默认关闭）
+设置环境变量 FUNART_WAN_MEMORY_TRACE=1 后，各阶段（编码、base64 请求体、请求、下载、解码等）执行期间
+统计 Python/NumPy 堆内存峰值（tracemalloc）和进程常驻内存峰值（RSS，含 torch CPU 张量），
+并输出阶段结束时新增分配最多的代码位置，用于定位内存占用过高（如 OOM）的阶段
+
+    FUNART_WAN_MEMORY_TRACE_TOP   输出的分配位置数，默认 5，0 表示不输出（不再做分配快照，开销更小）
+    FUNART_WAN_MEMORY_TRACE_MIN_MB  峰值增量低于该值（MB）的阶段不输出日志，默认 1
+
+关闭时只有一次布尔判断的开销
+"""
+
+import contextlib
+import os
+import threading
+import time
+import tracemalloc
+
+ENABLED = os.environ.get("FUNART_WAN_MEMORY_TRACE", "0").lower() in ("1", "true", "yes")
+
+TOP_SITES = int(os.environ.get("FUNART_WAN_MEMORY_TRACE_TOP", "5"))
+
+LOG_MIN_MB = float(os.environ.get("FUNART_WAN_MEMORY_TRACE_MIN_MB", "1"))
+
+MB = 1024 * 1024
+
+_lock = threading.Lock()
+# 正在执行的阶段；峰值计数被重置前先把当前峰值并入所有进行中的阶段，使嵌套/并发的阶段都能得到准确峰值
+_active = {}
+_summary = {}
+_hwm_resettable = True
+
+
+def _read_status(field):
+    """读取 /proc/self/status 中的内存字段（字节），非 Linux 平台返回 None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _rss_peak():
+    """自上次重置以来的 RSS 峰值（VmHWM），无法重置时退化为当前 RSS"""
+    return _read_status("VmHWM" if _hwm_resettable else "VmRSS")
+
+
+def _reset_rss_peak():
+    global _hwm_resettable
+    if not _hwm_resettable:
+        return
+    try:
+        # 写入 5 将 VmHWM 重置为当前 RSS（Linux 4.0+）
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        _hwm_resettable = False
+
+
+def _fold_peaks():
+    """把当前峰值并入所有进行中的阶段，然后重置峰值计数（需持有 _lock）"""
+    python_peak = tracemalloc.get_traced_memory()[1]
+    rss_peak = _rss_peak()
+    for record in _active.values():
+        record["python_peak"] = max(record["python_peak"], python_peak)
+        if rss_peak is not None:
+            record["rss_peak"] = max(record["rss_peak"] or 0, rss_peak)
+    tracemalloc.reset_peak()
+    _reset_rss_peak()
+
+
+# 不计入分配位置统计的代码（快照本身、模块导入）
+_IGNORED_SITES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+
+def _format_sites(before, after):
+    # 按代码行汇总后再排除（对快照做 filter_traces 在分配很多时非常慢）
+    stats = [stat for stat in after.compare_to(before, "lineno") if stat.size_diff > 0 and stat.traceback[0].filename not in _IGNORED_SITES]
+    lines = []
+    for stat in stats[:TOP_SITES]:
+        frame = stat.traceback[0]
+        lines.append(f"    +{stat.size_diff / MB:.1f}MB ({stat.count_diff:+d} blocks) {frame.filename}:{frame.lineno}")
+    return lines
+
+
+@contextlib.contextmanager
+def track(stage, node=""):
+    """统计 with 块执行期间的内存峰值（未开启时直接执行）"""
+    if not ENABLED:
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot() if TOP_SITES > 0 else None
+
+    with _lock:
+        _fold_peaks()
+        python_start = tracemalloc.get_traced_memory()[0]
+        rss_start = _read_status("VmRSS")
+        record = {"python_peak": python_start, "rss_peak": rss_start}
+        _active[id(record)] = record
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _fold_peaks()
+            del _active[id(record)]
+        elapsed = time.perf_counter() - start_time
+
+        python_delta = (record["python_peak"] - python_start) / MB
+        rss_delta = (record["rss_peak"] - rss_start) / MB if rss_start is not None and record["rss_peak"] is not None else None
+        _record(node, stage, python_delta, rss_delta)
+
+        if max(python_delta, rss_delta or 0) >= LOG_MIN_MB:
+            rss_text = f"{rss_delta:.1f}MB" if rss_delta is not None else "n/a"
+            print(f"[memory] {node or '-'}/{stage}: python peak +{python_delta:.1f}MB, rss peak +{rss_text} ({elapsed:.3f}s)")
+            if before is not None:
+                for line in _format_sites(before, tracemalloc.take_snapshot()):
+                    print(line)
+
+
+def _record(node, stage, python_delta, rss_delta):
+    with _lock:
+        entry = _summary.setdefault(
+            (node, stage), {"count": 0, "python_peak_mb": 0.0, "rss_peak_mb": 0.0, "last_python_peak_mb": 0.0, "last_rss_peak_mb": None}
+        )
+        entry["count"] += 1
+        entry["python_peak_mb"] = round(max(entry["python_peak_mb"], python_delta), 2)
+        entry["last_python_peak_mb"] = round(python_delta, 2)
+        if rss_delta is not None:
+            entry["rss_peak_mb"] = round(max(entry["rss_peak_mb"], rss_delta), 2)
+            entry["last_rss_peak_mb"] = round(rss_delta, 2)
+
+
+def summary():
+    """各节点各阶段的内存峰值增量（最大值及最近一次，MB）"""
+    with _lock:
+        return {
+            "enabled": ENABLED,
+            "stages": [{"node": node, "stage": stage, **entry} for (node, stage), entry in sorted(_summary.items())],
+        }
@@ -0,0 +1,173 @@
+"""
+运行指标
+各阶段耗时（编码、排队、提交、生成、轮询、下载、解码）以直方图聚合，
+上传/下载字节数、重试次数、缓存命中等以计数器累计，可导出为 Prometheus 文本或 JSON
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+from . import memory_trace
+
+# 阶段耗时直方图的分桶上限（秒）
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, float("inf"))
+
+METRIC_PREFIX = "funart_wan"
+
+# 指标说明（Prometheus HELP）
+_HELP = {
+    "stage_seconds": "Time spent in each stage of a Wan node execution",
+    "upload_bytes_total": "Request body bytes uploaded to DashScope",
+    "download_bytes_total": "Result bytes downloaded from DashScope",
+    "retries_total": "Retried DashScope requests",
+    "polls_total": "DashScope task status queries",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "tasks_total": "Finished DashScope tasks by node and status",
+    "hedged_downloads_total": "Hedged downloads by the request that finished first",
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+# 当前执行的节点名，随 asyncio 任务和 asyncio.to_thread 自动传递
+_node = contextvars.ContextVar("funart_wan_node", default="")
+
+
+def set_node(node):
+    """设置当前上下文的节点名，之后记录的阶段耗时都归属该节点"""
+    _node.set(node)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(stage, seconds, node=None):
+    """记录一个阶段耗时样本"""
+    if seconds is None or seconds < 0:
+        return
+    key = ("stage_seconds", _labels({"stage": stage, "node": node or _node.get()}))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][index] += 1
+                break
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def inc(name, value=1, **labels):
+    """累加计数器"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def cache_result(cache, hit):
+    """记录一次缓存查询结果"""
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+@contextlib.contextmanager
+def span(stage):
+    """统计 with 块的耗时（异常退出同样计入）；开启内存追踪时同时统计内存峰值（见 memory_trace）"""
+    start_time = time.perf_counter()
+    try:
+        if memory_trace.ENABLED:
+            with memory_trace.track(stage, _node.get()):
+                yield
+        else:
+            yield
+    finally:
+        observe(stage, time.perf_counter() - start_time)
+
+
+def timed(stage):
+    """装饰器：统计函数（同步或 async）的耗时"""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot():
+    """导出全部指标（JSON 格式）"""
+    with _lock:
+        histograms = [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "buckets": {("+Inf" if bound == float("inf") else str(bound)): count for bound, count in zip(BUCKETS, value["buckets"])},
+                "sum": round(value["sum"], 6),
+                "count": value["count"],
+            }
+            for (name, labels), value in sorted(_histograms.items())
+        ]
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(_counters.items())]
+    return {"histograms": histograms, "counters": counters}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def render_prometheus():
+    """导出全部指标（Prometheus 文本格式）"""
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+        for name in sorted({name for (name, _), _ in histograms}):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (histogram_name, labels), value in histograms:
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, value["buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{metric}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {value['count']}")
+
+        for name in sorted({name for (name, _), _ in counters}):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,37 @@
+"""
+Wan 节点使用的目录
+"""
+
+import os
+
+try:
+    import folder_paths
+
+    FOLDER_PATHS_AVAILABLE = True
+except ImportError:
+    FOLDER_PATHS_AVAILABLE = False
+
+
+def get_output_directory():
+    """获取输出目录（ComfyUI output）"""
+    if FOLDER_PATHS_AVAILABLE:
+        return folder_paths.get_output_directory()
+    # 回退到当前目录下的 output 文件夹
+    return os.path.join(os.getcwd(), "output")
+
+
+def get_temp_directory():
+    """获取临时目录（output/temp）"""
+    temp_dir = os.path.join(get_output_directory(), "temp")
+    os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+
+def get_state_directory():
+    """获取状态目录（任务日志、缓存等），默认 output/temp/wan_state
+
+    可通过环境变量 FUNART_WAN_STATE_DIR 指定
+    """
+    state_dir = os.environ.get("FUNART_WAN_STATE_DIR") or os.path.join(get_temp_directory(), "wan_state")
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
@@ -0,0 +1,137 @@
+"""
+请求预检
+在任何网络 I/O 之前校验输入图片/音频和输出尺寸是否满足 DashScope 的限制，
+并可按目标输出分辨率自动缩放输入图片，避免上传注定被拒绝或远超需要的数据
+"""
+
+import math
+
+MB = 1024 * 1024
+
+# 首帧图片（I2V）：宽高 [360, 2000] 像素，不超过 10MB
+I2V_IMAGE_LIMITS = {"min_side": 360, "max_side": 2000, "max_bytes": 10 * MB}
+
+# 图像编辑输入图片：宽高 [384, 5000] 像素，不超过 10MB
+I2I_IMAGE_LIMITS = {"min_side": 384, "max_side": 5000, "max_bytes": 10 * MB}
+
+# 驱动音频：时长 [3, 30] 秒，不超过 15MB
+AUDIO_LIMITS = {"min_seconds": 3, "max_seconds": 30, "max_bytes": 15 * MB}
+
+# I2V 各分辨率档位的输出像素数（16:9），用作自动缩放的目标
+RESOLUTION_PIXELS = {"480P": 832 * 480, "720P": 1280 * 720, "1080P": 1920 * 1080}
+
+# 编码后超出大小限制时的最大重新编码次数
+MAX_REENCODE_ATTEMPTS = 3
+
+
+def image_size(tensor):
+    """返回 IMAGE tensor 的 (width, height)"""
+    if len(tensor.shape) == 4:
+        return tensor.shape[2], tensor.shape[1]
+    return tensor.shape[1], tensor.shape[0]
+
+
+def plan_image_size(width, height, limits, target_pixels=None, auto_resize=False, label="Image"):
+    """计算上传尺寸
+
+    auto_resize 为 False 时只校验宽高范围，返回原尺寸；
+    为 True 时等比缩放：像素数超过 target_pixels 时缩小到目标像素数，并保证宽高落在限制范围内
+
+    Raises:
+        ValueError: 尺寸不满足限制（或宽高比过于极端，无法通过缩放满足）
+    """
+    min_side, max_side = limits["min_side"], limits["max_side"]
+
+    if not auto_resize:
+        if min(width, height) < min_side or max(width, height) > max_side:
+            raise ValueError(
+                f"{label} size {width}*{height} out of range. "
+                f"Width and height must be between {min_side} and {max_side} pixels (enable auto_resize to fit automatically)"
+            )
+        return width, height
+
+    scale = 1.0
+    if target_pixels and width * height > target_pixels:
+        scale = math.sqrt(target_pixels / (width * height))
+    scale = min(scale, max_side / max(width, height))
+    scale = max(scale, min_side / min(width, height))
+
+    new_width, new_height = round(width * scale), round(height * scale)
+    if min(new_width, new_height) < min_side or max(new_width, new_height) > max_side:
+        raise ValueError(f"{label} aspect ratio ({width}:{height}) cannot fit within {min_side}-{max_side} pixels per side")
+    return new_width, new_height
+
+
+def encode_within_limit(encode, width, height, limits, auto_resize=False, label="Image"):
+    """编码图片并校验编码后大小
+
+    Args:
+        encode: encode((width, height)) -> MediaPayload
+        width/height: plan_image_size 得到的上传尺寸
+        auto_resize: 超出大小限制时是否按比例缩小后重新编码
+
+    Raises:
+        ValueError: 编码后大小超过限制
+    """
+    max_bytes = limits["max_bytes"]
+    for _ in range(MAX_REENCODE_ATTEMPTS):
+        payload = encode((width, height))
+        if payload.size <= max_bytes:
+            return payload
+        payload.close()
+
+        size_mb = payload.size / MB
+        if not auto_resize:
+            raise ValueError(f"{label} too large after encoding ({size_mb:.2f}MB), must not exceed {max_bytes // MB}MB")
+
+        # 编码大小大致与像素数成正比，按比例缩小并留出余量
+        scale = math.sqrt(max_bytes / payload.size) * 0.9
+        width, height = plan_image_size(round(width * scale), round(height * scale), limits, auto_resize=True, label=label)
+        print(f"Warning: {label} too large after encoding ({size_mb:.2f}MB), re-encoding at {width}*{height}")
+
+    raise ValueError(f"{label} still exceeds {max_bytes // MB}MB after {MAX_REENCODE_ATTEMPTS} attempts")
+
+
+def check_audio(audio, limits=AUDIO_LIMITS):
+    """校验音频时长和编码后（16-bit WAV）大小
+
+    Raises:
+        ValueError: 不满足限制
+    """
+    waveform = audio["waveform"]
+    sample_rate = audio["sample_rate"]
+
+    samples = waveform.shape[-1]
+    channels = waveform.shape[-2] if len(waveform.shape) >= 2 else 1
+    duration = samples / sample_rate
+    if duration < limits["min_seconds"] or duration > limits["max_seconds"]:
+        raise ValueError(
+            f"Audio duration {duration:.2f}s out of range. Must be between {limits['min_seconds']}s and {limits['max_seconds']}s"
+        )
+
+    encoded_bytes = samples * channels * 2 + 44
+    if encoded_bytes > limits["max_bytes"]:
+        raise ValueError(
+            f"Audio too large after encoding ({encoded_bytes / MB:.2f}MB), must not exceed {limits['max_bytes'] // MB}MB. "
+            f"Reduce sample rate or convert to mono"
+        )
+
+
+def check_output_size(width, height, min_pixels, max_pixels, min_label, max_label):
+    """校验输出尺寸：总像素在 [min_pixels, max_pixels] 之间，宽高比在 [1:4, 4:1] 之间
+
+    Raises:
+        ValueError: 不满足限制
+    """
+    total_pixels = width * height
+    if total_pixels < min_pixels or total_pixels > max_pixels:
+        raise ValueError(
+            f"Total pixels ({width}*{height}={total_pixels}) out of range. "
+            f"Must be between {min_pixels} ({min_label}) and {max_pixels} ({max_label})"
+        )
+
+    aspect_ratio = width / height
+    if aspect_ratio < 0.25 or aspect_ratio > 4.0:
+        raise ValueError(f"Aspect ratio ({width}:{height} = {aspect_ratio:.2f}) out of range. " f"Must be between 1:4 (0.25) and 4:1 (4.0)")
+
+    return total_pixels, aspect_ratio
@@ -0,0 +1,110 @@
+"""
+连接预热（默认关闭）
+设置环境变量 FUNART_WAN_PREWARM=1 后，扩展加载时在后台事件循环上向 DashScope API 及下载地址发起 HEAD 请求，
+提前完成 DNS 解析、TCP 和 TLS 握手，连接保留在共享连接池中，重启后的首个任务无需再付出建连耗时；
+之后按间隔定时刷新（包括运行中记录到的结果下载地址），避免空闲连接被连接池关闭
+
+    FUNART_WAN_PREWARM_HOSTS        额外预热的地址（逗号分隔，如 https://dashscope-result-bj.oss-cn-beijing.aliyuncs.com）
+    FUNART_WAN_PREWARM_CONNECTIONS  每个地址预热的连接数，默认 2
+    FUNART_WAN_PREWARM_INTERVAL     定时刷新间隔（秒），默认 10（需小于 aiohttp 空闲连接保留时间 15 秒），0 表示只在加载时预热
+
+每个地址首次预热时记录冷启动（含 DNS/TCP/TLS）与复用连接的请求耗时，即有无预热时首个请求的耗时
+"""
+
+import asyncio
+import os
+import time
+import urllib.parse
+
+from . import dashscope_http
+from .async_runtime import get_loop
+
+ENABLED = os.environ.get("FUNART_WAN_PREWARM", "0").lower() in ("1", "true", "yes")
+
+EXTRA_HOSTS = [host.strip().rstrip("/") for host in os.environ.get("FUNART_WAN_PREWARM_HOSTS", "").split(",") if host.strip()]
+
+CONNECTIONS = int(os.environ.get("FUNART_WAN_PREWARM_CONNECTIONS", "2"))
+
+INTERVAL = float(os.environ.get("FUNART_WAN_PREWARM_INTERVAL", "10"))
+
+# 单次预热请求超时（秒）
+PREWARM_TIMEOUT = 10
+
+# 各地址的预热结果
+_status = {}
+_future = None
+
+
+def _origin(url):
+    parsed = urllib.parse.urlsplit(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def origins():
+    """需要预热的地址：DashScope API、配置的地址和最近的下载地址"""
+    result = [_origin(dashscope_http.DASHSCOPE_BASE_URL)]
+    for origin in [_origin(host) for host in EXTRA_HOSTS] + dashscope_http.download_origins():
+        if origin not in result:
+            result.append(origin)
+    return result
+
+
+async def _head(origin):
+    """发起一次 HEAD 请求（不关心状态码，只为建立连接），返回耗时（秒）"""
+    import aiohttp
+
+    session = dashscope_http.get_session()
+    start_time = time.perf_counter()
+    async with session.head(f"{origin}/", allow_redirects=False, timeout=aiohttp.ClientTimeout(total=PREWARM_TIMEOUT)):
+        pass
+    return time.perf_counter() - start_time
+
+
+async def prewarm_origin(origin):
+    """预热一个地址的 CONNECTIONS 个连接；首次预热时额外测量复用连接的耗时"""
+    status = _status.setdefault(origin, {"cold_ms": None, "warm_ms": None, "refreshes": 0, "last_refresh": None, "error": None})
+    try:
+        # 同时发起请求才会建立多个连接（顺序请求会复用同一个连接）
+        elapsed = await asyncio.gather(*(_head(origin) for _ in range(max(CONNECTIONS, 1))))
+        if status["cold_ms"] is None:
+            warm = await _head(origin)
+            status["cold_ms"] = round(max(elapsed) * 1000, 1)
+            status["warm_ms"] = round(warm * 1000, 1)
+            print(f"Prewarmed {origin}: first request {status['cold_ms']:.0f}ms without prewarm, {status['warm_ms']:.0f}ms with prewarm")
+        status["refreshes"] += 1
+        status["last_refresh"] = time.time()
+        status["error"] = None
+    except Exception as e:
+        if status["error"] is None:
+            print(f"Warning: Failed to prewarm {origin}: {e or type(e).__name__}")
+        status["error"] = f"{type(e).__name__}: {e}"
+
+
+async def prewarm():
+    """预热所有地址"""
+    await asyncio.gather(*(prewarm_origin(origin) for origin in origins()))
+
+
+async def _run():
+    await prewarm()
+    while INTERVAL > 0:
+        await asyncio.sleep(INTERVAL)
+        await prewarm()
+
+
+def start():
+    """在后台事件循环上开始预热（不阻塞加载），未开启或 aiohttp 未安装时跳过
+
+    Returns:
+        是否已开始
+    """
+    global _future
+    if not ENABLED or not dashscope_http.AIOHTTP_AVAILABLE or _future is not None:
+        return False
+    _future = asyncio.run_coroutine_threadsafe(_run(), get_loop())
+    return True
+
+
+def summary():
+    """各地址的预热结果"""
+    return {"enabled": ENABLED, "interval": INTERVAL, "connections": CONNECTIONS, "origins": dict(_status)}
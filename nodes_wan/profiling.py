@@ -0,0 +1,141 @@
+"""
+节点执行采样分析（默认关闭）
+对选中的节点执行，后台线程定期采样所有线程的调用栈（包括事件循环线程、编码/解码所在的线程池线程），
+结束后以 collapsed stack 格式（flamegraph.pl / speedscope 可直接打开）写入 <output>/wan_profiles/，
+用于区分耗时来自 PIL 编解码、base64、请求构造还是网络等待，无需修改代码
+
+    FUNART_WAN_PROFILE_EVERY         每个节点每 N 次执行采样一次（1 表示每次）
+    FUNART_WAN_PROFILE_SLOWER_THAN   只保留耗时超过该秒数的执行（单独设置时对每次执行采样）
+    FUNART_WAN_PROFILE_NODES         只采样这些节点（逗号分隔的类名，如 Wan2_5_I2V），默认全部
+    FUNART_WAN_PROFILE_INTERVAL      采样间隔（秒），默认 0.005
+
+采样覆盖整个进程（空闲线程除外）：同时执行的其他节点也会出现在结果中（按线程名区分调用栈）
+"""
+
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+
+from .paths import get_output_directory
+
+EVERY = int(os.environ.get("FUNART_WAN_PROFILE_EVERY", "0"))
+
+SLOWER_THAN = float(os.environ.get("FUNART_WAN_PROFILE_SLOWER_THAN", "0"))
+
+NODES = {name.strip() for name in os.environ.get("FUNART_WAN_PROFILE_NODES", "").split(",") if name.strip()}
+
+INTERVAL = float(os.environ.get("FUNART_WAN_PROFILE_INTERVAL", "0.005"))
+
+ENABLED = EVERY > 0 or SLOWER_THAN > 0
+
+# 结果摘要中列出的函数数
+SUMMARY_TOP = 10
+
+_runs = collections.Counter()
+_lock = threading.Lock()
+
+
+# 空闲等待的栈顶函数（线程池空闲线程、等待锁/事件的线程），这类线程不计入样本；事件循环的 select 保留，表示网络等待
+_IDLE_LEAVES = {("threading.py", "wait"), ("thread.py", "_worker"), ("queue.py", "get")}
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """后台线程定期采样所有线程的调用栈，按栈聚合计数"""
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="funart-wan-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path):
+        """写出 collapsed stack 格式：每行“调用栈（分号分隔） 样本数”"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, limit=SUMMARY_TOP):
+        """按栈顶函数（自身耗时）排序，返回 [(函数, 样本数)]"""
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+
+def _selected(node):
+    if NODES and node not in NODES:
+        return False
+    with _lock:
+        _runs[node] += 1
+        run = _runs[node]
+    return EVERY <= 0 or (run - 1) % EVERY == 0
+
+
+def _save(sampler, node, elapsed):
+    directory = os.path.join(get_output_directory(), "wan_profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d_%H%M%S')}_{node}_{elapsed:.1f}s_{threading.get_ident() % 10000}.folded")
+    sampler.write_collapsed(path)
+
+    print(f"Profile of {node} ({elapsed:.3f}s, {sampler.samples} samples) saved to {path}")
+    total = sum(sampler.stacks.values()) or 1
+    for function, count in sampler.top_functions():
+        print(f"    {count * 100 / total:5.1f}%  {function}")
+
+
+def profiled(func):
+    """装饰节点的 async 执行函数：按配置对本次执行采样并保存结果（未开启时直接执行）"""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        if not ENABLED:
+            return await func(self, *args, **kwargs)
+        node = self.__class__.__name__
+        if not _selected(node):
+            return await func(self, *args, **kwargs)
+
+        sampler = StackSampler().start()
+        start_time = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            sampler.stop()
+            if elapsed >= SLOWER_THAN:
+                try:
+                    _save(sampler, node, elapsed)
+                except OSError as e:
+                    print(f"Warning: Failed to save profile: {e}")
+
+    return wrapper
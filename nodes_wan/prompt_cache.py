@@ -0,0 +1,56 @@
+"""
+提示词扩展缓存
+记录 prompt_extend 时服务端返回的扩展后提示词（actual_prompt），重新执行时可直接发送缓存的扩展结果，
+并关闭 prompt_extend，省去服务端改写步骤，结果也更可复现
+"""
+
+import hashlib
+import json
+import time
+
+from . import metrics
+from .dashscope_http import canonicalize
+from .store import open_store
+
+_store = open_store("prompt_extensions")
+
+
+def extension_key(model, inputs):
+    """扩展结果取决于模型和全部输入（提示词、参考图片/音频）"""
+    canonical = {"model": model, "input": canonicalize(inputs)}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def prepare(model, inputs, parameters, reuse):
+    """在构造请求前调用
+
+    开启了 prompt_extend 时计算缓存 key；若 reuse 为 True 且命中缓存，
+    则将 inputs 中的 prompt 替换为缓存的扩展结果并关闭 prompt_extend
+
+    Returns:
+        (key, cached_prompt): 未开启 prompt_extend 时 key 为 None；未命中时 cached_prompt 为 None
+    """
+    if not parameters.get("prompt_extend"):
+        return None, None
+
+    key = extension_key(model, inputs)
+    if not reuse:
+        return key, None
+
+    entry = _store.get(key)
+    metrics.cache_result("prompt_extension", entry is not None)
+    if entry is None:
+        print("Extended prompt cache miss, using server-side prompt extension")
+        return key, None
+
+    cached_prompt = entry["actual_prompt"]
+    inputs["prompt"] = cached_prompt
+    parameters["prompt_extend"] = False
+    print("Reusing cached extended prompt (prompt_extend disabled for this request)")
+    return key, cached_prompt
+
+
+def remember(key, prompt, actual_prompt):
+    """保存服务端返回的扩展结果"""
+    if key and actual_prompt:
+        _store.set(key, {"prompt": prompt, "actual_prompt": actual_prompt, "updated_at": time.time()})
@@ -0,0 +1,68 @@
+"""
+ComfyUI 服务端路由
+在 PromptServer 上注册 Wan 节点的运行指标接口：
+    GET /funart/wan/metrics        Prometheus 文本格式
+    GET /funart/wan/metrics.json   JSON 格式
+    GET /funart/wan/jobs           进行中及最近完成的任务
+    GET /funart/wan/latency        各耗时画像的阶段耗时统计（中位数、P90、样本数）
+    GET /funart/wan/memory         各阶段内存峰值（需开启 FUNART_WAN_MEMORY_TRACE）
+    GET /funart/wan/prewarm        连接预热结果（需开启 FUNART_WAN_PREWARM）
+"""
+
+import asyncio
+import sys
+
+from . import jobs, latency_stats, memory_trace, metrics, prewarm, scheduler, task_runner
+
+
+def register_routes():
+    """在 ComfyUI PromptServer 上注册路由，非 ComfyUI 环境（如命令行批量生成）下跳过
+
+    Returns:
+        是否已注册
+    """
+    # 只使用已加载的 server 模块，不在非 ComfyUI 环境下额外导入
+    server = sys.modules.get("server")
+    prompt_server = getattr(getattr(server, "PromptServer", None), "instance", None)
+    if prompt_server is None:
+        return False
+
+    from aiohttp import web
+
+    @prompt_server.routes.get("/funart/wan/metrics")
+    async def get_metrics(request):
+        return web.Response(
+            body=metrics.render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    @prompt_server.routes.get("/funart/wan/metrics.json")
+    async def get_metrics_json(request):
+        return web.json_response(metrics.snapshot())
+
+    @prompt_server.routes.get("/funart/wan/jobs")
+    async def get_jobs(request):
+        # 只读取内存中的状态，可每秒轮询
+        result = jobs.snapshot()
+        result["scheduler"] = {
+            "limit": scheduler.scheduler.limit,
+            "active": scheduler.scheduler.active,
+            "waiting": scheduler.scheduler.waiting,
+        }
+        result["coalesced"] = task_runner.coalesced_count()
+        return web.json_response(result)
+
+    @prompt_server.routes.get("/funart/wan/latency")
+    async def get_latency(request):
+        # 统计保存在共享存储中，读取可能等待其他进程的写锁，不在事件循环上执行
+        return web.json_response(await asyncio.to_thread(latency_stats.summary))
+
+    @prompt_server.routes.get("/funart/wan/memory")
+    async def get_memory(request):
+        return web.json_response(memory_trace.summary())
+
+    @prompt_server.routes.get("/funart/wan/prewarm")
+    async def get_prewarm(request):
+        return web.json_response(prewarm.summary())
+
+    return True
@@ -0,0 +1,125 @@
+"""
+任务调度
+在提交前按优先级和预估耗时排队，限制同一进程同时在服务端运行的任务数：
+同一优先级内预估耗时短的任务先提交（最短作业优先），排队越久越靠前，保证长任务不会被无限推后
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import time
+
+# 同时在服务端运行的任务数上限（设为账号的并发配额），默认 0 表示不限制、不排队
+MAX_CONCURRENT_TASKS = int(os.environ.get("FUNART_WAN_MAX_CONCURRENT_TASKS", "0"))
+
+# 优先级档位 → 排序偏移（秒），相当于让任务多等待这么久
+PRIORITY_OFFSETS = {"interactive": 0.0, "normal": 120.0, "bulk": 600.0}
+PRIORITIES = list(PRIORITY_OFFSETS)
+
+# 排队每等待 1 秒，排序值减少的秒数
+AGING_RATE = 1.0
+
+# 预估耗时（秒）：视频按每秒时长，图片按每百万像素
+VIDEO_SECONDS_PER_SECOND = {"480P": 12.0, "720P": 24.0, "1080P": 48.0}
+IMAGE_SECONDS_PER_MEGAPIXEL = 10.0
+AUDIO_COST_FACTOR = 1.2
+
+# 各分辨率档位的像素数上限，T2V 的 size 参数按像素数折算到档位
+RESOLUTION_TIERS = [("480P", 832 * 480), ("720P", 1280 * 720), ("1080P", 1920 * 1080)]
+
+
+def _resolution_tier(parameters):
+    """视频分辨率档位，兼容 resolution（I2V）和 size（T2V）两种参数"""
+    if "resolution" in parameters:
+        return parameters["resolution"]
+    width, height = (int(value) for value in parameters.get("size", "832*480").split("*"))
+    for tier, pixels in RESOLUTION_TIERS:
+        if width * height <= pixels:
+            return tier
+    return RESOLUTION_TIERS[-1][0]
+
+
+def estimate_cost(model, inputs, parameters):
+    """根据模型、分辨率/尺寸、时长和是否带音频预估任务耗时（秒），仅用于排序"""
+    if "duration" in parameters:
+        cost = VIDEO_SECONDS_PER_SECOND.get(_resolution_tier(parameters), 24.0) * parameters["duration"]
+        if inputs.get("audio_url") is not None:
+            cost *= AUDIO_COST_FACTOR
+        return cost
+
+    # 图像编辑未指定尺寸时输出约 1280*1280
+    width, height = (int(value) for value in parameters.get("size", "1280*1280").split("*"))
+    cost = IMAGE_SECONDS_PER_MEGAPIXEL * width * height / (1024 * 1024) * parameters.get("n", 1)
+    return cost * (1 + 0.2 * len(inputs.get("images", [])))
+
+
+class Scheduler:
+    """
+    按 (优先级偏移 + 预估耗时 + 入队时间 × AGING_RATE) 从小到大分配运行名额
+    所有任务以相同速率老化，排序值在入队时即可确定，用堆维护即可
+    """
+
+    def __init__(self, limit=MAX_CONCURRENT_TASKS):
+        self.limit = limit
+        self.active = 0
+        self._queue = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self):
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    async def acquire(self, cost, priority="normal"):
+        """等待运行名额"""
+        if priority not in PRIORITY_OFFSETS:
+            raise ValueError(f"Unknown priority: {priority}. Supported: {', '.join(PRIORITIES)}")
+        if self.limit <= 0:
+            return
+        if self.active < self.limit and not self._queue:
+            self.active += 1
+            return
+
+        score = PRIORITY_OFFSETS[priority] + cost + time.monotonic() * AGING_RATE
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (score, next(self._seq), future))
+        print(
+            f"Queued behind {self.active} running / {self.waiting - 1} waiting task(s) (priority: {priority}, estimated cost: {cost:.0f}s)"
+        )
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 名额已分配但调用方被取消时归还名额；仍在排队的条目在分配时跳过
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """归还运行名额"""
+        if self.limit <= 0:
+            return
+        self.active -= 1
+        while self.active < self.limit and self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, cost, priority="normal", wait=True):
+        """占用一个运行名额，wait=False 时直接占用（用于恢复已在服务端运行的任务）"""
+        if wait:
+            await self.acquire(cost, priority)
+        elif self.limit > 0:
+            self.active += 1
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# 进程内共享的调度器（运行在后台事件循环上）
+scheduler = Scheduler()
@@ -0,0 +1,34 @@
+"""
+请求合并（single-flight）
+相同请求并发执行时只运行一次，后到的调用者等待并共享第一个调用的结果
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """按 key 合并并发调用，只能在同一个事件循环上使用"""
+
+    def __init__(self):
+        self._calls = {}
+        # 被合并（未实际执行）的调用次数
+        self.coalesced = 0
+
+    def __contains__(self, key):
+        """相同 key 的调用是否正在进行"""
+        return key in self._calls
+
+    async def do(self, key, func):
+        """执行 func()，若相同 key 的调用正在进行则等待其结果
+
+        共享的任务被 shield 保护：某个等待者被取消不会影响其他等待者
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+            print(f"Identical request already in flight, waiting for its result (coalesced: {self.coalesced})")
+        return await asyncio.shield(task)
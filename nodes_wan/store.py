@@ -0,0 +1,189 @@
+"""
+本地持久化存储
+键值数据保存在状态目录下的 SQLite 数据库（wan_state.sqlite3，WAL 模式），值以 JSON 保存；
+每次读写都是独立事务，同一主机上共享状态目录（FUNART_WAN_STATE_DIR）的多个 ComfyUI 进程
+共享任务日志、缓存和耗时统计，不会互相覆盖
+
+Python 未编译 sqlite3 模块时回退为 JSON 文件（写入时先写临时文件再原子替换，仅适合单进程）
+"""
+
+import contextlib
+import importlib.util
+import json
+import os
+import threading
+
+from .paths import get_state_directory
+
+SQLITE_AVAILABLE = importlib.util.find_spec("sqlite3") is not None
+
+DATABASE_NAME = "wan_state.sqlite3"
+
+# 其他进程持有写锁时的最长等待时间（秒）；每次读写都是很短的事务，正常情况下远小于该值。
+# 读写会阻塞调用线程，事件循环上的调用方需通过 asyncio.to_thread 执行
+BUSY_TIMEOUT = 5
+
+# 数据库路径 -> (连接, 锁)；连接在本进程的各线程间共享，由锁串行化
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _connect(path):
+    import sqlite3
+
+    with _connections_lock:
+        connection = _connections.get(path)
+        if connection is None:
+            # isolation_level=None：由 _transaction 显式开启事务
+            db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS kv (store TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (store, key))"
+            )
+            connection = _connections[path] = (db, threading.Lock())
+    return connection
+
+
+class SqliteStore:
+    """进程间共享的键值存储，数据保存在状态目录下的 SQLite 数据库中（按 name 区分）"""
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def path(self):
+        return os.path.join(get_state_directory(), DATABASE_NAME)
+
+    @contextlib.contextmanager
+    def _transaction(self, write=False):
+        """开启事务；写事务使用 BEGIN IMMEDIATE 先取得写锁，避免读改写过程中被其他进程修改"""
+        db, lock = _connect(self.path)
+        with lock:
+            db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _get(self, db, key):
+        row = db.execute("SELECT value FROM kv WHERE store = ? AND key = ?", (self.name, key)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _set(self, db, key, value):
+        db.execute(
+            "INSERT INTO kv (store, key, value) VALUES (?, ?, ?) ON CONFLICT (store, key) DO UPDATE SET value = excluded.value",
+            (self.name, key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def get(self, key, default=None):
+        with self._transaction() as db:
+            value = self._get(db, key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        with self._transaction(write=True) as db:
+            self._set(db, key, value)
+
+    def delete(self, key):
+        with self._transaction(write=True) as db:
+            db.execute("DELETE FROM kv WHERE store = ? AND key = ?", (self.name, key))
+
+    def update(self, key, func):
+        """在同一个写事务中读取并更新：value = func(旧值或 None)，返回 None 时删除；返回新值"""
+        with self._transaction(write=True) as db:
+            value = func(self._get(db, key))
+            if value is None:
+                db.execute("DELETE FROM kv WHERE store = ? AND key = ?", (self.name, key))
+            else:
+                self._set(db, key, value)
+        return value
+
+    def items(self):
+        with self._transaction() as db:
+            rows = db.execute("SELECT key, value FROM kv WHERE store = ? ORDER BY rowid", (self.name,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def prune(self, predicate):
+        """删除满足 predicate(key, value) 的条目，返回删除数量"""
+        with self._transaction(write=True) as db:
+            rows = db.execute("SELECT key, value FROM kv WHERE store = ?", (self.name,)).fetchall()
+            stale = [(self.name, key) for key, value in rows if predicate(key, json.loads(value))]
+            db.executemany("DELETE FROM kv WHERE store = ? AND key = ?", stale)
+        return len(stale)
+
+
+class JsonFileStore:
+    """线程安全的 JSON 键值存储，数据保存在状态目录下的 <name>.json（仅适合单进程）"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._data = None
+
+    @property
+    def path(self):
+        return os.path.join(get_state_directory(), f"{self.name}.json")
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._load()[key] = value
+            self._save()
+
+    def delete(self, key):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+    def update(self, key, func):
+        """读取并更新：value = func(旧值或 None)，返回 None 时删除；返回新值"""
+        with self._lock:
+            data = self._load()
+            value = func(data.get(key))
+            if value is None:
+                data.pop(key, None)
+            else:
+                data[key] = value
+            self._save()
+        return value
+
+    def items(self):
+        with self._lock:
+            return list(self._load().items())
+
+    def prune(self, predicate):
+        """删除满足 predicate(key, value) 的条目，返回删除数量"""
+        with self._lock:
+            data = self._load()
+            stale = [key for key, value in data.items() if predicate(key, value)]
+            for key in stale:
+                del data[key]
+            if stale:
+                self._save()
+            return len(stale)
+
+
+def open_store(name):
+    """打开名为 name 的键值存储：默认使用进程间共享的 SQLite 数据库，不可用时回退为 JSON 文件"""
+    return SqliteStore(name) if SQLITE_AVAILABLE else JsonFileStore(name)
@@ -0,0 +1,36 @@
+"""
+任务日志
+记录已提交但尚未被节点取走结果的 DashScope 任务，节点重新执行相同请求时恢复轮询原任务而不是重新提交
+"""
+
+import time
+
+from .store import open_store
+
+# DashScope 任务结果（及结果 URL）的保留时长，超过后日志条目失效
+JOURNAL_TTL = 24 * 3600
+
+_store = open_store("task_journal")
+
+
+def lookup(key):
+    """查找请求对应的未完成任务，返回日志条目或 None"""
+    entry = _store.get(key)
+    if entry is None:
+        return None
+    if time.time() - entry["submitted_at"] > JOURNAL_TTL:
+        _store.delete(key)
+        return None
+    return entry
+
+
+def record(key, task_id, node, model):
+    """记录新提交的任务，同时清理过期条目"""
+    now = time.time()
+    _store.prune(lambda _, entry: now - entry["submitted_at"] > JOURNAL_TTL)
+    _store.set(key, {"task_id": task_id, "node": node, "model": model, "submitted_at": now})
+
+
+def discard(key):
+    """结果已被取走或任务不可恢复，删除日志条目"""
+    _store.delete(key)
@@ -0,0 +1,273 @@
+"""
+DashScope 任务执行流程
+所有 Wan 节点共用：计算请求哈希 → 合并进程内相同的并发请求、恢复任务日志中的同一任务（仅限指定了 seed 的请求）或提交新任务 → 轮询等待 → 处理结果
+"""
+
+import asyncio
+import time
+
+from . import interrupts, jobs, latency_stats, memory_trace, metrics, task_journal
+from .dashscope_http import (
+    DashScopeAPIError,
+    MediaPayload,
+    build_request_body,
+    cancel_task,
+    fetch_task,
+    request_key,
+    submit_task,
+    wait_task,
+)
+from .scheduler import estimate_cost, scheduler
+from .singleflight import SingleFlight
+
+# 进程内正在执行的请求，按请求哈希合并
+_inflight = SingleFlight()
+
+# ComfyUI 进度条刷新间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+
+def close_payloads(value):
+    """关闭请求参数中的所有 MediaPayload"""
+    if isinstance(value, MediaPayload):
+        value.close()
+    elif isinstance(value, dict):
+        for item in value.values():
+            close_payloads(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            close_payloads(item)
+
+
+async def _resume(entry, api_key):
+    """检查日志中的任务是否仍可恢复（排队中、运行中或已成功）
+
+    查询因网络中断或服务端暂时错误失败时无法确定任务状态，按可恢复处理：由 wait_task 重试轮询，
+    不重新提交（原任务可能仍在运行，重新提交会产生重复的计费任务）
+    """
+    import aiohttp
+
+    try:
+        payload = await fetch_task(entry["task_id"], api_key)
+    except DashScopeAPIError as e:
+        if e.retryable:
+            print(f"Journaled task {entry['task_id']} status unknown ({e}), resuming polling")
+            return True
+        print(f"Journaled task {entry['task_id']} cannot be resumed: {e}")
+        return False
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Journaled task {entry['task_id']} status unknown ({str(e) or type(e).__name__}), resuming polling")
+        return True
+    status = (payload.get("output") or {}).get("task_status")
+    if status in ("PENDING", "RUNNING", "SUCCEEDED"):
+        return True
+    print(f"Journaled task {entry['task_id']} is {status}, resubmitting")
+    return False
+
+
+async def _report_progress(expected):
+    """按预计耗时推进 ComfyUI 进度条（非 ComfyUI 环境下不显示）"""
+    try:
+        from comfy.utils import ProgressBar
+    except ImportError:
+        return
+
+    progress_bar = ProgressBar(100)
+    start_time = time.time()
+    try:
+        while True:
+            progress_bar.update_absolute(min(int((time.time() - start_time) / expected * 100), 99))
+            await asyncio.sleep(PROGRESS_INTERVAL)
+    except Exception:
+        # 进度条只用于展示，更新失败不影响任务
+        return
+
+
+async def _abandon(key, task_id, api_key):
+    """ComfyUI 中断后放弃等待任务：保留任务日志以便之后取回结果，或取消远程任务
+
+    未指定 seed 的任务（key 为 None）不记录任务日志，无法取回结果，总是取消
+    """
+    if interrupts.KEEP_INTERRUPTED_TASKS and key is not None:
+        print(f"Interrupted, task {task_id} kept in journal; re-run the node to collect its result")
+        return
+
+    if key is not None:
+        await asyncio.to_thread(task_journal.discard, key)
+    try:
+        await cancel_task(task_id, api_key)
+        print(f"Interrupted, task {task_id} cancelled")
+    except Exception as e:
+        # 已开始运行的任务无法取消，只能放弃其结果
+        print(f"Interrupted, task {task_id} abandoned (cancel failed: {e})")
+
+
+async def run_task(node, path, model, inputs, parameters, api_key, process, priority="normal"):
+    """执行一次 DashScope 任务
+
+    指定了 seed 的请求结果可复现：进程内相同请求（见 request_key）并发执行时只提交一次，所有调用者共享同一任务结果，
+    再各自执行 process（保存位置、文件名前缀等本地选项不属于请求，由各调用者的 process 分别处理）；
+    若已有提交过且结果尚未被取走的任务，则直接恢复轮询该任务，不重复提交。
+    未指定 seed（随机）的请求每次都提交新任务，既不合并也不从任务日志恢复。
+    结果处理成功后才从任务日志中删除，处理失败（如下载中断）时重新执行可直接复用。
+    新任务提交前由调度器按优先级和预估耗时排队（见 scheduler）。
+    ComfyUI 请求中断时立即返回（抛出 InterruptProcessingException），并按配置取消或保留远程任务（见 interrupts）
+
+    Args:
+        node: 节点名称（记录到任务日志）
+        path: 任务提交路径
+        model: 模型名称
+        inputs: input 字段，可包含 MediaPayload（执行结束后统一关闭）
+        parameters: parameters 字段
+        api_key: DashScope API Key
+        process: async 回调 process(task_id, output)，返回值即 run_task 的返回值
+        priority: 调度优先级，interactive / normal / bulk
+
+    Returns:
+        process 的返回值
+    """
+    metrics.set_node(node)
+    profile = latency_stats.profile_key(model, parameters)
+    try:
+        if "seed" in parameters:
+            key = request_key(model, inputs, parameters, api_key)
+            leader = key not in _inflight
+            metrics.cache_result("singleflight", not leader)
+            job_id, task_id, output = await _inflight.do(
+                key, lambda: _run(key, node, path, model, inputs, parameters, api_key, priority, profile)
+            )
+        else:
+            key, leader = None, True
+            job_id, task_id, output = await _run(None, node, path, model, inputs, parameters, api_key, priority, profile)
+    finally:
+        close_payloads(inputs)
+
+    # 任务记录（运行状态、下载耗时、任务日志）由首个调用者完成，合并的调用者只执行自己的 process
+    return await _process(job_id if leader else None, key, profile, task_id, output, process)
+
+
+def coalesced_count():
+    """被合并到进行中任务的请求数"""
+    return _inflight.coalesced
+
+
+def _finish_job(job_id, error):
+    """按异常类型结束任务记录"""
+    if isinstance(error, asyncio.CancelledError):
+        jobs.finish(job_id, "cancelled")
+    elif interrupts.is_interrupt(error):
+        jobs.finish(job_id, "interrupted")
+    else:
+        jobs.finish(job_id, "failed", error=str(error))
+
+
+async def _run(key, node, path, model, inputs, parameters, api_key, priority, profile):
+    """提交（或恢复）并等待任务，返回 (job_id, task_id, output)；任务记录此时处于 downloading 状态，由 _process 结束"""
+    job_id = jobs.start(node, model, profile, priority)
+    try:
+        task_id, output = await interrupts.interruptible(
+            _execute(job_id, key, node, path, model, inputs, parameters, api_key, priority, profile)
+        )
+    except BaseException as e:
+        _finish_job(job_id, e)
+        raise
+    jobs.update(job_id, "downloading")
+    return job_id, task_id, output
+
+
+async def _process(job_id, key, profile, task_id, output, process):
+    """处理任务结果；job_id 为 None 表示被合并的调用者，不更新任务记录"""
+    download_start = time.time()
+    try:
+        result = await interrupts.interruptible(process(task_id, output))
+    except BaseException as e:
+        if job_id is not None:
+            _finish_job(job_id, e)
+        raise
+    if job_id is None:
+        return result
+
+    await asyncio.to_thread(latency_stats.record, profile, "download", time.time() - download_start)
+    if key is not None:
+        await asyncio.to_thread(task_journal.discard, key)
+    jobs.finish(job_id, "succeeded")
+    return result
+
+
+async def _execute(job_id, key, node, path, model, inputs, parameters, api_key, priority, profile):
+    cost = estimate_cost(model, inputs, parameters)
+    # 未指定 seed 的请求（key 为 None）不使用任务日志：重新执行应得到新的随机结果
+    entry = await asyncio.to_thread(task_journal.lookup, key) if key is not None else None
+    resumed = entry is not None and await _resume(entry, api_key)
+    if key is not None:
+        metrics.cache_result("task_journal", resumed)
+
+    # 从提交到任务结束占用一个运行名额；恢复的任务已在服务端运行，直接占用不排队
+    queued_at = time.time()
+    async with scheduler.slot(cost, priority, wait=not resumed):
+        try:
+            if resumed:
+                task_id = entry["task_id"]
+                jobs.update(job_id, "pending", task_id=task_id, resumed=True)
+                print(f"Resuming journaled task! Task ID: {task_id}")
+            else:
+                await asyncio.to_thread(latency_stats.record, profile, "local_queue", time.time() - queued_at)
+                metrics.observe("local_queue", time.time() - queued_at)
+                jobs.update(job_id, "submitting")
+
+                # 媒体数据以 base64 流式写入请求体，不在内存中保留完整的 data URI 字符串
+                with metrics.span("submit"):
+                    with memory_trace.track("base64", node):
+                        body = await asyncio.to_thread(build_request_body, model, inputs, parameters)
+                    try:
+                        with memory_trace.track("request", node):
+                            task_id = await submit_task(path, body, api_key)
+                    finally:
+                        body.close()
+                if key is not None:
+                    await asyncio.to_thread(task_journal.record, key, task_id, node, model)
+                jobs.update(job_id, "pending", task_id=task_id)
+                print(f"Task submitted! Task ID: {task_id}")
+        finally:
+            # 请求体已发送，尽早释放媒体数据
+            close_payloads(inputs)
+
+        # 按历史耗时给出 ETA 并安排轮询时机（恢复的任务已运行了一段未知时间，不做预测）
+        expected = None
+        progress = None
+        if not resumed:
+            eta = await asyncio.to_thread(latency_stats.predict_total, profile)
+            running = await asyncio.to_thread(latency_stats.predict_total, profile, ("server_queue", "generation"))
+            if eta is not None:
+                jobs.update(job_id, eta_at=time.time() + eta["median"])
+                print(f"ETA: ~{eta['median']:.0f}s (p90: {eta['p90']:.0f}s, profile: {profile})")
+                progress = asyncio.ensure_future(_report_progress(eta["median"]))
+            if running is not None:
+                expected = running["median"]
+
+        try:
+            with metrics.span("poll"):
+                output = await wait_task(task_id, api_key, expected, on_status=lambda status: jobs.server_status(job_id, status))
+        except DashScopeAPIError as e:
+            # 任务本身失败时不再保留；轮询中断（网络问题）时保留，便于下次恢复
+            if not e.retryable:
+                if key is not None:
+                    await asyncio.to_thread(task_journal.discard, key)
+                metrics.inc("tasks_total", node=node, status="failed")
+            raise
+        except asyncio.CancelledError:
+            if interrupts.interrupted():
+                await _abandon(key, task_id, api_key)
+                metrics.inc("tasks_total", node=node, status="interrupted")
+            raise
+        finally:
+            if progress is not None:
+                progress.cancel()
+
+    server_queue, generation = latency_stats.server_durations(output)
+    await asyncio.to_thread(latency_stats.record, profile, "server_queue", server_queue)
+    await asyncio.to_thread(latency_stats.record, profile, "generation", generation)
+    metrics.observe("server_queue", server_queue)
+    metrics.observe("generate", generation)
+    metrics.inc("tasks_total", node=node, status="succeeded")
+    return task_id, output
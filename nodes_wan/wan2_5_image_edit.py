@@ -4,24 +4,16 @@ Wan 2.5 图像编辑节点
 """
 
 from inspect import cleandoc
+import asyncio
 import io
 import os
-import base64
 import time
-from http import HTTPStatus
 
-import torch
-import numpy as np
-from PIL import Image
-
-try:
-    import dashscope
-    from dashscope import ImageSynthesis
-    import requests
-
-    DASHSCOPE_AVAILABLE = True
-except ImportError:
-    DASHSCOPE_AVAILABLE = False
+from . import image_originals, metrics, profiling
+from .async_runtime import ASYNC_NODES_SUPPORTED, run_on_loop, run_sync
+from .dashscope_http import AIOHTTP_AVAILABLE, IMAGE2IMAGE_PATH, MediaPayload, download_bytes
+from .preflight import I2I_IMAGE_LIMITS, check_output_size, encode_within_limit, image_size, plan_image_size
+from .task_runner import close_payloads, run_task
 
 
 class Wan2_5_ImageEdit:
@@ -96,17 +88,47 @@ class Wan2_5_ImageEdit:
                     },
                 ),
                 "watermark": ("BOOLEAN", {"default": False, "tooltip": "是否添加水印"}),
+                "auto_resize": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "自动缩放输入图像：按输出尺寸缩小过大的输入图像，"
+                            "并将宽高调整到[384,5000]像素、编码后不超过10MB。\n"
+                            "关闭时不满足限制的图像会在上传前直接报错"
+                        ),
+                    },
+                ),
+                "priority": (
+                    ["normal", "interactive", "bulk"],
+                    {
+                        "default": "normal",
+                        "tooltip": (
+                            "调度优先级：同时运行的任务数达到上限（环境变量 FUNART_WAN_MAX_CONCURRENT_TASKS，默认不限制）时，interactive（交互预览）优先提交，bulk（批量渲染）最后提交；\n"
+                            "同一优先级内预估耗时短的任务先提交，排队越久越靠前"
+                        ),
+                    },
+                ),
             },
         }
 
     RETURN_TYPES = ("IMAGE",)
     RETURN_NAMES = ("image",)
     DESCRIPTION = cleandoc(__doc__)
-    FUNCTION = "generate_image"
+    FUNCTION = "agenerate_image" if ASYNC_NODES_SUPPORTED else "generate_image"
     CATEGORY = "FunArt/Wan"
 
-    def tensor_to_base64(self, tensor):
-        """将ComfyUI的IMAGE tensor转换为base64字符串"""
+    @metrics.timed("encode")
+    def tensor_to_image_payload(self, tensor, size=None):
+        """将ComfyUI的IMAGE tensor编码为PNG，返回待上传的 MediaPayload
+
+        Args:
+            tensor: IMAGE tensor
+            size: 上传尺寸 (width, height)，与原尺寸不同时先缩放
+        """
+        import numpy as np
+        from PIL import Image
+
         start_time = time.time()
 
         # tensor shape: [B, H, W, C] 或 [H, W, C]
@@ -122,32 +144,50 @@ class Wan2_5_ImageEdit:
         # 转换为 PIL Image
         pil_image = Image.fromarray(img_array, mode="RGB")
 
-        # 转换为 bytes
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="PNG")
-        img_bytes = buffered.getvalue()
+        # 缩放到上传尺寸（双线性 + reducing_gap，大比例缩小时先整数倍降采样，速度快）
+        if size is not None and tuple(size) != pil_image.size:
+            pil_image = pil_image.resize(tuple(size), Image.Resampling.BILINEAR, reducing_gap=2.0)
 
-        # Base64 编码
-        encoded_string = base64.b64encode(img_bytes).decode("utf-8")
+        # 直接编码到 payload 的临时文件中，不生成中间 bytes / base64 字符串
+        payload = MediaPayload("image/png")
+        pil_image.save(payload.file, format="PNG")
 
         elapsed_time = time.time() - start_time
-        print(f"tensor_to_base64 time: {elapsed_time:.3f}s (image size: {len(encoded_string)//1024}KB)")
+        print(f"tensor_to_image_payload time: {elapsed_time:.3f}s (image size: {payload.encoded_size//1024}KB)")
 
-        # 返回 data URI 格式
-        return f"data:image/png;base64,{encoded_string}"
+        return payload
 
-    def download_and_convert_image(self, url):
+    async def download_and_convert_image(self, url):
         """下载图片并转换为ComfyUI的IMAGE tensor"""
         start_time = time.time()
 
         # 下载图片
         download_start = time.time()
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        content = await download_bytes(url, timeout=30)
         download_time = time.time() - download_start
 
+        # 解码为 tensor（CPU 密集，放到线程池执行）
+        tensor = await asyncio.to_thread(self.convert_image, content)
+
+        # 保留原始字节，tensor 未被修改时保存节点可直接写出，无需重新编码
+        await asyncio.to_thread(image_originals.keep, tensor, content)
+
+        elapsed_time = time.time() - start_time
+        print(
+            f"download_and_convert_image time: {elapsed_time:.3f}s (download: {download_time:.3f}s, convert: {elapsed_time-download_time:.3f}s, size: {tensor.shape})"
+        )
+
+        return tensor
+
+    @metrics.timed("decode")
+    def convert_image(self, content):
+        """将图片字节解码为ComfyUI的IMAGE tensor"""
+        import numpy as np
+        import torch
+        from PIL import Image
+
         # 从字节流创建PIL图像
-        pil_image = Image.open(io.BytesIO(response.content))
+        pil_image = Image.open(io.BytesIO(content))
 
         # 转换为RGB
         if pil_image.mode != "RGB":
@@ -157,22 +197,40 @@ class Wan2_5_ImageEdit:
         img_array = np.array(pil_image).astype(np.float32) / 255.0
 
         # 转换为tensor [1, H, W, C]
-        tensor = torch.from_numpy(img_array)[None,]
-
-        elapsed_time = time.time() - start_time
-        print(
-            f"download_and_convert_image time: {elapsed_time:.3f}s (download: {download_time:.3f}s, convert: {elapsed_time-download_time:.3f}s, size: {tensor.shape})"
-        )
-
-        return tensor
-
-    def generate_image(self, prompt, image_1, api_key="", image_2=None, image_3=None, negative_prompt="", width=-1, height=-1, seed=-1, watermark=False):
+        return torch.from_numpy(img_array)[None,]
+
+    def generate_image(self, *args, **kwargs):
+        """同步入口：在共享的后台事件循环上执行生成并等待结果"""
+        return run_sync(self._generate_image(*args, **kwargs))
+
+    async def agenerate_image(self, *args, **kwargs):
+        """异步入口：供支持 async 节点的 ComfyUI 直接 await"""
+        return await run_on_loop(self._generate_image(*args, **kwargs))
+
+    @profiling.profiled
+    async def _generate_image(
+        self,
+        prompt,
+        image_1,
+        api_key="",
+        image_2=None,
+        image_3=None,
+        negative_prompt="",
+        width=-1,
+        height=-1,
+        seed=-1,
+        watermark=False,
+        auto_resize=False,
+        priority="normal",
+    ):
         """
         使用 DashScope Wan 2.5 模型生成图像（图生图）
         支持1-3张图片输入
         """
-        if not DASHSCOPE_AVAILABLE:
-            raise ImportError("dashscope 未安装。请运行: pip install dashscope requests")
+        metrics.set_node(self.__class__.__name__)
+
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp 未安装。请运行: pip install aiohttp")
 
         # 获取 API Key：优先使用传入的参数，否则从环境变量读取
         effective_api_key = api_key if api_key else os.environ.get("DASHSCOPE_API_KEY", "")
@@ -183,29 +241,19 @@ class Wan2_5_ImageEdit:
                 "方式2：设置环境变量 DASHSCOPE_API_KEY"
             )
 
-        # 设置 API Key
-        dashscope.api_key = effective_api_key
-        dashscope.base_http_api_url = "https://dashscope.aliyuncs.com/api/v1"
-
-        # 将 IMAGE tensor 转换为 base64
-        image_base64_list = [self.tensor_to_base64(image_1)]
-        if image_2 is not None:
-            image_base64_list.append(self.tensor_to_base64(image_2))
-        if image_3 is not None:
-            image_base64_list.append(self.tensor_to_base64(image_3))
-
         # 准备API调用参数
-        params = {
-            "model": "wan2.5-i2i-preview",
+        model = "wan2.5-i2i-preview"
+        inputs = {
             "prompt": prompt,
-            "images": image_base64_list,
+        }
+        parameters = {
             "n": 1,  # 固定生成1张图片
             "watermark": watermark,
         }
 
         # 添加可选参数
         if negative_prompt:
-            params["negative_prompt"] = negative_prompt
+            inputs["negative_prompt"] = negative_prompt
 
         if seed >= 0:
             # 确保 seed 在 DashScope API 允许的范围内 [0, 2147483647]
@@ -213,36 +261,22 @@ class Wan2_5_ImageEdit:
             valid_seed = seed % 2147483648  # 2^31
             if valid_seed != seed:
                 print(f"Warning: Seed {seed} out of API range, adjusted to {valid_seed}")
-            params["seed"] = valid_seed
+            parameters["seed"] = valid_seed
 
         # 处理 size 参数（宽*高）
         # 如果 width 和 height 都大于 0，则使用自定义尺寸
         # 如果为 -1（默认值），则不传 size 参数，让 API 根据输入图片自动调整宽高比
         if width > 0 and height > 0:
-            # 验证总像素在 [768*768, 1280*1280] 范围内
-            total_pixels = width * height
-            min_pixels = 768 * 768  # 589,824
-            max_pixels = 1280 * 1280  # 1,638,400
-            
-            if total_pixels < min_pixels or total_pixels > max_pixels:
-                raise ValueError(
-                    f"Total pixels ({width}*{height}={total_pixels}) out of range. "
-                    f"Must be between {min_pixels} (768*768) and {max_pixels} (1280*1280)"
-                )
-            
-            # 验证宽高比在 [1:4, 4:1] 范围内
-            aspect_ratio = width / height
-            if aspect_ratio < 0.25 or aspect_ratio > 4.0:
-                raise ValueError(
-                    f"Aspect ratio ({width}:{height} = {aspect_ratio:.2f}) out of range. "
-                    f"Must be between 1:4 (0.25) and 4:1 (4.0)"
-                )
-            
-            params["size"] = f"{width}*{height}"
+            # 验证总像素在 [768*768, 1280*1280] 范围内，宽高比在 [1:4, 4:1] 范围内
+            total_pixels, aspect_ratio = check_output_size(width, height, 768 * 768, 1280 * 1280, "768*768", "1280*1280")
+            target_pixels = total_pixels
+
+            parameters["size"] = f"{width}*{height}"
             print(f"Output size: {width}*{height} (total pixels: {total_pixels}, aspect ratio: {aspect_ratio:.2f})")
         elif width == -1 and height == -1:
             # 不传 size 参数，使用输入图片的宽高比
             print("Output size: Auto (maintaining input image aspect ratio with total pixels ~1280*1280)")
+            target_pixels = 1280 * 1280
         else:
             # width 和 height 必须同时为 -1 或同时大于 0
             raise ValueError(
@@ -250,40 +284,63 @@ class Wan2_5_ImageEdit:
                 f"Got width={width}, height={height}"
             )
 
+        # 预检: 在任何网络 I/O 之前校验全部输入图像尺寸
+        images = [image for image in (image_1, image_2, image_3) if image is not None]
+        upload_sizes = []
+        for index, image in enumerate(images, start=1):
+            image_width, image_height = image_size(image)
+            upload_size = plan_image_size(image_width, image_height, I2I_IMAGE_LIMITS, target_pixels, auto_resize, label=f"Image {index}")
+            if upload_size != (image_width, image_height):
+                print(f"Auto resize image {index}: {image_width}*{image_height} -> {upload_size[0]}*{upload_size[1]}")
+            upload_sizes.append(upload_size)
+
+        # 将 IMAGE tensor 编码为待上传的媒体数据并校验大小（CPU 密集，放到线程池执行）；
+        # 交给 run_task 之前出错（包括中断、取消）时关闭已编码的媒体数据（临时文件）
+        inputs["images"] = []
+        try:
+            for index, (image, upload_size) in enumerate(zip(images, upload_sizes), start=1):
+                payload = await asyncio.to_thread(
+                    encode_within_limit,
+                    lambda size, image=image: self.tensor_to_image_payload(image, size),
+                    *upload_size,
+                    I2I_IMAGE_LIMITS,
+                    auto_resize,
+                    f"Image {index}",
+                )
+                inputs["images"].append(payload)
+        except BaseException:
+            close_payloads(inputs)
+            raise
+
         # 调用 API
-        print("Calling DashScope API (model: wan2.5-i2i-preview)")
+        print(f"Calling DashScope API (model: {model})")
         print(f"Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"Prompt: {prompt}")
-        print(f"Number of images: {len(image_base64_list)}")
-
-        response = ImageSynthesis.call(**params)
-
-        print(f"API response status: {response.status_code}")
-        print(f"Request ID: {response.request_id if hasattr(response, 'request_id') else 'N/A'}")
-
-        # 检查响应状态
-        if response.status_code != HTTPStatus.OK:
-            raise RuntimeError(f"API call failed: {response.code} - {response.message}")
-
-        # 检查结果是否为空
-        if not response.output or not response.output.results:
-            print("=" * 60)
-            print("API call error: Returned success but no images generated")
-            print("-" * 60)
-            print(f"Status Code: {response.status_code}")
-            print(f"Request ID: {response.request_id if hasattr(response, 'request_id') else 'N/A'}")
-            print(f"Code: {response.code if hasattr(response, 'code') else 'N/A'}")
-            print(f"Message: {response.message if hasattr(response, 'message') else 'N/A'}")
-            print(f"Output: {response.output if hasattr(response, 'output') else 'N/A'}")
-            print("=" * 60)
-
-            error_msg = "API returned success but no images generated, possibly due to quota limit, rate limit or other API issues"
-            raise RuntimeError(error_msg)
-
-        print(f"Successfully generated {len(response.output.results)} image(s)")
-
-        # 下载并转换生成的图片（只有一张）
-        result = response.output.results[0]
-        output_tensor = self.download_and_convert_image(result.url)
+        print(f"Number of images: {len(images)}")
+
+        # 任务成功后检查输出并下载图片
+        async def process(task_id, output):
+            # 检查结果是否为空
+            results = [item for item in output.get("results") or [] if item.get("url")]
+            if not results:
+                print("=" * 60)
+                print("API call error: Returned success but no images generated")
+                print("-" * 60)
+                print(f"Task ID: {task_id}")
+                print(f"Output: {output}")
+                print("=" * 60)
+
+                error_msg = "API returned success but no images generated, possibly due to quota limit, rate limit or other API issues"
+                raise RuntimeError(error_msg)
+
+            print(f"Successfully generated {len(results)} image(s)")
+
+            # 下载并转换生成的图片（只有一张）
+            return await self.download_and_convert_image(results[0]["url"])
+
+        # 提交（或恢复）任务并等待完成
+        output_tensor = await run_task(
+            self.__class__.__name__, IMAGE2IMAGE_PATH, model, inputs, parameters, effective_api_key, process, priority=priority
+        )
 
         # 返回单张图片，shape: [1, H, W, C]
         return (output_tensor,)
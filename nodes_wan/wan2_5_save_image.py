@@ -0,0 +1,99 @@
+"""
+Wan 保存图像节点
+图像来自 Wan 图像节点且未被修改时，直接写出服务端返回的原始图片字节，不重新编码
+"""
+
+from inspect import cleandoc
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+
+from . import image_originals, metrics
+from .downloads import HASH_NAME_LENGTH, resolve_prefix
+from .paths import get_output_directory
+
+
+class Wan2_5_SaveImage:
+    """
+    Wan 保存图像节点
+    保存图像到输出目录，文件按内容哈希命名（相同图片只保存一份）
+
+    功能：
+    - 输入图像直接来自 Wan 文生图/图像编辑节点且未被修改时，原样写出服务端返回的原始图片（复制原始字节，无需编码）
+    - 其他图像编码为PNG保存，并与 ComfyUI 保存节点一样写入工作流信息
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("IMAGE", {"tooltip": "要保存的图像"}),
+                "filename_prefix": (
+                    "STRING",
+                    {"default": "wan", "tooltip": "文件名前缀，可包含子目录（如 images/wan）"},
+                ),
+            },
+            "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"},
+        }
+
+    RETURN_TYPES = ()
+    OUTPUT_NODE = True
+    DESCRIPTION = cleandoc(__doc__)
+    FUNCTION = "save_images"
+    CATEGORY = "FunArt/Wan"
+
+    def encode_image(self, tensor, prompt=None, extra_pnginfo=None):
+        """将单张 IMAGE tensor 编码为PNG字节（写入工作流信息）"""
+        import numpy as np
+        from PIL import Image
+        from PIL.PngImagePlugin import PngInfo
+
+        img_array = np.clip(tensor.cpu().numpy() * 255.0, 0, 255).astype(np.uint8)
+        pil_image = Image.fromarray(img_array, mode="RGB")
+
+        metadata = PngInfo()
+        if prompt is not None:
+            metadata.add_text("prompt", json.dumps(prompt))
+        for key, value in (extra_pnginfo or {}).items():
+            metadata.add_text(key, json.dumps(value))
+
+        buffered = io.BytesIO()
+        pil_image.save(buffered, format="PNG", pnginfo=metadata, compress_level=4)
+        return buffered.getvalue()
+
+    @metrics.timed("save")
+    def save_images(self, images, filename_prefix="wan", prompt=None, extra_pnginfo=None):
+        start_time = time.time()
+
+        output_dir = get_output_directory()
+        directory, prefix = resolve_prefix(output_dir, filename_prefix)
+        os.makedirs(directory, exist_ok=True)
+
+        filenames = []
+        metrics.set_node(self.__class__.__name__)
+        original = image_originals.lookup(images)
+        metrics.cache_result("original_image", original is not None)
+        if original is not None:
+            # 原始文件名即内容哈希；复制而不是硬链接，输出被原地修改时不影响之后保存的原始字节
+            filename = f"{prefix}_{os.path.basename(original)}"
+            shutil.copyfile(original, os.path.join(directory, filename))
+            filenames.append(filename)
+            mode = "original bytes"
+        else:
+            for image in images:
+                content = self.encode_image(image, prompt, extra_pnginfo)
+                filename = f"{prefix}_{hashlib.sha256(content).hexdigest()[:HASH_NAME_LENGTH]}.png"
+                with open(os.path.join(directory, filename), "wb") as f:
+                    f.write(content)
+                filenames.append(filename)
+            mode = "re-encoded"
+
+        elapsed_time = time.time() - start_time
+        print(f"save_images time: {elapsed_time:.3f}s ({len(filenames)} image(s), {mode})")
+
+        subfolder = os.path.relpath(directory, output_dir)
+        subfolder = "" if subfolder == "." else subfolder
+        return {"ui": {"images": [{"filename": filename, "subfolder": subfolder, "type": "output"} for filename in filenames]}}
@@ -4,23 +4,16 @@ Wan 2.5 文生图节点
 """
 
 from inspect import cleandoc
+import asyncio
 import io
 import os
 import time
-from http import HTTPStatus
 
-import torch
-import numpy as np
-from PIL import Image
-
-try:
-    import dashscope
-    from dashscope import ImageSynthesis
-    import requests
-
-    DASHSCOPE_AVAILABLE = True
-except ImportError:
-    DASHSCOPE_AVAILABLE = False
+from . import image_originals, metrics, profiling, prompt_cache
+from .async_runtime import ASYNC_NODES_SUPPORTED, run_on_loop, run_sync
+from .dashscope_http import AIOHTTP_AVAILABLE, TEXT2IMAGE_PATH, download_bytes
+from .preflight import check_output_size
+from .task_runner import run_task
 
 
 class Wan2_5_T2I:
@@ -90,27 +83,67 @@ class Wan2_5_T2I:
                     },
                 ),
                 "watermark": ("BOOLEAN", {"default": False, "tooltip": "是否添加水印"}),
+                "reuse_extended_prompt": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "复用缓存的扩展提示词（仅在 prompt_extend 开启时生效）。\n"
+                            "若相同提示词之前已由服务端扩展过，则直接发送缓存的扩展结果并关闭 prompt_extend，"
+                            "省去服务端改写步骤；未命中缓存时照常由服务端扩展"
+                        ),
+                    },
+                ),
+                "priority": (
+                    ["normal", "interactive", "bulk"],
+                    {
+                        "default": "normal",
+                        "tooltip": (
+                            "调度优先级：同时运行的任务数达到上限（环境变量 FUNART_WAN_MAX_CONCURRENT_TASKS，默认不限制）时，interactive（交互预览）优先提交，bulk（批量渲染）最后提交；\n"
+                            "同一优先级内预估耗时短的任务先提交，排队越久越靠前"
+                        ),
+                    },
+                ),
             },
         }
 
-    RETURN_TYPES = ("IMAGE",)
-    RETURN_NAMES = ("image",)
+    RETURN_TYPES = ("IMAGE", "STRING")
+    RETURN_NAMES = ("image", "extended_prompt")
     DESCRIPTION = cleandoc(__doc__)
-    FUNCTION = "generate_image"
+    FUNCTION = "agenerate_image" if ASYNC_NODES_SUPPORTED else "generate_image"
     CATEGORY = "FunArt/Wan"
 
-    def download_and_convert_image(self, url):
+    async def download_and_convert_image(self, url):
         """下载图片并转换为ComfyUI的IMAGE tensor"""
         start_time = time.time()
 
         # 下载图片
         download_start = time.time()
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        content = await download_bytes(url, timeout=30)
         download_time = time.time() - download_start
 
+        # 解码为 tensor（CPU 密集，放到线程池执行）
+        tensor = await asyncio.to_thread(self.convert_image, content)
+
+        # 保留原始字节，tensor 未被修改时保存节点可直接写出，无需重新编码
+        await asyncio.to_thread(image_originals.keep, tensor, content)
+
+        elapsed_time = time.time() - start_time
+        print(
+            f"download_and_convert_image time: {elapsed_time:.3f}s (download: {download_time:.3f}s, convert: {elapsed_time-download_time:.3f}s, size: {tensor.shape})"
+        )
+
+        return tensor
+
+    @metrics.timed("decode")
+    def convert_image(self, content):
+        """将图片字节解码为ComfyUI的IMAGE tensor"""
+        import numpy as np
+        import torch
+        from PIL import Image
+
         # 从字节流创建PIL图像
-        pil_image = Image.open(io.BytesIO(response.content))
+        pil_image = Image.open(io.BytesIO(content))
 
         # 转换为RGB
         if pil_image.mode != "RGB":
@@ -120,16 +153,18 @@ class Wan2_5_T2I:
         img_array = np.array(pil_image).astype(np.float32) / 255.0
 
         # 转换为tensor [1, H, W, C]
-        tensor = torch.from_numpy(img_array)[None,]
+        return torch.from_numpy(img_array)[None,]
 
-        elapsed_time = time.time() - start_time
-        print(
-            f"download_and_convert_image time: {elapsed_time:.3f}s (download: {download_time:.3f}s, convert: {elapsed_time-download_time:.3f}s, size: {tensor.shape})"
-        )
+    def generate_image(self, *args, **kwargs):
+        """同步入口：在共享的后台事件循环上执行生成并等待结果"""
+        return run_sync(self._generate_image(*args, **kwargs))
 
-        return tensor
+    async def agenerate_image(self, *args, **kwargs):
+        """异步入口：供支持 async 节点的 ComfyUI 直接 await"""
+        return await run_on_loop(self._generate_image(*args, **kwargs))
 
-    def generate_image(
+    @profiling.profiled
+    async def _generate_image(
         self,
         prompt,
         api_key="",
@@ -139,12 +174,16 @@ class Wan2_5_T2I:
         prompt_extend=True,
         seed=-1,
         watermark=False,
+        reuse_extended_prompt=False,
+        priority="normal",
     ):
         """
         使用 DashScope Wan 2.5 模型生成图像（文生图）
         """
-        if not DASHSCOPE_AVAILABLE:
-            raise ImportError("dashscope 未安装。请运行: pip install dashscope requests")
+        metrics.set_node(self.__class__.__name__)
+
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp 未安装。请运行: pip install aiohttp")
 
         if not prompt:
             raise ValueError("请提供图像生成提示词")
@@ -154,17 +193,18 @@ class Wan2_5_T2I:
         if not effective_api_key:
             raise ValueError("请提供 DashScope API Key。\n" "方式1：在节点中配置 api_key 参数\n" "方式2：设置环境变量 DASHSCOPE_API_KEY")
 
-        # 设置 API Key
-        dashscope.api_key = effective_api_key
-        dashscope.base_http_api_url = "https://dashscope.aliyuncs.com/api/v1"
+        # 预检: 总像素在 [768*768, 1440*1440] 之间，宽高比在 [1:4, 4:1] 之间
+        check_output_size(width, height, 768 * 768, 1440 * 1440, "768*768", "1440*1440")
 
         # 构造 size 字符串
         size = f"{width}*{height}"
 
         # 准备API调用参数
-        params = {
-            "model": "wan2.5-t2i-preview",
+        model = "wan2.5-t2i-preview"
+        inputs = {
             "prompt": prompt,
+        }
+        parameters = {
             "n": 1,  # 固定生成1张图片
             "size": size,
             "prompt_extend": prompt_extend,
@@ -173,58 +213,57 @@ class Wan2_5_T2I:
 
         # 添加可选参数
         if negative_prompt:
-            params["negative_prompt"] = negative_prompt
+            inputs["negative_prompt"] = negative_prompt
 
         if seed >= 0:
             # 确保 seed 在 DashScope API 允许的范围内 [0, 2147483647]
             valid_seed = seed % 2147483648  # 2^31
             if valid_seed != seed:
                 print(f"Warning: Seed {seed} out of API range, adjusted to {valid_seed}")
-            params["seed"] = valid_seed
+            parameters["seed"] = valid_seed
+
+        # 复用缓存的扩展提示词（如果开启且命中）
+        extension_key, cached_prompt = await asyncio.to_thread(prompt_cache.prepare, model, inputs, parameters, reuse_extended_prompt)
 
         # 调用 API
-        print("Calling DashScope API (model: wan2.5-t2i-preview)")
+        print(f"Calling DashScope API (model: {model})")
         print(f"Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"Prompt: {prompt}")
         print(f"Size: {size}")
-        print(f"Prompt Extend: {prompt_extend}")
-
-        response = ImageSynthesis.call(**params)
-
-        print(f"API response status: {response.status_code}")
-        print(f"Request ID: {response.request_id if hasattr(response, 'request_id') else 'N/A'}")
-
-        # 检查响应状态
-        if response.status_code != HTTPStatus.OK:
-            raise RuntimeError(f"API call failed: {response.code} - {response.message}")
-
-        # 检查结果是否为空
-        if not response.output or not response.output.results:
-            print("=" * 60)
-            print("API call error: Returned success but no images generated")
-            print("-" * 60)
-            print(f"Status Code: {response.status_code}")
-            print(f"Request ID: {response.request_id if hasattr(response, 'request_id') else 'N/A'}")
-            print(f"Code: {response.code if hasattr(response, 'code') else 'N/A'}")
-            print(f"Message: {response.message if hasattr(response, 'message') else 'N/A'}")
-            print(f"Output: {response.output if hasattr(response, 'output') else 'N/A'}")
-            print("=" * 60)
-
-            error_msg = "API returned success but no images generated, possibly due to quota limit, rate limit or other API issues"
-            raise RuntimeError(error_msg)
-
-        print(f"Successfully generated {len(response.output.results)} image(s)")
-
-        # 打印扩展后的提示词（如果有）
-        result = response.output.results[0]
-        try:
-            actual_prompt = result.actual_prompt
+        print(f"Prompt Extend: {parameters['prompt_extend']}")
+
+        # 任务成功后检查输出并下载图片
+        async def process(task_id, output):
+            # 检查结果是否为空
+            results = [item for item in output.get("results") or [] if item.get("url")]
+            if not results:
+                print("=" * 60)
+                print("API call error: Returned success but no images generated")
+                print("-" * 60)
+                print(f"Task ID: {task_id}")
+                print(f"Output: {output}")
+                print("=" * 60)
+
+                error_msg = "API returned success but no images generated, possibly due to quota limit, rate limit or other API issues"
+                raise RuntimeError(error_msg)
+
+            print(f"Successfully generated {len(results)} image(s)")
+
+            # 打印并缓存扩展后的提示词（如果有）
+            result = results[0]
+            actual_prompt = result.get("actual_prompt")
             if actual_prompt:
                 print(f"Extended prompt: {actual_prompt[:100]}..." if len(actual_prompt) > 100 else f"Extended prompt: {actual_prompt}")
-        except (KeyError, AttributeError):
-            pass  # actual_prompt 不存在，跳过
+                if cached_prompt is None:
+                    await asyncio.to_thread(prompt_cache.remember, extension_key, prompt, actual_prompt)
 
-        # 下载并转换生成的图片
-        output_tensor = self.download_and_convert_image(result.url)
+            # 下载并转换生成的图片
+            extended_prompt = cached_prompt or actual_prompt or prompt
+            return await self.download_and_convert_image(result["url"]), extended_prompt
+
+        # 提交（或恢复）任务并等待完成
+        output_tensor, extended_prompt = await run_task(
+            self.__class__.__name__, TEXT2IMAGE_PATH, model, inputs, parameters, effective_api_key, process, priority=priority
+        )
 
         # 返回单张图片，shape: [1, H, W, C]
-        return (output_tensor,)
+        return (output_tensor, extended_prompt)
@@ -4,39 +4,22 @@ Wan 2.5 文生视频节点
 """
 
 from inspect import cleandoc
-import io
+import asyncio
+import importlib.util
 import os
-import base64
 import time
-import uuid
-from http import HTTPStatus
 
-try:
-    import folder_paths
+from . import metrics, profiling, prompt_cache
+from .async_runtime import ASYNC_NODES_SUPPORTED, run_on_loop, run_sync
+from .dashscope_http import AIOHTTP_AVAILABLE, MediaPayload, VIDEO_SYNTHESIS_PATH
+from .downloads import download_content_addressed, resolve_prefix
+from .frames import decode_frames, empty_frames
+from .paths import get_output_directory, get_temp_directory
+from .preflight import check_audio
+from .task_runner import close_payloads, run_task
 
-    FOLDER_PATHS_AVAILABLE = True
-except ImportError:
-    FOLDER_PATHS_AVAILABLE = False
-
-from comfy_api.input_impl import VideoFromFile
-
-try:
-    import dashscope
-    from dashscope import VideoSynthesis
-    import requests
-
-    DASHSCOPE_AVAILABLE = True
-except ImportError:
-    DASHSCOPE_AVAILABLE = False
-
-# 尝试导入音频处理库
-try:
-    import scipy.io.wavfile as wavfile
-    import numpy as np
-
-    SCIPY_AVAILABLE = True
-except ImportError:
-    SCIPY_AVAILABLE = False
+# 音频处理库只检查是否安装，首次编码音频时才导入
+SCIPY_AVAILABLE = importlib.util.find_spec("scipy") is not None
 
 
 # 支持的视频尺寸 (按分辨率档位分组)
@@ -140,73 +123,120 @@ class Wan2_5_T2V:
                     "BOOLEAN",
                     {"default": False, "tooltip": "是否添加水印"},
                 ),
+                "reuse_extended_prompt": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "复用缓存的扩展提示词（仅在 prompt_extend 开启时生效）。\n"
+                            "若相同输入之前已由服务端扩展过提示词，则直接发送缓存的扩展结果并关闭 prompt_extend，"
+                            "省去服务端改写步骤；未命中缓存时照常由服务端扩展"
+                        ),
+                    },
+                ),
+                "frames_output": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": "是否解码视频帧并通过 frames 输出（IMAGE）。关闭时 frames 输出 0 帧的空图像批次",
+                    },
+                ),
+                "frame_stride": (
+                    "INT",
+                    {"default": 1, "min": 1, "max": 120, "step": 1, "tooltip": "抽帧步长，每N帧取1帧"},
+                ),
+                "frame_max": (
+                    "INT",
+                    {"default": 0, "min": 0, "max": 10000, "step": 1, "tooltip": "最多输出帧数，0表示不限制"},
+                ),
+                "frame_width": (
+                    "INT",
+                    {"default": 0, "min": 0, "max": 4096, "step": 8, "tooltip": "输出帧宽度，0表示按高度等比缩放（都为0时保持原尺寸）"},
+                ),
+                "frame_height": (
+                    "INT",
+                    {"default": 0, "min": 0, "max": 4096, "step": 8, "tooltip": "输出帧高度，0表示按宽度等比缩放（都为0时保持原尺寸）"},
+                ),
+                "frame_mmap": (
+                    "BOOLEAN",
+                    {"default": False, "tooltip": "使用磁盘文件映射存放帧数据，降低常驻内存（适合长视频/高分辨率）"},
+                ),
+                "priority": (
+                    ["normal", "interactive", "bulk"],
+                    {
+                        "default": "normal",
+                        "tooltip": (
+                            "调度优先级：同时运行的任务数达到上限（环境变量 FUNART_WAN_MAX_CONCURRENT_TASKS，默认不限制）时，interactive（交互预览）优先提交，bulk（批量渲染）最后提交；\n"
+                            "同一优先级内预估耗时短的任务先提交，排队越久越靠前"
+                        ),
+                    },
+                ),
+                "save_output": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "直接下载到输出目录（output）而不是临时目录，无需再接保存节点复制一遍。\n"
+                            "文件按内容哈希命名，相同的视频只保存一份"
+                        ),
+                    },
+                ),
+                "filename_prefix": (
+                    "STRING",
+                    {"default": "wan_t2v", "tooltip": "文件名前缀，可包含子目录（如 video/wan）"},
+                ),
             },
         }
 
-    RETURN_TYPES = ("VIDEO",)
-    RETURN_NAMES = ("video",)
+    RETURN_TYPES = ("VIDEO", "STRING", "IMAGE")
+    RETURN_NAMES = ("video", "extended_prompt", "frames")
     OUTPUT_NODE = True
     DESCRIPTION = cleandoc(__doc__)
-    FUNCTION = "generate_video"
+    FUNCTION = "agenerate_video" if ASYNC_NODES_SUPPORTED else "generate_video"
     CATEGORY = "FunArt/Wan"
 
-    def get_temp_directory(self):
-        """获取临时目录（output/temp）"""
-        if FOLDER_PATHS_AVAILABLE:
-            output_dir = folder_paths.get_output_directory()
-        else:
-            # 回退到当前目录下的 output 文件夹
-            output_dir = os.path.join(os.getcwd(), "output")
-
-        # 在 output 下创建 temp 子目录
-        temp_dir = os.path.join(output_dir, "temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        return temp_dir
-
-    def download_video(self, url, filename_prefix="wan_t2v"):
-        """下载视频到临时目录
+    async def download_video(self, url, filename_prefix="wan_t2v", save_output=False):
+        """下载视频，按内容哈希命名（相同内容只保存一份）
 
         Args:
             url: 视频URL
-            filename_prefix: 文件名前缀
+            filename_prefix: 文件名前缀，可包含子目录
+            save_output: 是否直接下载到输出目录（否则下载到临时目录）
 
         Returns:
             video_path: 保存的视频文件路径
         """
         start_time = time.time()
 
-        # 下载视频
-        print("Downloading video...")
-        response = requests.get(url, timeout=120)
-        response.raise_for_status()
+        # 直接下载到最终位置，不需要再由保存节点复制一遍
+        base_dir = get_output_directory() if save_output else get_temp_directory()
+        directory, prefix = resolve_prefix(base_dir, filename_prefix)
 
-        # 生成唯一文件名
-        unique_id = uuid.uuid4().hex[:8]
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename_prefix}_{timestamp}_{unique_id}.mp4"
-
-        # 保存到临时目录
-        temp_dir = self.get_temp_directory()
-        video_path = os.path.join(temp_dir, filename)
-
-        with open(video_path, "wb") as f:
-            f.write(response.content)
+        # 分块下载视频，边下载边计算内容哈希；输出目录中的文件不与下载缓存共享（用户可能原地修改）
+        print("Downloading video...")
+        video_path, file_size, deduplicated = await download_content_addressed(
+            url, directory, prefix, ".mp4", timeout=120, link_cache=not save_output
+        )
 
         download_time = time.time() - start_time
-        file_size_mb = len(response.content) / (1024 * 1024)
+        file_size_mb = file_size / (1024 * 1024)
         print(f"Video download time: {download_time:.3f}s (file size: {file_size_mb:.2f}MB)")
-        print(f"Video saved to temporary directory: {video_path}")
+        location = "output" if save_output else "temporary"
+        print(f"Video saved to {location} directory: {video_path}" + (" (identical file already existed)" if deduplicated else ""))
 
         return video_path
 
-    def audio_to_base64(self, audio):
-        """将ComfyUI的AUDIO转换为base64字符串
+    @metrics.timed("encode")
+    def audio_to_payload(self, audio):
+        """将ComfyUI的AUDIO编码为WAV，返回待上传的 MediaPayload
 
         ComfyUI AUDIO 格式: {"waveform": torch.Tensor, "sample_rate": int}
         waveform shape: [batch, channels, samples] 或 [channels, samples]
         """
         if not SCIPY_AVAILABLE:
             raise ImportError("scipy 未安装，无法处理音频。请运行: pip install scipy")
+        import numpy as np
+        import scipy.io.wavfile as wavfile
 
         start_time = time.time()
 
@@ -228,21 +258,52 @@ class Wan2_5_T2V:
         # 归一化到 int16 范围
         audio_array = np.clip(audio_array * 32767, -32768, 32767).astype(np.int16)
 
-        # 保存为 WAV 格式
-        buffered = io.BytesIO()
-        wavfile.write(buffered, sample_rate, audio_array)
-        audio_bytes = buffered.getvalue()
-
-        # Base64 编码
-        encoded_string = base64.b64encode(audio_bytes).decode("utf-8")
+        # 直接写入 payload 的临时文件中
+        payload = MediaPayload("audio/wav")
+        wavfile.write(payload.file, sample_rate, audio_array)
 
         elapsed_time = time.time() - start_time
-        print(f"audio_to_base64 time: {elapsed_time:.3f}s (audio size: {len(encoded_string)//1024}KB)")
+        print(f"audio_to_payload time: {elapsed_time:.3f}s (audio size: {payload.encoded_size//1024}KB)")
+
+        return payload
+
+    def generate_video(self, *args, **kwargs):
+        """同步入口：在共享的后台事件循环上执行生成并等待结果"""
+        return run_sync(self._generate_video(*args, **kwargs))
 
-        # 返回 data URI 格式
-        return f"data:audio/wav;base64,{encoded_string}"
+    async def agenerate_video(self, *args, **kwargs):
+        """异步入口：供支持 async 节点的 ComfyUI 直接 await"""
+        return await run_on_loop(self._generate_video(*args, **kwargs))
 
-    def generate_video(
+    @profiling.profiled
+    async def _generate_video(
+        self,
+        *args,
+        frames_output=False,
+        frame_stride=1,
+        frame_max=0,
+        frame_width=0,
+        frame_height=0,
+        frame_mmap=False,
+        **kwargs,
+    ):
+        """节点执行：生成视频，构造 VIDEO 输出并按需解码视频帧"""
+        video_path, extended_prompt = await self.create_video(*args, **kwargs)
+
+        # 构造 VIDEO 类型输出 (ComfyUI 官方格式)
+        from comfy_api.input_impl import VideoFromFile
+
+        video_output = VideoFromFile(video_path)
+
+        # 解码视频帧（如果开启）；关闭时输出空批次，frames 被连接时下游节点仍收到合法的 IMAGE
+        if frames_output:
+            frames = await asyncio.to_thread(decode_frames, video_path, frame_stride, frame_max, frame_width, frame_height, frame_mmap)
+        else:
+            frames = empty_frames()
+
+        return (video_output, extended_prompt, frames)
+
+    async def create_video(
         self,
         prompt,
         api_key="",
@@ -253,12 +314,22 @@ class Wan2_5_T2V:
         negative_prompt="",
         seed=-1,
         watermark=False,
+        reuse_extended_prompt=False,
+        priority="normal",
+        save_output=False,
+        filename_prefix="wan_t2v",
     ):
         """
         使用 DashScope Wan 2.5 模型生成视频（文生视频）
+        不依赖 ComfyUI，也供命令行批量生成使用
+
+        Returns:
+            (video_path, extended_prompt): 临时目录中的视频文件路径及扩展后的提示词
         """
-        if not DASHSCOPE_AVAILABLE:
-            raise ImportError("dashscope 未安装。请运行: pip install dashscope")
+        metrics.set_node(self.__class__.__name__)
+
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp 未安装。请运行: pip install aiohttp")
 
         if not prompt:
             raise ValueError("请提供视频生成提示词")
@@ -268,87 +339,83 @@ class Wan2_5_T2V:
         if not effective_api_key:
             raise ValueError("请提供 DashScope API Key。\n" "方式1：在节点中配置 api_key 参数\n" "方式2：设置环境变量 DASHSCOPE_API_KEY")
 
-        # 设置 API Key
-        dashscope.api_key = effective_api_key
-        dashscope.base_http_api_url = "https://dashscope.aliyuncs.com/api/v1"
+        # 预检: 文件名前缀必须位于输出目录内
+        resolve_prefix(get_output_directory(), filename_prefix)
+
+        # 预检: 在任何网络 I/O 之前校验音频
+        if audio is not None:
+            check_audio(audio)
 
         # 准备 API 调用参数
-        params = {
-            "model": "wan2.5-t2v-preview",
+        model = "wan2.5-t2v-preview"
+        inputs = {
             "prompt": prompt,
+        }
+        parameters = {
             "size": size,
             "duration": duration,
             "prompt_extend": prompt_extend,
             "watermark": watermark,
         }
 
-        # 添加音频（如果有）
-        if audio is not None:
-            audio_base64 = self.audio_to_base64(audio)
-            params["audio_url"] = audio_base64
-
-        # 添加可选参数
-        if negative_prompt:
-            params["negative_prompt"] = negative_prompt
-
-        if seed >= 0:
-            valid_seed = seed % 2147483648
-            if valid_seed != seed:
-                print(f"Warning: Seed {seed} out of API range, adjusted to {valid_seed}")
-            params["seed"] = valid_seed
+        # 交给 run_task 之前出错时关闭已编码的媒体数据（临时文件）
+        try:
+            # 添加音频（如果有，CPU 密集的编码放到线程池执行）
+            if audio is not None:
+                inputs["audio_url"] = await asyncio.to_thread(self.audio_to_payload, audio)
+
+            # 添加可选参数
+            if negative_prompt:
+                inputs["negative_prompt"] = negative_prompt
+
+            if seed >= 0:
+                valid_seed = seed % 2147483648
+                if valid_seed != seed:
+                    print(f"Warning: Seed {seed} out of API range, adjusted to {valid_seed}")
+                parameters["seed"] = valid_seed
+
+            # 复用缓存的扩展提示词（如果开启且命中）
+            extension_key, cached_prompt = await asyncio.to_thread(prompt_cache.prepare, model, inputs, parameters, reuse_extended_prompt)
+        except BaseException:
+            close_payloads(inputs)
+            raise
 
         # ========== 步骤1: 异步调用 ==========
-        print("Calling DashScope VideoSynthesis API (model: wan2.5-t2v-preview)")
+        print(f"Calling DashScope VideoSynthesis API (model: {model})")
         print(f"Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"Prompt: {prompt}")
         print(f"Size: {size}, Duration: {duration}s")
         print(f"Audio: {'Yes' if audio is not None else 'No'}")
 
-        rsp = VideoSynthesis.async_call(**params)
-
-        print(f"Async call response: Task ID = {rsp.output.task_id if rsp.output else 'N/A'}")
-
-        if rsp.status_code != HTTPStatus.OK:
-            raise RuntimeError(f"API async call failed: {rsp.code} - {rsp.message}")
-
-        task_id = rsp.output.task_id
-        print(f"Task submitted! Task ID: {task_id}")
-
-        # ========== 步骤2: 等待任务完成 ==========
-        print("Waiting for video generation to complete (may take a few minutes)...")
-
-        result = VideoSynthesis.wait(task=rsp, api_key=effective_api_key)
-
-        print(f"Final response status: {result.status_code}")
-
-        if result.status_code != HTTPStatus.OK:
-            raise RuntimeError(f"Video generation failed: {result.code} - {result.message}")
-
-        if not result.output or not result.output.video_url:
-            print("=" * 60)
-            print("API call error: Returned success but no video generated")
-            print("-" * 60)
-            print(f"Status Code: {result.status_code}")
-            print(f"Task ID: {task_id}")
-            print(f"Output: {result.output if hasattr(result, 'output') else 'N/A'}")
-            print("=" * 60)
-            raise RuntimeError("API returned success but no video generated")
-
-        video_url = result.output.video_url
-        print("Video generated successfully!")
-        print(f"Video URL: {video_url}")
-
-        # 打印扩展后的提示词（如果有）
-        try:
-            actual_prompt = result.output.actual_prompt
+        # 任务成功后检查输出并下载视频
+        async def process(task_id, output):
+            if not output.get("video_url"):
+                print("=" * 60)
+                print("API call error: Returned success but no video generated")
+                print("-" * 60)
+                print(f"Task ID: {task_id}")
+                print(f"Output: {output}")
+                print("=" * 60)
+                raise RuntimeError("API returned success but no video generated")
+
+            video_url = output["video_url"]
+            print("Video generated successfully!")
+            print(f"Video URL: {video_url}")
+
+            # 打印并缓存扩展后的提示词（如果有）
+            actual_prompt = output.get("actual_prompt")
             if actual_prompt:
                 print(f"Extended prompt: {actual_prompt[:100]}..." if len(actual_prompt) > 100 else f"Extended prompt: {actual_prompt}")
-        except (KeyError, AttributeError):
-            pass  # actual_prompt 不存在，跳过
+                if cached_prompt is None:
+                    await asyncio.to_thread(prompt_cache.remember, extension_key, prompt, actual_prompt)
 
-        # 下载视频到临时目录
-        video_path = self.download_video(video_url, filename_prefix="wan_t2v")
+            # 下载视频到临时目录
+            extended_prompt = cached_prompt or actual_prompt or prompt
+            return await self.download_video(video_url, filename_prefix, save_output), extended_prompt
 
-        # 构造 VIDEO 类型输出 (ComfyUI 官方格式)
-        video_output = VideoFromFile(video_path)
+        # ========== 步骤2: 提交（或恢复）任务并等待完成 ==========
+        print("Waiting for video generation to complete (may take a few minutes)...")
+        video_path, extended_prompt = await run_task(
+            self.__class__.__name__, VIDEO_SYNTHESIS_PATH, model, inputs, parameters, effective_api_key, process, priority=priority
+        )
 
-        return (video_output,)
+        return video_path, extended_prompt
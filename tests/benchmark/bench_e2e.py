@@ -0,0 +1,359 @@
+"""
+端到端基准测试
+启动本地 DashScope 模拟服务（见 mock_dashscope.py），驱动四个 Wan 节点以及 workflows/*/flow.json 中的工作流，
+统计各节点的延迟分位数、吞吐量、进程峰值内存和各阶段耗时，无需 API Key 即可离线对比性能变化
+
+使用方式：
+    python tests/benchmark/bench_e2e.py [--profile fast] [--requests 8] [--concurrency 4] [--max-tasks 4]
+    python tests/benchmark/bench_e2e.py --profile realistic --time-scale 0.05 --workflows-only
+    python tests/benchmark/bench_e2e.py --profile throttled --json result.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, "..", ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_dashscope import PROFILES, MockDashScope  # noqa: E402
+
+NODES = ("Wan2_5_T2I", "Wan2_5_ImageEdit", "Wan2_5_T2V", "Wan2_5_I2V")
+
+# 工作流中表示“生成后控制种子”的取值，紧跟在 seed 控件值之后
+SEED_CONTROL_VALUES = ("fixed", "increment", "decrement", "randomize")
+
+# 节点输入中作为控件（而非连线）的类型
+WIDGET_TYPES = ("STRING", "INT", "FLOAT", "BOOLEAN")
+
+# 内存采样间隔（秒）
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+
+# ---------- 输入构造 ----------
+
+
+def synthetic_image(width=1280, height=720):
+    import torch
+
+    return torch.rand(1, height, width, 3, generator=torch.Generator().manual_seed(0))
+
+
+def synthetic_audio(seconds=5.0, sample_rate=44100, channels=2):
+    import torch
+
+    return {
+        "waveform": torch.rand(1, channels, int(seconds * sample_rate), generator=torch.Generator().manual_seed(0)) * 2 - 1,
+        "sample_rate": sample_rate,
+    }
+
+
+def synthetic_inputs(node_name):
+    """各节点的代表性输入（720P 图片、5 秒立体声音频）"""
+    if node_name == "Wan2_5_T2I":
+        return {"prompt": "一间有着精致窗户的花店", "width": 1280, "height": 1280}
+    if node_name == "Wan2_5_ImageEdit":
+        return {"prompt": "把背景换成海边", "image_1": synthetic_image()}
+    if node_name == "Wan2_5_T2V":
+        return {"prompt": "一只小猫在草地上奔跑", "size": "832*480", "duration": 5, "audio": synthetic_audio()}
+    return {"prompt": "一只小猫在草地上奔跑", "image": synthetic_image(), "resolution": "480P", "duration": 5, "audio": synthetic_audio()}
+
+
+def load_audio_file(path):
+    """用 PyAV 读取音频文件（mp3/wav 等）为 ComfyUI AUDIO"""
+    import av
+    import numpy as np
+    import torch
+
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="fltp")
+        chunks = [resampled.to_ndarray() for frame in container.decode(stream) for resampled in resampler.resample(frame)]
+        sample_rate = stream.rate
+    waveform = np.concatenate(chunks, axis=1)
+    return {"waveform": torch.from_numpy(np.ascontiguousarray(waveform))[None,], "sample_rate": sample_rate}
+
+
+def widget_names(node_class):
+    """节点的控件输入名（按界面顺序，即工作流 widgets_values 的顺序）"""
+    input_types = node_class.INPUT_TYPES()
+    names = []
+    for section in ("required", "optional"):
+        for name, spec in input_types.get(section, {}).items():
+            if isinstance(spec[0], (list, tuple)) or spec[0] in WIDGET_TYPES:
+                names.append(name)
+    return names
+
+
+def load_workflow(path, node_classes):
+    """解析 ComfyUI 工作流，返回其中 Wan 生成节点的 [(节点类名, 输入)]
+
+    控件值按 widgets_values 顺序映射到节点输入；LoadImage / LoadAudio 连线替换为工作流 input 目录中的文件
+    """
+    from nodes_wan.cli import load_image
+
+    with open(path, "r", encoding="utf-8") as f:
+        workflow = json.load(f)
+    input_dir = os.path.join(os.path.dirname(path), "input")
+    nodes = {node["id"]: node for node in workflow["nodes"]}
+    links = {link[0]: link for link in workflow["links"]}
+
+    result = []
+    for node in workflow["nodes"]:
+        if node["type"] not in NODES:
+            continue
+
+        values = list(node.get("widgets_values") or [])
+        kwargs = {}
+        for name in widget_names(node_classes[node["type"]]):
+            if not values:
+                break
+            kwargs[name] = values.pop(0)
+            if name == "seed" and values and values[0] in SEED_CONTROL_VALUES:
+                values.pop(0)
+
+        for item in node.get("inputs", []):
+            if item.get("link") is None:
+                continue
+            source = nodes[links[item["link"]][1]]
+            filename = os.path.join(input_dir, source["widgets_values"][0])
+            if source["type"] == "LoadImage":
+                kwargs[item["name"]] = load_image(filename)
+            elif source["type"] == "LoadAudio":
+                kwargs[item["name"]] = load_audio_file(filename)
+        result.append((node["type"], kwargs))
+    return result
+
+
+def build_cases(node_classes, nodes, workflows):
+    """测试用例：[(名称, 节点类名, 输入)]"""
+    cases = [(name, name, synthetic_inputs(name)) for name in nodes]
+    for path in workflows:
+        label = os.path.basename(os.path.dirname(path))
+        for node_name, kwargs in load_workflow(path, node_classes):
+            cases.append((f"workflow:{label}", node_name, kwargs))
+    return cases
+
+
+# ---------- 执行与统计 ----------
+
+
+def rss_bytes():
+    """当前进程常驻内存（Linux 读取 /proc，其他平台返回 None）"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class MemorySampler:
+    """后台线程定期采样 RSS，记录峰值"""
+
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_rss = rss_bytes()
+        self.peak_rss = self.start_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_bytes()
+            if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+                self.peak_rss = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+async def run_case(node_class, kwargs, seed, api_key="mock"):
+    """执行一次节点调用（视频节点只生成并下载视频，不构造 VIDEO 对象）"""
+    node = node_class()
+    kwargs = {**kwargs, "seed": seed, "api_key": api_key}
+    if hasattr(node, "create_video"):
+        await node.create_video(**kwargs)
+    else:
+        await node.agenerate_image(**kwargs)
+
+
+async def run_cases(cases, node_classes, requests, concurrency, seed_offset=0, on_result=None):
+    """每个用例执行 requests 次（种子各不相同，避免被请求合并和任务日志复用），返回 [(名称, 耗时, 错误)]"""
+    from nodes_wan.dashscope_http import close_session
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def run_one(label, node_name, kwargs, seed):
+        async with semaphore:
+            start_time = time.perf_counter()
+            error = None
+            try:
+                await run_case(node_classes[node_name], kwargs, seed)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            result = (label, time.perf_counter() - start_time, error)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+    try:
+        await asyncio.gather(
+            *(run_one(label, node_name, kwargs, seed_offset + index) for index in range(requests) for label, node_name, kwargs in cases)
+        )
+    finally:
+        await close_session()
+    return results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    index = max(0, min(len(sorted_values) - 1, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(results, wall_time):
+    """按用例汇总延迟分位数和错误数"""
+    summary = {}
+    for label in dict.fromkeys(label for label, _, _ in results):
+        latencies = sorted(elapsed for name, elapsed, error in results if name == label and error is None)
+        errors = [error for name, _, error in results if name == label and error is not None]
+        summary[label] = {
+            "ok": len(latencies),
+            "errors": len(errors),
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else float("nan"),
+            "sample_error": errors[0] if errors else None,
+        }
+    succeeded = sum(1 for _, _, error in results if error is None)
+    return {
+        "cases": summary,
+        "requests": len(results),
+        "succeeded": succeeded,
+        "wall_time": wall_time,
+        "throughput": succeeded / wall_time if wall_time else 0.0,
+    }
+
+
+def stage_summary(snapshot):
+    """按阶段汇总指标中的耗时（所有节点合计）"""
+    stages = {}
+    for histogram in snapshot["histograms"]:
+        if histogram["name"] != "stage_seconds":
+            continue
+        stage = stages.setdefault(histogram["labels"]["stage"], {"count": 0, "sum": 0.0})
+        stage["count"] += histogram["count"]
+        stage["sum"] += histogram["sum"]
+    return {
+        name: {"count": value["count"], "mean": value["sum"] / value["count"]} for name, value in sorted(stages.items()) if value["count"]
+    }
+
+
+def print_report(report):
+    print(f"\n{'case':<26} {'ok':>5} {'err':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for label, item in report["cases"].items():
+        print(
+            f"{label:<26} {item['ok']:>5} {item['errors']:>5} {item['p50']:>7.2f}s {item['p90']:>7.2f}s {item['p99']:>7.2f}s {item['max']:>7.2f}s"
+        )
+        if item["sample_error"]:
+            print(f"{'':<26} e.g. {item['sample_error']}")
+
+    print(
+        f"\nRequests: {report['succeeded']}/{report['requests']} succeeded in {report['wall_time']:.2f}s ({report['throughput']:.2f} req/s)"
+    )
+    memory = report["memory"]
+    if memory["peak_rss_mb"] is not None:
+        print(
+            f"Peak RSS: {memory['peak_rss_mb']:.1f}MB (start: {memory['start_rss_mb']:.1f}MB, growth: {memory['peak_rss_mb'] - memory['start_rss_mb']:.1f}MB)"
+        )
+    if memory.get("python_peak_mb") is not None:
+        print(f"Python heap peak (tracemalloc): {memory['python_peak_mb']:.1f}MB")
+
+    print("\nStage means (client metrics):")
+    for stage, item in report["stages"].items():
+        print(f"  {stage:<12} {item['mean']:8.3f}s  (n={item['count']})")
+    print(f"\nMock server: {report['server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast", help="模拟服务配置")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="模拟服务端耗时缩放比例")
+    parser.add_argument("--requests", type=int, default=8, help="每个用例的执行次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时执行的节点调用数")
+    parser.add_argument("--max-tasks", type=int, default=4, help="同时在服务端运行的任务数上限（调度器名额）")
+    parser.add_argument("--nodes", nargs="*", default=list(NODES), choices=NODES, help="使用合成输入测试的节点")
+    parser.add_argument("--workflows-only", action="store_true", help="只运行 workflows/*/flow.json")
+    parser.add_argument("--no-workflows", action="store_true", help="不运行 workflows/*/flow.json")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时统计 Python 堆内存峰值（会明显变慢）")
+    parser.add_argument("--json", help="结果另存为 JSON")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    # 状态目录和输出目录使用临时目录，不影响本地的任务日志、耗时统计和缓存
+    workdir = tempfile.mkdtemp(prefix="wan_bench_")
+    os.environ["FUNART_WAN_STATE_DIR"] = os.path.join(workdir, "state")
+    os.chdir(workdir)
+
+    server = MockDashScope(args.profile, time_scale=args.time_scale).start()
+    os.environ["DASHSCOPE_HTTP_BASE_URL"] = server.base_url
+
+    from nodes_wan import NODE_CLASS_MAPPINGS
+    from nodes_wan import metrics
+    from nodes_wan.async_runtime import run_sync
+    from nodes_wan.scheduler import scheduler
+
+    scheduler.limit = args.max_tasks
+    workflows = [] if args.no_workflows else sorted(glob.glob(os.path.join(ROOT, "workflows", "*", "flow.json")))
+    cases = build_cases(NODE_CLASS_MAPPINGS, [] if args.workflows_only else args.nodes, workflows)
+    print(
+        f"Profile: {args.profile} (time scale {args.time_scale}), {len(cases)} case(s) x {args.requests}, concurrency {args.concurrency}, max tasks {args.max_tasks}"
+    )
+    print(f"Work directory: {workdir}")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    with MemorySampler() as sampler:
+        start_time = time.perf_counter()
+        results = run_sync(run_cases(cases, NODE_CLASS_MAPPINGS, args.requests, args.concurrency))
+        wall_time = time.perf_counter() - start_time
+
+    report = summarize(results, wall_time)
+    report["memory"] = {
+        "start_rss_mb": sampler.start_rss / 2**20 if sampler.start_rss else None,
+        "peak_rss_mb": sampler.peak_rss / 2**20 if sampler.peak_rss else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "python_peak_mb": tracemalloc.get_traced_memory()[1] / 2**20 if args.tracemalloc else None,
+    }
+    report["stages"] = stage_summary(metrics.snapshot())
+    report["server"] = dict(server.stats)
+    report["config"] = {key: value for key, value in vars(args).items() if key != "json"}
+    server.stop()
+
+    print_report(report)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Saved to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
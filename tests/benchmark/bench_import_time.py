@@ -0,0 +1,100 @@
+"""
+节点注册耗时对比
+在全新的 Python 子进程中计时 `import nodes_wan`（ComfyUI 启动时加载节点的过程），
+并列出导入后已加载的重量级依赖，与「启动时即导入全部依赖」的旧行为对比
+
+使用方式：
+    python tests/benchmark/bench_import_time.py [--repeat 5] [--ref <git 版本>] [--comfyui <ComfyUI 目录>]
+
+--ref 指定对比的历史版本（如优化前的提交），通过 git archive 导出后同样计时；
+旧版本在导入时依赖 comfy_api，需要通过 --comfyui 指定 ComfyUI 根目录
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# 旧版本在模块导入时加载的依赖
+HEAVY_MODULES = ["torch", "numpy", "PIL.Image", "scipy.io.wavfile", "aiohttp", "av", "dashscope", "requests", "comfy_api.input_impl"]
+
+# 子进程中执行的计时代码
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+heavy = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def probe(statement, paths):
+    """在全新子进程中执行 statement，返回 (耗时, 已加载的重量级模块)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(paths + [env["PYTHONPATH"]] if env.get("PYTHONPATH") else paths)
+    code = PROBE.format(statement=statement, heavy=[name.split(".")[0] for name in HEAVY_MODULES])
+    # 工作目录设为临时目录，避免当前目录下的源码优先于 paths 被导入
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=tempfile.gettempdir())
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data["elapsed"], data["heavy"]
+
+
+def measure(label, statement, paths, repeat):
+    try:
+        samples = [probe(statement, paths) for _ in range(repeat)]
+    except RuntimeError as e:
+        print(f"{label:<12} failed: {e}")
+        return None
+
+    elapsed = statistics.median(sample[0] for sample in samples)
+    heavy = ", ".join(samples[0][1]) or "-"
+    print(f"{label:<12} median: {elapsed * 1000:8.1f}ms  heavy modules loaded: {heavy}")
+    return elapsed
+
+
+def export_ref(ref, directory):
+    """通过 git archive 导出指定版本的源码"""
+    archive = os.path.join(directory, "ref.tar")
+    subprocess.run(["git", "-C", ROOT, "archive", "--format=tar", "-o", archive, ref], check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数（取中位数）")
+    parser.add_argument("--ref", help="对比的历史版本（git 提交/标签）")
+    parser.add_argument("--comfyui", help="ComfyUI 根目录（提供 comfy_api / folder_paths）")
+    args = parser.parse_args()
+
+    extra_paths = [os.path.abspath(args.comfyui)] if args.comfyui else []
+
+    current = measure("current", "import nodes_wan", [ROOT] + extra_paths, args.repeat)
+
+    # 旧行为的下限：只导入旧版本在启动时加载的依赖（已安装的部分）
+    statements = [f"import {name}" for name in HEAVY_MODULES if name.split(".")[0] != "comfy_api" or args.comfyui]
+    eager = "\n".join(f"try:\n    {statement}\nexcept ImportError:\n    pass" for statement in statements)
+    eager_deps = measure("eager deps", eager, extra_paths, args.repeat)
+
+    if current is not None and eager_deps is not None:
+        print(f"Startup import time saved (at least): {(eager_deps - current) * 1000:.1f}ms")
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = measure(args.ref[:12], "import nodes_wan", [export_ref(args.ref, directory)] + extra_paths, args.repeat)
+        if current is not None and baseline is not None:
+            print(f"Import time reduced by {(1 - current / baseline) * 100:.1f}% vs {args.ref}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+媒体转换热路径微基准
+覆盖节点在客户端的 CPU 密集环节：
+    - tensor_to_image_payload：IMAGE tensor → PNG（480P ~ 2K、批量输入、缩放到上传尺寸）
+    - audio_to_payload：AUDIO → WAV（3 ~ 30 秒，单声道/立体声，16 ~ 48kHz）
+    - convert_image：PNG/JPEG → IMAGE tensor
+    - download_and_convert_image：本地 HTTP 下载 + 解码 + 保留原始字节
+统计耗时（中位数）、输出字节数和 Python/NumPy 堆内存峰值（tracemalloc，不含 torch 分配），
+可保存为基线并与基线对比，超出容差时以非零状态退出，用于发现性能回退
+
+使用方式：
+    python tests/benchmark/bench_media.py [--repeat 5] [--filter audio]
+    python tests/benchmark/bench_media.py --save-baseline tests/benchmark/baselines/media.json
+    python tests/benchmark/bench_media.py --compare tests/benchmark/baselines/media.json [--tolerance 0.2]
+"""
+
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "media.json")
+
+# 图片尺寸档位
+IMAGE_SIZES = {
+    "480P": (854, 480),
+    "720P": (1280, 720),
+    "1080P": (1920, 1080),
+    "2K": (2560, 1440),
+}
+
+# 音频：(时长秒数, 采样率, 声道数)
+AUDIO_CASES = [
+    (3, 16000, 1),
+    (10, 16000, 1),
+    (10, 44100, 2),
+    (30, 48000, 1),
+    (30, 48000, 2),
+]
+
+# 峰值内存低于该值（MB）时不做对比，避免小数值波动误报
+PEAK_COMPARE_MIN_MB = 1.0
+
+# 耗时增加不足该值（秒）时不视为回退
+TIME_COMPARE_MIN_DELTA = 0.002
+
+# 耗时很短的用例至少累计运行该时长（秒），减少计时误差
+MIN_MEASURE_TIME = 0.5
+
+
+def photo_like_image(width, height, batch=1):
+    """接近真实照片压缩率的合成图片：低分辨率噪声双线性放大（纯噪声过于难压缩，纯色过于容易）"""
+    import torch
+
+    generator = torch.Generator().manual_seed(0)
+    small = torch.rand(batch, 3, max(height // 8, 1), max(width // 8, 1), generator=generator)
+    image = torch.nn.functional.interpolate(small, size=(height, width), mode="bilinear", align_corners=False)
+    return image.permute(0, 2, 3, 1).contiguous()
+
+
+def synthetic_audio(seconds, sample_rate, channels):
+    import torch
+
+    generator = torch.Generator().manual_seed(0)
+    return {"waveform": torch.rand(1, channels, int(seconds * sample_rate), generator=generator) * 2 - 1, "sample_rate": sample_rate}
+
+
+def encoded_image(width, height, fmt="PNG"):
+    """结果图片字节（模拟服务端返回的 PNG/JPEG）"""
+    import numpy as np
+    from PIL import Image
+
+    array = (photo_like_image(width, height)[0].numpy() * 255).astype(np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(array, mode="RGB").save(buffered, format=fmt)
+    return buffered.getvalue()
+
+
+class StaticServer:
+    """在本地 HTTP 服务上提供内存中的文件，用于测量下载 + 解码"""
+
+    def __init__(self, files):
+        files = dict(files)
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                content = files.get(self.path.split("?")[0])
+                if content is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def build_cases():
+    """基准用例：[(名称, 准备函数)]，准备函数返回被测函数（返回输出字节数），准备过程不计时"""
+    from nodes_wan import NODE_CLASS_MAPPINGS
+    from nodes_wan.async_runtime import run_sync
+
+    i2v = NODE_CLASS_MAPPINGS["Wan2_5_I2V"]()
+    image_edit = NODE_CLASS_MAPPINGS["Wan2_5_ImageEdit"]()
+    t2i = NODE_CLASS_MAPPINGS["Wan2_5_T2I"]()
+    cases = []
+
+    def payload_case(func, *args):
+        def prepare():
+            def run():
+                payload = func(*args)
+                size = payload.encoded_size
+                payload.close()
+                return size
+
+            return run
+
+        return prepare
+
+    for name, (width, height) in IMAGE_SIZES.items():
+        cases.append((f"image_encode/{name}", payload_case(i2v.tensor_to_image_payload, photo_like_image(width, height))))
+    cases.append(("image_encode/batch4x1080P", payload_case(image_edit.tensor_to_image_payload, photo_like_image(1920, 1080, batch=4))))
+    cases.append(("image_encode/2K->1080P", payload_case(i2v.tensor_to_image_payload, photo_like_image(2560, 1440), (1920, 1080))))
+
+    for seconds, sample_rate, channels in AUDIO_CASES:
+        label = f"audio_encode/{seconds}s_{sample_rate // 1000}k_{'stereo' if channels == 2 else 'mono'}"
+        cases.append((label, payload_case(i2v.audio_to_payload, synthetic_audio(seconds, sample_rate, channels))))
+
+    for name, (width, height, fmt) in {
+        "1280x1280_png": (1280, 1280, "PNG"),
+        "2K_png": (2560, 1440, "PNG"),
+        "2K_jpeg": (2560, 1440, "JPEG"),
+    }.items():
+        content = encoded_image(width, height, fmt)
+
+        def prepare(content=content):
+            def run():
+                t2i.convert_image(content)
+                return len(content)
+
+            return run
+
+        cases.append((f"image_decode/{name}", prepare))
+
+    content = encoded_image(1280, 1280)
+
+    def prepare_download():
+        server = StaticServer({"/result.png": content})
+
+        def run():
+            run_sync(t2i.download_and_convert_image(f"{server.url}/result.png?Expires=0"))
+            return len(content)
+
+        run.close = server.close
+        return run
+
+    cases.append(("download_and_convert/1280x1280_png", prepare_download))
+    return cases
+
+
+def measure(prepare, repeat):
+    """预热一次后至少执行 repeat 次（且累计不少于 MIN_MEASURE_TIME），再单独执行一次统计 tracemalloc 峰值"""
+    run = prepare()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            output_bytes = run()
+            times = []
+            while len(times) < repeat or sum(times) < MIN_MEASURE_TIME:
+                start_time = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start_time)
+
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    finally:
+        if hasattr(run, "close"):
+            run.close()
+    return {"time": statistics.median(times), "min_time": min(times), "bytes": output_bytes, "peak_mb": peak / 2**20}
+
+
+def compare(results, baseline, tolerance):
+    """与基线对比（耗时取各次最小值，受机器负载波动影响较小），返回回退的用例"""
+    regressions = []
+    print(f"\n{'case':<38} {'min':>10} {'baseline':>10} {'change':>8} {'peak':>9} {'baseline':>9}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<38} {result['min_time'] * 1000:>8.1f}ms {'-':>10} {'new':>8}")
+            continue
+        time_ratio = result["min_time"] / base["min_time"] if base["min_time"] else 1.0
+        flags = []
+        if time_ratio > 1 + tolerance and result["min_time"] - base["min_time"] > TIME_COMPARE_MIN_DELTA:
+            flags.append("SLOWER")
+        if base["peak_mb"] >= PEAK_COMPARE_MIN_MB and result["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+            flags.append("MORE MEMORY")
+        if flags:
+            regressions.append(name)
+        print(
+            f"{name:<38} {result['min_time'] * 1000:>8.1f}ms {base['min_time'] * 1000:>8.1f}ms {(time_ratio - 1) * 100:>+7.1f}% "
+            f"{result['peak_mb']:>7.1f}MB {base['peak_mb']:>7.1f}MB  {' '.join(flags)}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例的重复次数（取中位数）")
+    parser.add_argument("--filter", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="保存结果为基线")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="与基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比容差（耗时或峰值内存增加超过该比例视为回退）")
+    args = parser.parse_args()
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    from nodes_wan.async_runtime import run_sync
+    from nodes_wan.dashscope_http import close_session
+
+    # 下载用例会写入临时目录（原始图片），不影响本地输出目录
+    os.chdir(tempfile.mkdtemp(prefix="wan_bench_media_"))
+
+    results = {}
+    print(f"{'case':<38} {'time':>10} {'min':>10} {'output':>10} {'peak':>9}")
+    for name, prepare in build_cases():
+        if args.filter and args.filter not in name:
+            continue
+        result = measure(prepare, args.repeat)
+        results[name] = result
+        print(
+            f"{name:<38} {result['time'] * 1000:>8.1f}ms {result['min_time'] * 1000:>8.1f}ms {result['bytes'] / 1024:>8.0f}KB {result['peak_mb']:>7.1f}MB"
+        )
+    run_sync(close_session())
+
+    if save_path:
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        baseline = {
+            "machine": f"{platform.machine()} {platform.processor() or platform.system()}",
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {save_path}")
+
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
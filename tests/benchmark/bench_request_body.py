@@ -0,0 +1,96 @@
+"""
+请求体构造内存占用对比
+对比「bytes → base64 字符串 → data URI → SDK 序列化 JSON」的旧路径与
+MediaPayload 流式构造请求体的新路径的 Python 堆内存峰值
+
+使用方式：
+    python tests/benchmark/bench_request_body.py [--image-mb 10] [--audio-mb 15]
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from nodes_wan.dashscope_http import MediaPayload, build_request_body  # noqa: E402
+
+
+def legacy_body(image_bytes, audio_bytes):
+    """旧路径：与节点原先的 tensor_to_base64_image / audio_to_base64 + SDK 调用一致"""
+    buffered = io.BytesIO()
+    buffered.write(image_bytes)
+    img_encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    img_url = f"data:image/png;base64,{img_encoded}"
+
+    buffered = io.BytesIO()
+    buffered.write(audio_bytes)
+    audio_encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    audio_url = f"data:audio/wav;base64,{audio_encoded}"
+
+    payload = {
+        "model": "wan2.5-i2v-preview",
+        "input": {"prompt": "benchmark", "img_url": img_url, "audio_url": audio_url},
+        "parameters": {"resolution": "480P", "duration": 5},
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def streaming_body(image_bytes, audio_bytes):
+    """新路径：编码结果直接写入 MediaPayload，请求体流式写入临时文件"""
+    image_payload = MediaPayload("image/png")
+    image_payload.file.write(image_bytes)
+    audio_payload = MediaPayload("audio/wav")
+    audio_payload.file.write(audio_bytes)
+
+    body = build_request_body(
+        "wan2.5-i2v-preview",
+        {"prompt": "benchmark", "img_url": image_payload, "audio_url": audio_payload},
+        {"resolution": "480P", "duration": 5},
+    )
+    image_payload.close()
+    audio_payload.close()
+    return body
+
+
+def measure(label, func, image_bytes, audio_bytes):
+    tracemalloc.start()
+    start_time = time.time()
+    result = func(image_bytes, audio_bytes)
+    elapsed_time = time.time() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if isinstance(result, bytes):
+        body_size = len(result)
+    else:
+        body_size = result.seek(0, os.SEEK_END)
+        result.close()
+
+    print(f"{label:<10} peak: {peak / (1024 * 1024):8.2f}MB  time: {elapsed_time:.3f}s  body size: {body_size / (1024 * 1024):.2f}MB")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-mb", type=float, default=10, help="图片编码后大小（MB）")
+    parser.add_argument("--audio-mb", type=float, default=15, help="音频编码后大小（MB）")
+    args = parser.parse_args()
+
+    # 随机字节模拟编码后的 PNG / WAV（不可压缩，与真实体积一致）
+    image_bytes = os.urandom(int(args.image_mb * 1024 * 1024))
+    audio_bytes = os.urandom(int(args.audio_mb * 1024 * 1024))
+    print(f"Payload: image {args.image_mb}MB + audio {args.audio_mb}MB")
+
+    legacy_peak = measure("legacy", legacy_body, image_bytes, audio_bytes)
+    streaming_peak = measure("streaming", streaming_body, image_bytes, audio_bytes)
+    print(f"Peak memory reduced by {(1 - streaming_peak / legacy_peak) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
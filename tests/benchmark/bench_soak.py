@@ -0,0 +1,250 @@
+"""
+长时间运行（soak）测试
+在本地 DashScope 模拟服务上以指定并发反复执行 Wan 节点（数千次），定期采样进程常驻内存（RSS）、Python 对象数、
+tracemalloc 统计的堆内存、打开的文件描述符数、线程数以及临时目录/状态目录大小，
+检测随执行次数单调增长的资源（内存、文件句柄、临时文件泄漏），发现增长时以非零状态退出
+
+使用方式：
+    python tests/benchmark/bench_soak.py [--executions 2000] [--concurrency 8] [--interval 5]
+    python tests/benchmark/bench_soak.py --duration 3600 --profile flaky --tracemalloc --csv soak.csv
+"""
+
+import argparse
+import contextlib
+import csv
+import gc
+import glob
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_e2e import NODES, ROOT, build_cases, rss_bytes, run_case  # noqa: E402
+from mock_dashscope import PROFILES, MockDashScope  # noqa: E402
+
+# 判定增长时忽略的预热比例（连接池、缓存等在前期建立）
+WARMUP_FRACTION = 0.2
+
+# 判定增长时将采样划分的窗口数，各窗口中位数逐个递增才视为单调增长
+TREND_WINDOWS = 4
+
+# 各指标判定为增长的最小增量：(绝对值, 相对比例)，两者都超过才报告
+GROWTH_THRESHOLDS = {
+    "rss_mb": (20.0, 0.05),
+    "python_objects": (10000, 0.05),
+    "traced_mb": (5.0, 0.05),
+    "open_fds": (5, 0.0),
+    "threads": (2, 0.0),
+    "temp_mb": (1.0, 0.0),
+    "state_kb": (64.0, 0.0),
+}
+
+
+def open_fds():
+    """打开的文件描述符数（Linux）"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def directory_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+def take_sample(start_time, done, errors, temp_dir, state_dir):
+    rss = rss_bytes()
+    return {
+        "elapsed": round(time.time() - start_time, 1),
+        "executions": done,
+        "errors": errors,
+        "rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+        "python_objects": len(gc.get_objects()),
+        "traced_mb": round(tracemalloc.get_traced_memory()[0] / 2**20, 1) if tracemalloc.is_tracing() else None,
+        "open_fds": open_fds(),
+        "threads": threading.active_count(),
+        "temp_mb": round(directory_size(temp_dir) / 2**20, 2),
+        "state_kb": round(directory_size(state_dir) / 1024, 1),
+    }
+
+
+def detect_growth(samples):
+    """检测单调增长的指标
+
+    Returns:
+        {指标: (预热后首个窗口中位数, 最后窗口中位数)}
+    """
+    samples = samples[int(len(samples) * WARMUP_FRACTION) :]
+    if len(samples) < TREND_WINDOWS * 2:
+        return {}
+
+    growing = {}
+    size = len(samples) // TREND_WINDOWS
+    for metric, (min_delta, min_ratio) in GROWTH_THRESHOLDS.items():
+        values = [sample[metric] for sample in samples]
+        if any(value is None for value in values):
+            continue
+        medians = [statistics.median(values[index * size : (index + 1) * size]) for index in range(TREND_WINDOWS)]
+        monotonic = all(later > earlier for earlier, later in zip(medians, medians[1:]))
+        delta = medians[-1] - medians[0]
+        if monotonic and delta > min_delta and delta > abs(medians[0]) * min_ratio:
+            growing[metric] = (medians[0], medians[-1])
+    return growing
+
+
+async def soak(cases, node_classes, executions, duration, concurrency, on_done):
+    """循环执行用例，直到达到执行次数或时长"""
+    import asyncio
+
+    from nodes_wan.dashscope_http import close_session
+
+    deadline = time.time() + duration if duration else None
+    counter = iter(range(executions or sys.maxsize))
+
+    async def worker():
+        for index in counter:
+            if deadline is not None and time.time() > deadline:
+                return
+            label, node_name, kwargs = cases[index % len(cases)]
+            error = None
+            try:
+                # 种子各不相同，每次都是新任务
+                await run_case(node_classes[node_name], kwargs, seed=index)
+            except Exception as e:
+                error = f"{label}: {type(e).__name__}: {e}"
+            on_done(error)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        await close_session()
+
+
+def print_sample(sample, file=None):
+    print(
+        f"[{sample['elapsed']:>7.1f}s] done: {sample['executions']:>6}  errors: {sample['errors']:>4}  rss: {sample['rss_mb']}MB  "
+        f"objects: {sample['python_objects']}  traced: {sample['traced_mb']}MB  fds: {sample['open_fds']}  threads: {sample['threads']}  "
+        f"temp: {sample['temp_mb']}MB  state: {sample['state_kb']}KB",
+        file=file,
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executions", type=int, default=2000, help="总执行次数（与 --duration 同时指定时先到者为准）")
+    parser.add_argument("--duration", type=float, help="运行时长（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时执行的节点调用数")
+    parser.add_argument("--max-tasks", type=int, default=8, help="同时在服务端运行的任务数上限（调度器名额）")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast", help="模拟服务配置")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="模拟服务端耗时缩放比例")
+    parser.add_argument("--nodes", nargs="*", default=list(NODES), choices=NODES, help="参与测试的节点（合成输入）")
+    parser.add_argument("--workflows", action="store_true", help="同时执行 workflows/*/flow.json 中的工作流")
+    parser.add_argument("--interval", type=float, default=5.0, help="采样间隔（秒）")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计 Python 堆内存（会明显变慢）")
+    parser.add_argument("--csv", help="采样结果另存为 CSV")
+    args = parser.parse_args()
+    if not args.executions and not args.duration:
+        parser.error("--executions or --duration is required")
+    csv_path = os.path.abspath(args.csv) if args.csv else None
+
+    # 输出、临时文件和状态都放在独立目录，便于统计大小
+    workdir = tempfile.mkdtemp(prefix="wan_soak_")
+    state_dir = os.path.join(workdir, "state")
+    os.environ["FUNART_WAN_STATE_DIR"] = state_dir
+    os.chdir(workdir)
+
+    server = MockDashScope(args.profile, time_scale=args.time_scale).start()
+    os.environ["DASHSCOPE_HTTP_BASE_URL"] = server.base_url
+
+    from nodes_wan import NODE_CLASS_MAPPINGS
+    from nodes_wan.async_runtime import run_sync
+    from nodes_wan.paths import get_temp_directory
+    from nodes_wan.scheduler import scheduler
+
+    scheduler.limit = args.max_tasks
+    workflows = sorted(glob.glob(os.path.join(ROOT, "workflows", "*", "flow.json"))) if args.workflows else []
+    cases = build_cases(NODE_CLASS_MAPPINGS, args.nodes, workflows)
+    temp_dir = get_temp_directory()
+    print(
+        f"Soak: {args.executions or '-'} executions / {args.duration or '-'}s, {len(cases)} case(s), concurrency {args.concurrency}, profile {args.profile}"
+    )
+    print(f"Work directory: {workdir}")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    progress = {"done": 0, "errors": 0, "last_error": None}
+
+    def on_done(error):
+        progress["done"] += 1
+        if error is not None:
+            progress["errors"] += 1
+            progress["last_error"] = error
+
+    samples = []
+    stop = threading.Event()
+    console = sys.stdout
+    start_time = time.time()
+
+    def sampler():
+        while not stop.wait(args.interval):
+            sample = take_sample(start_time, progress["done"], progress["errors"], temp_dir, state_dir)
+            samples.append(sample)
+            print_sample(sample, console)
+
+    samples.append(take_sample(start_time, 0, 0, temp_dir, state_dir))
+    thread = threading.Thread(target=sampler, daemon=True)
+    thread.start()
+    try:
+        # 节点的逐次执行日志过多，soak 期间只输出采样结果（丢弃而不是缓存，避免自身造成内存增长）
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            run_sync(soak(cases, NODE_CLASS_MAPPINGS, args.executions, args.duration, args.concurrency, on_done))
+    except KeyboardInterrupt:
+        print("Interrupted, analysing collected samples")
+    finally:
+        stop.set()
+        thread.join()
+        server.stop()
+
+    gc.collect()
+    final = take_sample(start_time, progress["done"], progress["errors"], temp_dir, state_dir)
+    samples.append(final)
+    print_sample(final)
+    elapsed = final["elapsed"] or 1.0
+    print(f"\n{progress['done']} executions in {elapsed:.0f}s ({progress['done'] / elapsed:.1f}/s), {progress['errors']} error(s)")
+    if progress["last_error"]:
+        print(f"Last error: {progress['last_error']}")
+    print(f"Mock server: {dict(server.stats)}")
+
+    if csv_path:
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(samples[0]))
+            writer.writeheader()
+            writer.writerows(samples)
+        print(f"Samples saved to {csv_path}")
+
+    growing = detect_growth(samples)
+    if not growing:
+        print("No monotonic growth detected")
+        return 0
+    for metric, (first, last) in growing.items():
+        print(f"GROWTH {metric}: {first} -> {last}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""
+DashScope 本地模拟服务
+模拟图像/视频生成的任务提交、任务查询、任务取消及结果下载接口，可配置各阶段耗时、失败率和限流，
+用于在没有 API Key 的情况下离线测量 Wan 节点的吞吐和延迟
+
+- 提交：/services/aigc/{text2image,image2image,video-generation}/...（需 X-DashScope-Async: enable）
+- 查询：/tasks/{task_id}，返回 task_status 及 submit_time / scheduled_time / end_time
+- 取消：/tasks/{task_id}/cancel，仅 PENDING 任务可取消
+- 下载：/files/{task_id}.png|.mp4，图片为按请求尺寸生成的 PNG，视频为指定大小的随机字节（不可解码）；
+  每个任务的结果内容各不相同（混入任务 ID），与真实服务一样不会因内容去重而减少磁盘占用
+
+使用方式：
+    python tests/benchmark/mock_dashscope.py [--port 8089] [--profile realistic] [--time-scale 0.1]
+    DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8089/api/v1 python main.py    # ComfyUI 改用模拟服务
+
+在脚本中使用：
+    server = MockDashScope("flaky").start()
+    os.environ["DASHSCOPE_HTTP_BASE_URL"] = server.base_url    # 须在导入 nodes_wan 之前设置
+"""
+
+import argparse
+import asyncio
+import collections
+import io
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+
+from aiohttp import web
+
+# 各项配置的默认值（耗时单位为秒，会乘以 time_scale）
+DEFAULTS = {
+    "submit_latency": 0.05,  # 提交接口响应耗时
+    "queue_time": 0.0,  # 服务端排队耗时
+    "image_time": 0.5,  # 图像生成耗时
+    "video_time": 2.0,  # 视频生成耗时
+    "jitter": 0.2,  # 排队/生成耗时的随机浮动比例
+    "submit_error_rate": 0.0,  # 提交返回 503（未受理）的概率
+    "poll_error_rate": 0.0,  # 查询返回 503 的概率
+    "download_error_rate": 0.0,  # 下载返回 503 的概率
+    "task_failure_rate": 0.0,  # 任务最终 FAILED 的概率
+    "submit_rate": None,  # 每秒最多受理的提交数，超出返回 429
+    "max_running": None,  # 同时生成的任务数上限，超出的任务在服务端排队
+    "video_bytes": 2 * 1024 * 1024,  # 视频结果大小
+    "download_bandwidth": None,  # 下载带宽（字节/秒），None 表示不限速
+}
+
+# 预置配置
+PROFILES = {
+    # 几乎没有服务端耗时，测量客户端自身开销
+    "fast": {"submit_latency": 0.0, "image_time": 0.1, "video_time": 0.2},
+    # 接近线上的耗时，通常配合 --time-scale 缩短
+    "realistic": {
+        "submit_latency": 0.3,
+        "queue_time": 5.0,
+        "image_time": 15.0,
+        "video_time": 120.0,
+        "jitter": 0.3,
+        "download_bandwidth": 20 * 1024 * 1024,
+    },
+    # 提交/查询/下载偶发错误，部分任务失败
+    "flaky": {"submit_error_rate": 0.1, "poll_error_rate": 0.1, "download_error_rate": 0.05, "task_failure_rate": 0.05},
+    # 限流：每秒受理 2 个提交，同时只生成 2 个任务
+    "throttled": {"submit_rate": 2, "max_running": 2},
+}
+
+# 调度循环间隔（秒）
+TICK_INTERVAL = 0.02
+
+# 结果链接有效期（秒）
+RESULT_URL_TTL = 24 * 3600
+
+
+def _format_time(timestamp):
+    """与 DashScope 一致的时间格式，如 2025-01-01 12:00:00.123"""
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}"
+
+
+def _error(status, code, message):
+    return web.json_response({"request_id": uuid.uuid4().hex, "code": code, "message": message}, status=status)
+
+
+class MockDashScope:
+    """在后台线程中运行的 DashScope 模拟服务"""
+
+    def __init__(self, profile="fast", time_scale=1.0, seed=None, **overrides):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile: {profile!r}. Available: {', '.join(PROFILES)}")
+        self.profile = profile
+        self.config = {**DEFAULTS, **PROFILES[profile], **overrides}
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.tasks = {}
+        self.stats = collections.Counter()
+        self.base_url = None
+        self._pending = collections.deque()
+        self._running = []
+        self._submit_times = collections.deque()
+        self._images = {}
+        self._video = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    # ---------- 生命周期 ----------
+
+    def start(self, host="127.0.0.1", port=0):
+        """在后台线程启动服务（port=0 时自动选择端口），返回自身"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start(host, port))
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="mock-dashscope", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    async def _start(self, host, port):
+        app = web.Application(client_max_size=512 * 1024 * 1024)
+        app.router.add_post("/api/v1/services/aigc/{group}/{task}", self.handle_submit)
+        app.router.add_get("/api/v1/tasks/{task_id}", self.handle_query)
+        app.router.add_post("/api/v1/tasks/{task_id}/cancel", self.handle_cancel)
+        app.router.add_get("/files/{name}", self.handle_download)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.host = f"http://{host}:{port}"
+        self.base_url = f"{self.host}/api/v1"
+        self._ticker = asyncio.ensure_future(self._tick())
+
+    def stop(self):
+        """停止服务"""
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._ticker.cancel()
+            await self._runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ---------- 任务调度 ----------
+
+    def _duration(self, name):
+        base = self.config[name] * self.time_scale
+        jitter = self.config["jitter"]
+        return max(0.0, base * self.random.uniform(1 - jitter, 1 + jitter))
+
+    async def _tick(self):
+        """推进任务状态：排队结束且有空闲名额时开始生成，生成结束后成功或失败"""
+        while True:
+            now = time.time()
+            for task in [task for task in self._running if task["end_at"] <= now]:
+                self._running.remove(task)
+                failed = self.random.random() < self.config["task_failure_rate"]
+                task.update(status="FAILED" if failed else "SUCCEEDED", end_time=now)
+                self.stats["tasks_failed" if failed else "tasks_succeeded"] += 1
+
+            max_running = self.config["max_running"]
+            for task in list(self._pending):
+                if task["status"] != "PENDING":
+                    self._pending.remove(task)
+                    continue
+                if max_running is not None and len(self._running) >= max_running:
+                    break
+                if task["ready_at"] > now:
+                    continue
+                self._pending.remove(task)
+                task.update(status="RUNNING", scheduled_time=now, end_at=now + task["generation_time"])
+                self._running.append(task)
+                self.stats["max_running"] = max(self.stats["max_running"], len(self._running))
+
+            await asyncio.sleep(TICK_INTERVAL)
+
+    def _throttled(self, now):
+        rate = self.config["submit_rate"]
+        if rate is None:
+            return False
+        while self._submit_times and now - self._submit_times[0] >= 1.0:
+            self._submit_times.popleft()
+        if len(self._submit_times) >= rate:
+            return True
+        self._submit_times.append(now)
+        return False
+
+    # ---------- 接口 ----------
+
+    async def handle_submit(self, request):
+        self.stats["submit_requests"] += 1
+        body = await request.read()
+        self.stats["upload_bytes"] += len(body)
+        await asyncio.sleep(self.config["submit_latency"] * self.time_scale)
+
+        if request.headers.get("X-DashScope-Async") != "enable":
+            return _error(400, "InvalidParameter", "This model only supports asynchronous calls")
+        if self._throttled(time.time()):
+            self.stats["throttled"] += 1
+            return _error(429, "Throttling.RateQuota", "Requests rate limit exceeded, please try again later.")
+        if self.random.random() < self.config["submit_error_rate"]:
+            self.stats["submit_errors"] += 1
+            return _error(503, "ServiceUnavailable", "Injected submit error")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return _error(400, "InvalidParameter", "Request body is not valid JSON")
+
+        kind = "video" if request.match_info["group"] == "video-generation" else "image"
+        now = time.time()
+        task_id = uuid.uuid4().hex
+        task = {
+            "task_id": task_id,
+            "kind": kind,
+            # 只保留结果需要的字段，不保留请求中的 base64 媒体数据
+            "prompt": (payload.get("input") or {}).get("prompt", ""),
+            "parameters": payload.get("parameters") or {},
+            "status": "PENDING",
+            "submit_time": now,
+            "scheduled_time": None,
+            "end_time": None,
+            "ready_at": now + self._duration("queue_time"),
+            "generation_time": self._duration(f"{kind}_time"),
+        }
+        self.tasks[task_id] = task
+        self._pending.append(task)
+        self.stats["submits"] += 1
+        return web.json_response({"request_id": uuid.uuid4().hex, "output": {"task_id": task_id, "task_status": "PENDING"}})
+
+    def _task_output(self, task):
+        output = {
+            "task_id": task["task_id"],
+            "task_status": task["status"],
+            "submit_time": _format_time(task["submit_time"]),
+            "scheduled_time": _format_time(task["scheduled_time"]),
+            "end_time": _format_time(task["end_time"]),
+        }
+        if task["status"] == "FAILED":
+            output.update(code="InternalError.Algo", message="Injected task failure")
+        elif task["status"] == "SUCCEEDED":
+            expires = int(time.time()) + RESULT_URL_TTL
+            actual_prompt = f"{task['prompt']} (extended)"
+            if task["kind"] == "video":
+                output.update(video_url=f"{self.host}/files/{task['task_id']}.mp4?Expires={expires}", actual_prompt=actual_prompt)
+            else:
+                count = int(task["parameters"].get("n", 1))
+                output["results"] = [
+                    {"url": f"{self.host}/files/{task['task_id']}_{index}.png?Expires={expires}", "actual_prompt": actual_prompt}
+                    for index in range(count)
+                ]
+        return {key: value for key, value in output.items() if value is not None}
+
+    async def handle_query(self, request):
+        self.stats["polls"] += 1
+        if self.random.random() < self.config["poll_error_rate"]:
+            self.stats["poll_errors"] += 1
+            return _error(503, "ServiceUnavailable", "Injected query error")
+        task = self.tasks.get(request.match_info["task_id"])
+        if task is None:
+            return _error(404, "InvalidParameter.TaskNotExist", "Task not found")
+        return web.json_response({"request_id": uuid.uuid4().hex, "output": self._task_output(task)})
+
+    async def handle_cancel(self, request):
+        self.stats["cancel_requests"] += 1
+        task = self.tasks.get(request.match_info["task_id"])
+        if task is None:
+            return _error(404, "InvalidParameter.TaskNotExist", "Task not found")
+        if task["status"] != "PENDING":
+            return _error(400, "UnsupportedOperation", f"Task in {task['status']} status can not be canceled")
+        task.update(status="CANCELED", end_time=time.time())
+        self.stats["cancels"] += 1
+        return web.json_response({"request_id": uuid.uuid4().hex})
+
+    def _image_bytes(self, size):
+        """按尺寸生成（并缓存）结果图片：低分辨率噪声放大，PNG 大小与真实结果相近"""
+        if size not in self._images:
+            import numpy as np
+            from PIL import Image
+
+            width, height = size
+            noise = np.random.default_rng(0).integers(0, 256, (max(height // 4, 1), max(width // 4, 1), 3), dtype=np.uint8)
+            buffered = io.BytesIO()
+            Image.fromarray(noise, mode="RGB").resize((width, height), Image.BILINEAR).save(buffered, format="PNG", compress_level=1)
+            self._images[size] = buffered.getvalue()
+        return self._images[size]
+
+    def _result_bytes(self, task):
+        """任务结果：缓存的图片/视频内容混入任务 ID，每个任务的结果各不相同"""
+        task_id = task["task_id"].encode()
+        if task["kind"] == "video":
+            if self._video is None:
+                self._video = random.Random(0).randbytes(self.config["video_bytes"])
+            return self._video[: -len(task_id)] + task_id, "video/mp4"
+        size = task["parameters"].get("size") or "1024*1024"
+        width, height = (int(value) for value in size.split("*"))
+        image = self._image_bytes((width, height))
+        # 在 IEND 之前插入记录任务 ID 的 tEXt 块，图片仍可正常解码
+        data = b"task_id\x00" + task_id
+        chunk = len(data).to_bytes(4, "big") + b"tEXt" + data + zlib.crc32(b"tEXt" + data).to_bytes(4, "big")
+        return image[:-12] + chunk + image[-12:], "image/png"
+
+    async def handle_download(self, request):
+        self.stats["download_requests"] += 1
+        task = self.tasks.get(request.match_info["name"].split(".")[0].split("_")[0])
+        if task is None or task["status"] != "SUCCEEDED":
+            return _error(404, "NotFound", "File not found")
+        if self.random.random() < self.config["download_error_rate"]:
+            self.stats["download_errors"] += 1
+            return _error(503, "ServiceUnavailable", "Injected download error")
+
+        content, content_type = await asyncio.to_thread(self._result_bytes, task)
+        bandwidth = self.config["download_bandwidth"]
+        self.stats["download_bytes"] += len(content)
+        if bandwidth is None:
+            return web.Response(body=content, content_type=content_type)
+
+        # 按带宽分块发送
+        response = web.StreamResponse(headers={"Content-Type": content_type, "Content-Length": str(len(content))})
+        await response.prepare(request)
+        chunk_size = 256 * 1024
+        for offset in range(0, len(content), chunk_size):
+            chunk = content[offset : offset + chunk_size]
+            await response.write(chunk)
+            await asyncio.sleep(len(chunk) / bandwidth)
+        await response.write_eof()
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="服务端耗时缩放比例")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help=f"覆盖单项配置（{', '.join(DEFAULTS)}）")
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        if key not in DEFAULTS:
+            parser.error(f"unknown setting: {key}")
+        overrides[key] = None if value.lower() == "none" else json.loads(value)
+
+    server = MockDashScope(args.profile, time_scale=args.time_scale, **overrides).start(args.host, args.port)
+    print(f"Mock DashScope ({args.profile}) listening on {server.base_url}")
+    print(f"Use: DASHSCOPE_HTTP_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"stats: {dict(server.stats)}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
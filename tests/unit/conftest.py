@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    """使用临时状态目录（任务日志、缓存、SQLite 数据库）"""
+    directory = tmp_path / "state"
+    monkeypatch.setenv("FUNART_WAN_STATE_DIR", str(directory))
+    return directory
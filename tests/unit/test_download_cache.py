@@ -0,0 +1,117 @@
+"""
+结果下载缓存单元测试
+"""
+
+import os
+import time
+
+import pytest
+
+from nodes_wan import download_cache
+
+URL = "https://dashscope-result.oss-cn-beijing.aliyuncs.com/task/output.mp4"
+
+
+@pytest.fixture(autouse=True)
+def enabled(state_dir, monkeypatch):
+    monkeypatch.setattr(download_cache, "ENABLED", True)
+    monkeypatch.setattr(download_cache, "_writes_since_prune", 0)
+
+
+def _signed(expires):
+    return f"{URL}?OSSAccessKeyId=key&Expires={int(expires)}&Signature=abc"
+
+
+class TestUrl:
+    def test_key_strips_signature(self):
+        assert download_cache.url_key(_signed(time.time() + 60)) == URL
+        assert download_cache.url_key(_signed(time.time() + 60)) == download_cache.url_key(_signed(time.time() + 3600))
+
+    def test_expires_v1(self):
+        assert download_cache.url_expires(f"{URL}?Expires=1792368000&Signature=abc") == 1792368000
+
+    def test_expires_v4(self):
+        url = f"{URL}?x-oss-date=20261019T000000Z&x-oss-expires=3600&x-oss-signature=abc"
+        assert download_cache.url_expires(url) == 1792368000 + 3600
+
+    def test_expires_defaults_without_signature(self):
+        now = time.time()
+        assert download_cache.url_expires(URL) == pytest.approx(now + download_cache.DEFAULT_TTL, abs=5)
+
+    def test_expires_defaults_on_malformed_values(self):
+        now = time.time()
+        for url in (f"{URL}?Expires=soon", f"{URL}?x-oss-date=yesterday&x-oss-expires=3600"):
+            assert download_cache.url_expires(url) == pytest.approx(now + download_cache.DEFAULT_TTL, abs=5)
+
+
+class TestCache:
+    def test_store_and_lookup(self):
+        download_cache.store_bytes(_signed(time.time() + 3600), b"video")
+        path = download_cache.lookup(_signed(time.time() + 7200))
+        with open(path, "rb") as f:
+            assert f.read() == b"video"
+
+    def test_miss(self):
+        assert download_cache.lookup(_signed(time.time() + 3600)) is None
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(download_cache, "ENABLED", False)
+        download_cache.store_bytes(_signed(time.time() + 3600), b"video")
+        assert download_cache.lookup(_signed(time.time() + 3600)) is None
+
+    def test_expired_url_is_not_indexed(self):
+        download_cache.store_bytes(_signed(time.time() - 60), b"video")
+        assert download_cache.lookup(_signed(time.time() + 3600)) is None
+
+    def test_missing_file_is_a_miss(self):
+        download_cache.store_bytes(_signed(time.time() + 3600), b"video")
+        os.unlink(download_cache.lookup(URL))
+        assert download_cache.lookup(URL) is None
+
+    def test_publish_writes_once_and_refreshes_mtime(self):
+        writes = []
+
+        def write(part_path):
+            writes.append(part_path)
+            with open(part_path, "wb") as f:
+                f.write(b"content")
+
+        path = download_cache._publish("sha", write)
+        os.utime(path, (0, 0))
+        assert download_cache._publish("sha", write) == path
+        assert len(writes) == 1
+        assert os.path.getmtime(path) > time.time() - 60
+        assert os.listdir(os.path.dirname(path)) == ["sha"]
+
+    def test_publish_failure_leaves_no_files(self):
+        def write(part_path):
+            with open(part_path, "wb") as f:
+                f.write(b"partial")
+            raise OSError("disk full")
+
+        with pytest.raises(OSError):
+            download_cache._publish("sha", write)
+        assert os.listdir(download_cache._directory()) == []
+
+    @pytest.mark.parametrize("link", [True, False])
+    def test_store_file(self, tmp_path, link):
+        source = tmp_path / "output.mp4"
+        source.write_bytes(b"video")
+        download_cache.store_file(_signed(time.time() + 3600), str(source), "sha", link=link)
+        cached = download_cache.lookup(URL)
+        with open(cached, "rb") as f:
+            assert f.read() == b"video"
+        # 复制时用户输出文件与缓存文件互不影响
+        assert os.path.samefile(cached, source) is link
+        assert os.stat(source).st_nlink == (2 if link else 1)
+
+    def test_prune_evicts_oldest_over_entry_limit(self, monkeypatch):
+        monkeypatch.setattr(download_cache, "MAX_ENTRIES", 2)
+        monkeypatch.setattr(download_cache, "PUBLISH_GRACE", -1)
+        for index in range(3):
+            download_cache.store_bytes(f"{URL}{index}", f"video{index}".encode())
+        download_cache._prune()
+        assert download_cache.lookup(f"{URL}0") is None
+        assert download_cache.lookup(f"{URL}1") is not None
+        assert download_cache.lookup(f"{URL}2") is not None
+        assert len(os.listdir(download_cache._directory())) == 2
@@ -0,0 +1,157 @@
+"""
+请求预检单元测试
+"""
+
+import types
+
+import pytest
+
+from nodes_wan.preflight import (
+    I2I_IMAGE_LIMITS,
+    I2V_IMAGE_LIMITS,
+    MAX_REENCODE_ATTEMPTS,
+    RESOLUTION_PIXELS,
+    check_audio,
+    check_output_size,
+    encode_within_limit,
+    image_size,
+    plan_image_size,
+)
+
+
+class FakePayload:
+    def __init__(self, size):
+        self.size = size
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEncoder:
+    """按像素数估算编码大小，记录每次编码的尺寸和返回的 payload"""
+
+    def __init__(self, bytes_per_pixel):
+        self.bytes_per_pixel = bytes_per_pixel
+        self.calls = []
+        self.payloads = []
+
+    def __call__(self, size):
+        self.calls.append(size)
+        self.payloads.append(FakePayload(size[0] * size[1] * self.bytes_per_pixel))
+        return self.payloads[-1]
+
+
+def _within(size, limits):
+    return limits["min_side"] <= min(size) and max(size) <= limits["max_side"]
+
+
+class TestImageSize:
+    def test_batched_and_single(self):
+        assert image_size(types.SimpleNamespace(shape=(1, 480, 640, 3))) == (640, 480)
+        assert image_size(types.SimpleNamespace(shape=(480, 640, 3))) == (640, 480)
+
+
+class TestPlanImageSize:
+    def test_in_range_unchanged(self):
+        assert plan_image_size(1280, 720, I2V_IMAGE_LIMITS) == (1280, 720)
+        assert plan_image_size(1280, 720, I2V_IMAGE_LIMITS, RESOLUTION_PIXELS["1080P"], auto_resize=True) == (1280, 720)
+
+    @pytest.mark.parametrize("width, height", [(359, 720), (2001, 1000), (300, 2500)])
+    def test_out_of_range_rejected_without_auto_resize(self, width, height):
+        with pytest.raises(ValueError, match="First frame size .* out of range"):
+            plan_image_size(width, height, I2V_IMAGE_LIMITS, label="First frame")
+
+    def test_bounds_are_inclusive(self):
+        assert plan_image_size(360, 2000, I2V_IMAGE_LIMITS) == (360, 2000)
+
+    def test_downscales_to_target_pixels(self):
+        width, height = plan_image_size(3840, 2160, I2V_IMAGE_LIMITS, RESOLUTION_PIXELS["720P"], auto_resize=True)
+        assert (width, height) == (1280, 720)
+
+    def test_downscales_to_max_side(self):
+        width, height = plan_image_size(8000, 4000, I2I_IMAGE_LIMITS, auto_resize=True)
+        assert (width, height) == (5000, 2500)
+
+    def test_upscales_to_min_side(self):
+        width, height = plan_image_size(200, 300, I2V_IMAGE_LIMITS, RESOLUTION_PIXELS["480P"], auto_resize=True)
+        assert (width, height) == (360, 540)
+
+    def test_extreme_aspect_ratio_rejected(self):
+        with pytest.raises(ValueError, match="aspect ratio"):
+            plan_image_size(4000, 500, I2V_IMAGE_LIMITS, auto_resize=True)
+
+
+class TestEncodeWithinLimit:
+    def test_within_limit_encoded_once(self):
+        encode = FakeEncoder(1)
+        payload = encode_within_limit(encode, 1280, 720, I2V_IMAGE_LIMITS)
+        assert encode.calls == [(1280, 720)]
+        assert payload is encode.payloads[0] and not payload.closed
+
+    def test_too_large_rejected_without_auto_resize(self):
+        encode = FakeEncoder(20)
+        with pytest.raises(ValueError, match="too large after encoding"):
+            encode_within_limit(encode, 1280, 720, I2V_IMAGE_LIMITS)
+        assert encode.payloads[0].closed
+
+    def test_auto_resize_reencodes_smaller(self):
+        encode = FakeEncoder(12)
+        payload = encode_within_limit(encode, 1280, 720, I2V_IMAGE_LIMITS, auto_resize=True)
+        assert len(encode.calls) == 2
+        assert payload.size <= I2V_IMAGE_LIMITS["max_bytes"]
+        assert encode.payloads[0].closed and not payload.closed
+        width, height = encode.calls[1]
+        assert _within((width, height), I2V_IMAGE_LIMITS)
+        assert width / height == pytest.approx(1280 / 720, rel=0.01)
+
+    def test_gives_up_after_max_attempts(self):
+        encode = FakeEncoder(1000)
+        with pytest.raises(ValueError, match=f"after {MAX_REENCODE_ATTEMPTS} attempts"):
+            encode_within_limit(encode, 1280, 720, I2I_IMAGE_LIMITS, auto_resize=True)
+        assert len(encode.calls) == MAX_REENCODE_ATTEMPTS
+        assert all(payload.closed for payload in encode.payloads)
+
+
+class TestCheckAudio:
+    def _audio(self, seconds, channels=1, sample_rate=16000):
+        return {"waveform": types.SimpleNamespace(shape=(1, channels, int(seconds * sample_rate))), "sample_rate": sample_rate}
+
+    def test_in_range(self):
+        check_audio(self._audio(3))
+        check_audio(self._audio(30))
+
+    @pytest.mark.parametrize("seconds", [2.9, 30.1])
+    def test_duration_out_of_range(self, seconds):
+        with pytest.raises(ValueError, match="duration"):
+            check_audio(self._audio(seconds))
+
+    def test_encoded_size_too_large(self):
+        # 30 秒 48kHz 立体声 16-bit 约 5.5MB，限制 15MB 内；同样长度 8 声道则超出
+        check_audio(self._audio(30, channels=2, sample_rate=48000))
+        with pytest.raises(ValueError, match="Audio too large"):
+            check_audio(self._audio(30, channels=8, sample_rate=48000))
+
+
+class TestCheckOutputSize:
+    LIMITS = (768 * 768, 1440 * 1440, "768*768", "1440*1440")
+
+    def test_in_range(self):
+        assert check_output_size(1024, 1024, *self.LIMITS) == (1024 * 1024, 1.0)
+
+    def test_pixel_bounds_are_inclusive(self):
+        check_output_size(768, 768, *self.LIMITS)
+        check_output_size(1440, 1440, *self.LIMITS)
+
+    @pytest.mark.parametrize("width, height", [(767, 768), (1441, 1440)])
+    def test_total_pixels_out_of_range(self, width, height):
+        with pytest.raises(ValueError, match="Total pixels"):
+            check_output_size(width, height, *self.LIMITS)
+
+    def test_aspect_ratio_bounds(self):
+        check_output_size(2048, 512, 0, 1440 * 1440, "0", "1440*1440")
+        check_output_size(512, 2048, 0, 1440 * 1440, "0", "1440*1440")
+        with pytest.raises(ValueError, match="Aspect ratio"):
+            check_output_size(2052, 512, 0, 1440 * 1440, "0", "1440*1440")
+        with pytest.raises(ValueError, match="Aspect ratio"):
+            check_output_size(512, 2052, 0, 1440 * 1440, "0", "1440*1440")
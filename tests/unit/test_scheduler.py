@@ -0,0 +1,160 @@
+"""
+任务调度单元测试
+"""
+
+import asyncio
+import types
+
+import pytest
+
+from nodes_wan import scheduler as scheduler_module
+from nodes_wan.scheduler import Scheduler, estimate_cost
+
+
+async def _acquire_in_order(limit, requests):
+    """占满名额后依次排队 requests（(名称, cost, priority)），逐个归还名额，返回获得名额的顺序"""
+    scheduler = Scheduler(limit=limit)
+    for _ in range(limit):
+        await scheduler.acquire(0)
+
+    order = []
+
+    async def waiter(name, cost, priority):
+        await scheduler.acquire(cost, priority)
+        order.append(name)
+
+    tasks = []
+    for name, cost, priority in requests:
+        tasks.append(asyncio.ensure_future(waiter(name, cost, priority)))
+        await asyncio.sleep(0)
+    for _ in requests:
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestScheduler:
+    def test_priority_before_cost(self):
+        order = asyncio.run(_acquire_in_order(1, [("bulk", 1, "bulk"), ("normal", 50, "normal"), ("interactive", 100, "interactive")]))
+        assert order == ["interactive", "normal", "bulk"]
+
+    def test_shorter_cost_first_within_priority(self):
+        order = asyncio.run(_acquire_in_order(1, [("long", 300, "normal"), ("short", 10, "normal"), ("medium", 60, "normal")]))
+        assert order == ["short", "medium", "long"]
+
+    def test_aging_moves_long_waiting_tasks_forward(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(scheduler_module, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+
+        async def main():
+            scheduler = Scheduler(limit=1)
+            await scheduler.acquire(0)
+            order = []
+
+            async def waiter(name, cost, priority):
+                await scheduler.acquire(cost, priority)
+                order.append(name)
+
+            old = asyncio.ensure_future(waiter("old bulk", 0, "bulk"))
+            await asyncio.sleep(0)
+            # bulk 任务排队超过两档偏移之差后，排在新到的 normal 任务之前
+            clock[0] += scheduler_module.PRIORITY_OFFSETS["bulk"] - scheduler_module.PRIORITY_OFFSETS["normal"] + 1
+            new = asyncio.ensure_future(waiter("new normal", 0, "normal"))
+            await asyncio.sleep(0)
+            for _ in range(2):
+                scheduler.release()
+                await asyncio.sleep(0)
+            await asyncio.gather(old, new)
+            return order
+
+        assert asyncio.run(main()) == ["old bulk", "new normal"]
+
+    def test_cancelled_waiter_is_skipped(self):
+        async def main():
+            scheduler = Scheduler(limit=1)
+            await scheduler.acquire(0)
+            cancelled = asyncio.ensure_future(scheduler.acquire(1, "interactive"))
+            waiting = asyncio.ensure_future(scheduler.acquire(100, "bulk"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            scheduler.release()
+            await waiting
+            return scheduler.active, scheduler.waiting
+
+        assert asyncio.run(main()) == (1, 0)
+
+    def test_slot_released_when_cancelled_while_running(self):
+        async def main():
+            scheduler = Scheduler(limit=1)
+
+            async def run():
+                async with scheduler.slot(10):
+                    await asyncio.sleep(10)
+
+            task = asyncio.ensure_future(run())
+            await asyncio.sleep(0)
+            assert scheduler.active == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return scheduler.active
+
+        assert asyncio.run(main()) == 0
+
+    def test_slot_returned_when_cancelled_after_grant(self):
+        async def main():
+            scheduler = Scheduler(limit=1)
+            await scheduler.acquire(0)
+            waiter = asyncio.ensure_future(scheduler.acquire(1))
+            await asyncio.sleep(0)
+            # 名额分配给 waiter 后、waiter 恢复运行前被取消：名额必须归还
+            scheduler.release()
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            return scheduler.active
+
+        assert asyncio.run(main()) == 0
+
+    def test_resumed_task_takes_slot_without_waiting(self):
+        async def main():
+            scheduler = Scheduler(limit=1)
+            await scheduler.acquire(0)
+            async with scheduler.slot(10, wait=False):
+                active = scheduler.active
+            return active, scheduler.active
+
+        assert asyncio.run(main()) == (2, 1)
+
+    def test_unlimited_never_queues(self):
+        async def main():
+            scheduler = Scheduler(limit=0)
+            await asyncio.gather(*(scheduler.acquire(1) for _ in range(10)))
+            return scheduler.active, scheduler.waiting
+
+        assert asyncio.run(main()) == (0, 0)
+
+    def test_unknown_priority_rejected_even_with_free_slots(self):
+        for limit in (0, 2):
+            with pytest.raises(ValueError, match="Unknown priority"):
+                asyncio.run(Scheduler(limit=limit).acquire(1, "urgent"))
+
+
+class TestEstimateCost:
+    def test_video_cost_scales_with_resolution_duration_and_audio(self):
+        short = estimate_cost("m", {}, {"resolution": "480P", "duration": 5})
+        long = estimate_cost("m", {}, {"resolution": "480P", "duration": 10})
+        hd = estimate_cost("m", {}, {"resolution": "1080P", "duration": 5})
+        audio = estimate_cost("m", {"audio_url": object()}, {"resolution": "480P", "duration": 5})
+        assert short < long and short < hd and short < audio
+
+    def test_t2v_size_maps_to_resolution_tier(self):
+        assert estimate_cost("m", {}, {"size": "1280*720", "duration": 5}) == estimate_cost("m", {}, {"resolution": "720P", "duration": 5})
+
+    def test_image_cost_scales_with_pixels_and_inputs(self):
+        small = estimate_cost("m", {}, {"size": "512*512"})
+        large = estimate_cost("m", {}, {"size": "1024*1024"})
+        edit = estimate_cost("m", {"images": [object(), object()]}, {"size": "1024*1024"})
+        assert small < large < edit
@@ -0,0 +1,113 @@
+"""
+SingleFlight 单元测试
+"""
+
+import asyncio
+
+import pytest
+
+from nodes_wan.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_execution(self):
+        async def main():
+            flight = SingleFlight()
+            calls = []
+
+            async def func():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                return object()
+
+            results = await asyncio.gather(*(flight.do("key", func) for _ in range(5)))
+            return flight, calls, results
+
+        flight, calls, results = asyncio.run(main())
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert flight.coalesced == 4
+        assert "key" not in flight
+
+    def test_different_keys_run_separately(self):
+        async def main():
+            flight = SingleFlight()
+
+            async def func(value):
+                await asyncio.sleep(0.01)
+                return value
+
+            return await asyncio.gather(flight.do("a", lambda: func(1)), flight.do("b", lambda: func(2))), flight.coalesced
+
+        results, coalesced = asyncio.run(main())
+        assert results == [1, 2]
+        assert coalesced == 0
+
+    def test_sequential_calls_run_again(self):
+        async def main():
+            flight = SingleFlight()
+            calls = []
+
+            async def func():
+                calls.append(1)
+                return len(calls)
+
+            return [await flight.do("key", func), await flight.do("key", func)]
+
+        assert asyncio.run(main()) == [1, 2]
+
+    def test_follower_cancellation_does_not_cancel_others(self):
+        async def main():
+            flight = SingleFlight()
+            release = asyncio.Event()
+
+            async def func():
+                await release.wait()
+                return "done"
+
+            leader = asyncio.ensure_future(flight.do("key", func))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("key", func))
+            await asyncio.sleep(0)
+            follower.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await follower
+            release.set()
+            return await leader
+
+        assert asyncio.run(main()) == "done"
+
+    def test_leader_cancellation_does_not_cancel_followers(self):
+        async def main():
+            flight = SingleFlight()
+            release = asyncio.Event()
+
+            async def func():
+                await release.wait()
+                return "done"
+
+            leader = asyncio.ensure_future(flight.do("key", func))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("key", func))
+            await asyncio.sleep(0)
+            leader.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            return leader.cancelled(), await follower
+
+        assert asyncio.run(main()) == (True, "done")
+
+    def test_leader_failure_fans_out_and_clears_key(self):
+        async def main():
+            flight = SingleFlight()
+
+            async def func():
+                await asyncio.sleep(0.01)
+                raise RuntimeError("boom")
+
+            results = await asyncio.gather(*(flight.do("key", func) for _ in range(3)), return_exceptions=True)
+            return flight, results
+
+        flight, results = asyncio.run(main())
+        assert all(isinstance(result, RuntimeError) and str(result) == "boom" for result in results)
+        assert "key" not in flight
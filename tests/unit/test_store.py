@@ -0,0 +1,107 @@
+"""
+本地持久化存储单元测试
+"""
+
+import json
+import multiprocessing
+
+import pytest
+
+from nodes_wan import store
+from nodes_wan.store import JsonFileStore, SqliteStore
+
+STORE_CLASSES = [SqliteStore, JsonFileStore]
+
+
+def _increment(_):
+    """子进程中对同一个 key 做读改写"""
+    counter = SqliteStore("counter")
+    for _ in range(50):
+        counter.update("count", lambda value: (value or 0) + 1)
+
+
+@pytest.mark.parametrize("store_class", STORE_CLASSES)
+class TestStore:
+    def test_get_set_delete(self, state_dir, store_class):
+        kv = store_class("test")
+        assert kv.get("missing") is None
+        assert kv.get("missing", "default") == "default"
+        kv.set("key", {"value": [1, 2], "name": "猫"})
+        assert kv.get("key") == {"value": [1, 2], "name": "猫"}
+        kv.delete("key")
+        kv.delete("key")
+        assert kv.get("key") is None
+
+    def test_update_reads_and_writes(self, state_dir, store_class):
+        kv = store_class("test")
+        assert kv.update("count", lambda value: (value or 0) + 1) == 1
+        assert kv.update("count", lambda value: (value or 0) + 1) == 2
+        assert kv.get("count") == 2
+        assert kv.update("count", lambda value: None) is None
+        assert kv.get("count") is None
+
+    def test_items_and_prune(self, state_dir, store_class):
+        kv = store_class("test")
+        for index in range(5):
+            kv.set(f"key{index}", {"index": index})
+        assert kv.prune(lambda key, value: value["index"] % 2 == 0) == 3
+        assert sorted(key for key, _ in kv.items()) == ["key1", "key3"]
+        assert kv.prune(lambda key, value: False) == 0
+
+    def test_stores_are_separated_by_name(self, state_dir, store_class):
+        first, second = store_class("first"), store_class("second")
+        first.set("key", 1)
+        second.set("key", 2)
+        assert first.get("key") == 1
+        assert second.get("key") == 2
+        assert first.items() == [("key", 1)]
+
+    def test_data_persists_across_instances(self, state_dir, store_class):
+        store_class("test").set("key", "value")
+        assert store_class("test").get("key") == "value"
+
+
+class TestSqliteStore:
+    def test_file_layout(self, state_dir):
+        SqliteStore("test").set("key", "value")
+        assert (state_dir / store.DATABASE_NAME).exists()
+        assert not (state_dir / "test.json").exists()
+
+    def test_failed_update_rolls_back(self, state_dir):
+        kv = SqliteStore("test")
+        kv.set("key", 1)
+
+        def fail(value):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            kv.update("key", fail)
+        assert kv.get("key") == 1
+        kv.set("key", 2)
+        assert kv.get("key") == 2
+
+    def test_concurrent_processes_do_not_lose_updates(self, state_dir):
+        # spawn：子进程不继承本进程已打开的数据库连接
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=_increment, args=(index,)) for index in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode == 0
+        assert SqliteStore("counter").get("count") == 200
+
+
+class TestJsonFileStore:
+    def test_file_layout(self, state_dir):
+        JsonFileStore("test").set("key", "value")
+        with open(state_dir / "test.json", encoding="utf-8") as f:
+            assert json.load(f) == {"key": "value"}
+
+    def test_corrupt_file_starts_empty(self, state_dir):
+        state_dir.mkdir(parents=True, exist_ok=True)
+        (state_dir / "test.json").write_text("{not json", encoding="utf-8")
+        kv = JsonFileStore("test")
+        assert kv.get("key") is None
+        kv.set("key", 1)
+        assert JsonFileStore("test").get("key") == 1
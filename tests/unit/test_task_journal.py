@@ -0,0 +1,80 @@
+"""
+任务日志与任务恢复单元测试
+"""
+
+import asyncio
+import time
+import types
+
+import aiohttp
+import pytest
+
+from nodes_wan import task_journal, task_runner
+from nodes_wan.dashscope_http import DashScopeAPIError
+
+
+class TestTaskJournal:
+    def test_record_lookup_discard(self, state_dir):
+        assert task_journal.lookup("key") is None
+        task_journal.record("key", "task-1", "WanI2V", "wan2.5-i2v-preview")
+        entry = task_journal.lookup("key")
+        assert entry["task_id"] == "task-1"
+        assert entry["node"] == "WanI2V"
+        assert entry["model"] == "wan2.5-i2v-preview"
+        task_journal.discard("key")
+        assert task_journal.lookup("key") is None
+
+    def test_record_replaces_entry(self, state_dir):
+        task_journal.record("key", "task-1", "WanI2V", "m")
+        task_journal.record("key", "task-2", "WanI2V", "m")
+        assert task_journal.lookup("key")["task_id"] == "task-2"
+
+    def test_expired_entry_is_dropped(self, state_dir, monkeypatch):
+        task_journal.record("key", "task-1", "WanI2V", "m")
+        now = time.time()
+        monkeypatch.setattr(task_journal, "time", types.SimpleNamespace(time=lambda: now + task_journal.JOURNAL_TTL + 1))
+        assert task_journal.lookup("key") is None
+        assert task_journal._store.get("key") is None
+
+    def test_record_prunes_expired_entries(self, state_dir, monkeypatch):
+        task_journal.record("old", "task-1", "WanI2V", "m")
+        now = time.time()
+        monkeypatch.setattr(task_journal, "time", types.SimpleNamespace(time=lambda: now + task_journal.JOURNAL_TTL + 1))
+        task_journal.record("new", "task-2", "WanI2V", "m")
+        assert [key for key, _ in task_journal._store.items()] == ["new"]
+
+
+def _resume(monkeypatch, result):
+    """fetch_task 返回 result（异常则抛出）时 _resume 的结果"""
+
+    async def fetch_task(task_id, api_key):
+        assert task_id == "task-1"
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    monkeypatch.setattr(task_runner, "fetch_task", fetch_task)
+    return asyncio.run(task_runner._resume({"task_id": "task-1"}, "sk-test"))
+
+
+class TestResume:
+    @pytest.mark.parametrize("status", ["PENDING", "RUNNING", "SUCCEEDED"])
+    def test_live_task_resumed(self, monkeypatch, status):
+        assert _resume(monkeypatch, {"output": {"task_status": status}}) is True
+
+    @pytest.mark.parametrize("status", ["FAILED", "CANCELED", "UNKNOWN", None])
+    def test_finished_or_lost_task_resubmitted(self, monkeypatch, status):
+        assert _resume(monkeypatch, {"output": {"task_status": status}}) is False
+
+    def test_missing_output_resubmitted(self, monkeypatch):
+        assert _resume(monkeypatch, {}) is False
+
+    @pytest.mark.parametrize("error", [aiohttp.ClientConnectionError("reset"), asyncio.TimeoutError()])
+    def test_network_error_keeps_polling(self, monkeypatch, error):
+        assert _resume(monkeypatch, error) is True
+
+    def test_retryable_api_error_keeps_polling(self, monkeypatch):
+        assert _resume(monkeypatch, DashScopeAPIError("unavailable", status=503)) is True
+
+    def test_non_retryable_api_error_resubmitted(self, monkeypatch):
+        assert _resume(monkeypatch, DashScopeAPIError("not found", status=404)) is False